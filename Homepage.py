@@ -1,8 +1,39 @@
 import streamlit as st
+import pandas as pd
+from utils.market_snapshot import load_market_snapshot
+from utils.metrics import track_session
+
+track_session()
 
 st.title("Stockify: Your Stock Pricing App")
 st.write("Welcome to the Stockify ! Where you can find and analyse more than hundreds of stocks in the market.")
 
+# Market Overview Section, read from the snapshot built after each data refresh
+snapshot = load_market_snapshot()
+if snapshot is not None:
+    st.header(f"Market Overview ({snapshot['date']})")
+    ranking_columns = {
+        "ticker": "Symbol", "name": "Name", "close": "Close", "change": "Change",
+        "change_percent": "Change %", "volume": "Volume"
+    }
+
+    for tab, (exchange, summary) in zip(st.tabs(list(snapshot["exchanges"])), snapshot["exchanges"].items()):
+        with tab:
+            breadth = summary["breadth"]
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Advancing", breadth["advancing"])
+            col2.metric("Declining", breadth["declining"])
+            col3.metric("Unchanged", breadth["unchanged"])
+            col4.metric("Total Volume", f"{breadth['total_volume']:,.0f}")
+
+            for title, key in [("Top Gainers", "top_gainers"), ("Top Losers", "top_losers"), ("Most Active", "most_active")]:
+                st.subheader(title)
+                st.dataframe(
+                    pd.DataFrame(summary[key], columns=list(ranking_columns)).rename(columns=ranking_columns),
+                    hide_index=True,
+                    use_container_width=True
+                )
+
 st.markdown("""
     ### Created By
 - **Student Name**: Nguyen Thi Thuy An
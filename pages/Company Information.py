@@ -1,14 +1,27 @@
 import streamlit as st
-from utils.data_related import load_ticker_generic_info, combine_ticker_name, retrieve_company_info, read_dividend_data, read_financial_data, read_analysis_data, read_history_data
+from utils.data_related import load_ticker_generic_info, combine_ticker_name, retrieve_company_info, available_datasets, read_dividend_data, read_financial_data, read_analysis_data, read_history_data
+from utils.similarity_index import query_similar
+from utils.sector_index import benchmark_series
+import plotly.graph_objects as go
+from utils.ticker_search import ranked_options
+from utils.metrics import track_session
+
+track_session()
 
 ticker_info = load_ticker_generic_info()
 ticker_name_list = combine_ticker_name(ticker_info)
 title_name = "{company_name} Information"
+BENCHMARK_DAYS = 250
 
 with st.sidebar:
+    # Narrow the companies by ticker, name or industry, with or without Vietnamese diacritics
+    company_query = st.text_input("Search companies", placeholder="Ticker, name or industry, e.g. ngan hang")
+    current_company = st.session_state.get("selected_company")
     selected_company = st.selectbox(
     "Select a company to show the information",
-    options=["Select a Company"] + list(ticker_name_list),  # Add a placeholder
+    options=["Select a Company"] + ranked_options(company_query, ticker_name_list, ticker_info,
+                                                  keep=[current_company] if current_company in ticker_name_list else []),  # Add a placeholder
+    key="selected_company",
 )
 # Conditional Rendering
 if selected_company == "Select a Company":
@@ -21,9 +34,12 @@ else:
     st.write(f"This page will display information about the {selected_company} company.")
 
     company_info = retrieve_company_info(ticker_info, selected_company).iloc[0]
-    dividend_history = read_dividend_data(company_info["ticker"], company_info["exchange"])
-    financial_data = read_financial_data(company_info["ticker"], company_info["exchange"])
-    analysis_data = read_analysis_data(company_info["ticker"], company_info["exchange"]).iloc[0]
+    # Only read the datasets the manifest lists for this company; some have no dividends or ratios
+    datasets = available_datasets(company_info["ticker"], company_info["exchange"])
+    dividend_history = read_dividend_data(company_info["ticker"], company_info["exchange"]) if "dividend-history" in datasets else None
+    financial_data = read_financial_data(company_info["ticker"], company_info["exchange"]) if "financial-ratio" in datasets else None
+    analysis_data = read_analysis_data(company_info["ticker"], company_info["exchange"]) if "industry-analysis" in datasets else None
+    analysis_data = analysis_data.iloc[0] if analysis_data is not None and not analysis_data.empty else None
     history_data = read_history_data(company_info["ticker"], company_info["exchange"])
     #st.write(history_data)
     
@@ -82,16 +98,19 @@ else:
     # Title for the Market Data section
     st.title("Valuation and Ratios")
     
-    col1, col2 = st.columns(2)
-    with col1:
-        st.text_input("Market Cap", analysis_data["marcap"], disabled=True)
-        st.text_input("Enterprise Value (in billion)", analysis_data["price"], disabled=True)
-        st.text_input("Gross Margins", analysis_data["grossProfitMargin"], disabled=True)
-    
-    with col2:
-        st.text_input("Price to Book", analysis_data["priceToBook"], disabled=True)
-        st.text_input("Return on Assets (ROA)", analysis_data["roa"], disabled=True)
-        st.text_input("Return on Equity (ROE)", analysis_data["roe"], disabled=True)
+    if analysis_data is None:
+        st.write("No valuation data is available for this company.")
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.text_input("Market Cap", analysis_data["marcap"], disabled=True)
+            st.text_input("Enterprise Value (in billion)", analysis_data["price"], disabled=True)
+            st.text_input("Gross Margins", analysis_data["grossProfitMargin"], disabled=True)
+
+        with col2:
+            st.text_input("Price to Book", analysis_data["priceToBook"], disabled=True)
+            st.text_input("Return on Assets (ROA)", analysis_data["roa"], disabled=True)
+            st.text_input("Return on Equity (ROE)", analysis_data["roe"], disabled=True)
     
     # Divider
     st.markdown("---")
@@ -99,17 +118,84 @@ else:
     # Title for the Market Data section
     st.title("Financial Performance")
     
-    col1, col2 = st.columns(2)
-    with col1:
-        st.text_input("Average Price to Earning", financial_data["priceToEarning"].mean(), disabled=True)
-        st.text_input("Average Price to Book", financial_data["priceToBook"].mean(), disabled=True)
-    
-    with col2:
-        st.text_input("Sum Earning Per Share", financial_data["earningPerShare"].sum(), disabled=True)
-        st.text_input("Sum Book Value Per Share", financial_data["bookValuePerShare"].sum(), disabled=True)
+    if financial_data is None or financial_data.empty:
+        st.write("No financial ratios are available for this company.")
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.text_input("Average Price to Earning", financial_data["priceToEarning"].mean(), disabled=True)
+            st.text_input("Average Price to Book", financial_data["priceToBook"].mean(), disabled=True)
+
+        with col2:
+            st.text_input("Sum Earning Per Share", financial_data["earningPerShare"].sum(), disabled=True)
+            st.text_input("Sum Book Value Per Share", financial_data["bookValuePerShare"].sum(), disabled=True)
     
     # Divider
     st.markdown("---")
 
+    # Title for the Sector Benchmark section
+    st.title("Sector Benchmark")
+
+    industry_index = benchmark_series("industry", company_info["industry"])
+    exchange_index = benchmark_series("exchange", company_info["exchange"])
+    # Rebase the stock and its benchmarks to 100 at the start of the last BENCHMARK_DAYS trading days
+    stock_close = history_data.set_index("TradingDate")["Close"].iloc[-BENCHMARK_DAYS:]
+    stock_close = stock_close[stock_close > 0]
+    if company_info["industry"] == "No Information":
+        st.write("This company has no industry, so it cannot be compared with a sector.")
+    elif industry_index.empty:
+        st.write("No sector index is available for this company. Run `python -m utils.sector_index` to build it.")
+    elif stock_close.empty:
+        st.write("No positive closing price in the recent history of this company to compare with its sector.")
+    else:
+        start_date = stock_close.index[0]
+        benchmark_lines = {
+            company_info["ticker"]: stock_close,
+            f"{company_info['industry']} (cap-weighted)": industry_index["cap_weighted"],
+            f"{company_info['industry']} (equal-weighted)": industry_index["equal_weighted"],
+            f"{company_info['exchange']} (cap-weighted)": exchange_index["cap_weighted"],
+        }
+
+        fig_benchmark = go.Figure()
+        for name, series in benchmark_lines.items():
+            series = series[series.index >= start_date]
+            if series.empty:
+                continue
+            fig_benchmark.add_trace(go.Scatter(x=series.index, y=100 * series / series.iloc[0], mode="lines", name=name))
+        fig_benchmark.update_layout(
+            title=f"{company_info['ticker']} against its sector (rebased to 100)",
+            xaxis=dict(title="Date"),
+            yaxis=dict(title="Level"),
+            template="plotly_white",
+            height=500
+        )
+        st.plotly_chart(fig_benchmark, use_container_width=True)
+
+    # Divider
+    st.markdown("---")
+
+    # Title for the Similar Stocks section
+    st.title("Similar Stocks")
+
+    similar_stocks = query_similar(company_info["ticker"], k=10)
+    if similar_stocks.empty:
+        st.write("The similar stocks index has not been built yet. Run `python -m utils.similarity_index` to build it.")
+    else:
+        similar_stocks = similar_stocks.merge(
+            ticker_info[["ticker", "shortName", "exchange", "industry"]], on="ticker", how="left"
+        )
+        similar_stocks["similarity"] = (similar_stocks["similarity"] * 100).round(1)
+        st.dataframe(
+            similar_stocks.rename(columns={
+                "ticker": "Symbol", "similarity": "Similarity (%)", "shortName": "Issuer Name",
+                "exchange": "Exchange", "industry": "Industry"
+            }),
+            hide_index=True,
+            use_container_width=True
+        )
+
+    # Divider
+    st.markdown("---")
+
     # Title for the Market Data section
     st.title("Analyst Targets")
\ No newline at end of file
@@ -1,15 +1,27 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-from utils.data_related import load_ticker_generic_info, combine_ticker_name, read_history_data
-from utils.ml_model import load_sklearn_model, predict_buy_sell_probability, predict_new_data, predict_3rd_day_open_price, predict_3_consecutive_days_open_price
+from utils.data_related import load_ticker_generic_info, combine_ticker_name, read_history_data, dataset_version
+from utils.compute_graph import ComputeGraph
+from utils.figure_cache import cached_figure, figure_key
+from utils.risk_analytics import load_portfolio_returns, covariance_matrix, correlation_matrix, portfolio_volatility, value_at_risk
+from utils.compiled_forest import load_forest_model
+from utils.monte_carlo import simulate_portfolio_values, value_quantiles, summarize_outcomes, forecast_drift
+from utils.ml_model import predict_buy_sell_probability, predict_new_data, predict_3rd_day_open_price, predict_3_consecutive_days_open_price
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
+from utils.metrics import track_session
+from utils.ticker_search import ranked_options
+
+track_session()
 
 # Load ticker information
 ticker_info = load_ticker_generic_info()
 ticker_name_list = [str(i).split("-")[0] for i in list(combine_ticker_name(ticker_info))]
-BUY_INDICATOR_MODEL = load_sklearn_model("models/buy_indicator.pkl")
-SELL_INDICATOR_MODEL = load_sklearn_model("models/sell_indicator.pkl")
+# Compiled, memory-mapped forests: loading them is cheap enough to repeat on every rerun
+BUY_INDICATOR_MODEL = load_forest_model("models/buy_indicator.pkl")
+SELL_INDICATOR_MODEL = load_forest_model("models/sell_indicator.pkl")
+SIMULATION_PATHS = 50_000
 
 
 st.title("An's Portfolio")
@@ -25,15 +37,64 @@ with st.sidebar:
         value=10_000_000
     )
 
+    # Narrow the companies by ticker, name or industry, with or without Vietnamese diacritics
+    company_query = st.text_input("Search companies", placeholder="Ticker, name or industry, e.g. ngan hang")
+    # The default selection is set once in the session state: a default passed to the widget would have to be
+    # among the searched options on every run, even after the user removed it
+    current_companies = st.session_state.setdefault("portfolio_companies", ["ACB ", "BID ", "CTG "])
     selected_company = st.multiselect(
         "Your current portfolio",
-        list(ticker_name_list),
-        ["ACB ", "BID ", "CTG "],
+        ranked_options(company_query, ticker_name_list, ticker_info, keep=current_companies),
+        key="portfolio_companies",
         disabled=False
     )
 
+    risk_window = st.selectbox("Risk analysis window (trading days)", [60, 120, 250, 500], index=2)
+
+    # Monte Carlo simulation settings
+    simulation_horizon = st.selectbox("Simulation horizon (trading days)", [5, 10, 20, 60], index=2)
+    simulation_method = st.radio("Simulated returns", ["Bootstrap", "Correlated normal"], horizontal=True)
+    use_forecast_drift = st.checkbox("Center the simulation on the 3-day forecasts", value=False)
+
     # Submit button to trigger recalculation
     recalculate = st.button("Submit")
+    show_graph_debug = st.checkbox("Show computation cache details", value=False)
+
+# Once submitted, later changes to the settings update the page without pressing Submit again
+if recalculate:
+    st.session_state["portfolio_submitted"] = True
+submitted = st.session_state.get("portfolio_submitted", False)
+
+# Page computations are nodes of a graph, so a rerun only recomputes what depends on the changed settings
+portfolio_tickers = tuple(ticker.strip() for ticker in selected_company)
+exchanges = ticker_info.set_index("ticker")["exchange"]
+graph = ComputeGraph("portfolio")
+graph.set_inputs(
+    tickers=portfolio_tickers,
+    history_version=dataset_version("stock-historical-data", [(ticker, exchanges[ticker]) for ticker in portfolio_tickers]),
+    risk_window=risk_window,
+    simulation_horizon=simulation_horizon,
+    simulation_method=simulation_method,
+    use_forecast_drift=use_forecast_drift,
+)
+
+@graph.node("tickers", "history_version")
+def histories(tickers, history_version):
+    return {ticker: read_history_data(ticker, exchanges[ticker]) for ticker in tickers}
+
+@graph.node("histories")
+def daily_changes(histories):
+    changes = []
+    for ticker, history_data in histories.items():
+        # Get the latest and previous Close prices
+        last_close = history_data["Close"].iloc[-1]
+        previous_close = history_data["Close"].iloc[-2]
+
+        # Calculate changes
+        change = last_close - previous_close
+        change_percent = (change / previous_close) * 100
+        changes.append({"ticker": ticker, "change": change, "change_percent": change_percent, "last_close": last_close})
+    return changes
 
 # Initialize variables
 portfolio_data = []
@@ -41,35 +102,14 @@ total_change_per_day = 0
 total_profit_loss = 0
 market_value = 0
 
-# Trigger calculations when the Submit button is pressed
-if recalculate and selected_company:
+# Trigger calculations once the Submit button has been pressed
+if submitted and selected_company:
     # Split the invested money equally among the selected tickers
     per_ticker_invested = total_invested_money / len(selected_company)
 
-    for ticker in selected_company:
-        # Retrieve company info
-        company_info = ticker_info[ticker_info["ticker"] == ticker.strip()].iloc[0]
-        exchange = company_info["exchange"]
-
-        # Read historical data for the ticker
-        history_data = read_history_data(ticker.strip(), exchange)
-
-        # Get the latest and previous Close prices
-        last_close = history_data["Close"].iloc[-1]
-        previous_close = history_data["Close"].iloc[-2]
-
-        # Calculate changes
-        change = last_close - previous_close
-        change_percent = (change / previous_close) * 100
-
-        # Append data to the portfolio
-        portfolio_data.append({
-            "ticker": ticker.strip(),
-            "invested": per_ticker_invested,
-            "change": change,
-            "change_percent": change_percent,
-            "last_close": last_close
-        })
+    # Append data to the portfolio
+    for change in graph.get("daily_changes"):
+        portfolio_data.append({**change, "invested": per_ticker_invested})
 
     # Calculate totals
     total_change_per_day = sum(item["change"] for item in portfolio_data)  # Total change
@@ -165,163 +205,275 @@ if recalculate and selected_company:
                     unsafe_allow_html=True
                 )
 
+    # Risk Analysis Section
     if portfolio_data:
-        st.header("Stock Performance with Moving Averages")
-
-        # Combine data for all selected tickers
-        combined_data = pd.DataFrame()
-
-        for ticker in selected_company:
-            # Retrieve company info
-            company_info = ticker_info[ticker_info["ticker"] == ticker.strip()].iloc[0]
-            exchange = company_info["exchange"]
-
-            # Read historical data
-            history_data = read_history_data(ticker.strip(), exchange)
-            history_data["Ticker"] = ticker.strip()
-
-            # Add moving averages
-            history_data["MA_Close_20"] = history_data["Close"].rolling(window=20).mean()  # 20-day moving average
-            history_data["MA_Open_20"] = history_data["Open"].rolling(window=20).mean()  # 20-day moving average for Open
-
-            # Add volume color
-            history_data["Volume_Color"] = [
-                "green" if close > open_ else "red"
-                for close, open_ in zip(history_data["Close"], history_data["Open"])
-            ]
-
-            # Combine all data
-            combined_data = pd.concat([combined_data, history_data], axis=0)
+        st.header("Risk Analysis")
+
+        # The money is split equally, so the weights and every risk figure as a fraction do not depend on the amount
+        weights = [data["invested"] / total_invested_money for data in portfolio_data]
+
+        @graph.node("tickers", "risk_window", "history_version")
+        def risk_returns(tickers, risk_window, history_version):
+            return load_portfolio_returns(list(tickers), ticker_info, window=risk_window)
+
+        @graph.node("risk_returns")
+        def risk_metrics(risk_returns):
+            daily_volatility, annual_volatility = portfolio_volatility(weights, covariance_matrix(risk_returns))
+            historical_var = value_at_risk(weights, risk_returns, confidence=0.95, method="historical")
+            parametric_var = value_at_risk(weights, risk_returns, confidence=0.95, method="parametric")
+            return daily_volatility, annual_volatility, historical_var, parametric_var
+
+        daily_volatility, annual_volatility, historical_var, parametric_var = graph.get("risk_metrics")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Daily Volatility", f"{daily_volatility * 100:.2f}%")
+            st.metric("1-Day VaR 95% (Historical)", f"{historical_var * total_invested_money:,.0f} VND")
+        with col2:
+            st.metric("Annualized Volatility", f"{annual_volatility * 100:.2f}%")
+            st.metric("1-Day VaR 95% (Parametric)", f"{parametric_var * total_invested_money:,.0f} VND")
+
+        # Correlation heatmap of the current portfolio
+        @graph.node("risk_returns", "risk_window")
+        def correlation_figure(risk_returns, risk_window):
+            corr = correlation_matrix(risk_returns)
+            fig_corr = go.Figure(
+                go.Heatmap(
+                    z=corr.values,
+                    x=corr.columns,
+                    y=corr.index,
+                    zmin=-1, zmax=1,
+                    colorscale="RdBu_r",
+                    text=corr.round(2).values,
+                    texttemplate="%{text}"
+                )
+            )
+            fig_corr.update_layout(
+                title=f"Correlation of Daily Returns (last {risk_window} trading days)",
+                template="plotly_white",
+                height=500
+            )
+            return fig_corr
+
+        st.plotly_chart(graph.get("correlation_figure"), use_container_width=True)
+
+        # Distribution of the portfolio value over the simulation horizon, simulated for 1 VND and scaled below
+        st.subheader("Simulated Portfolio Value")
+
+        @graph.node("risk_returns", "simulation_horizon", "simulation_method", "use_forecast_drift")
+        def simulation(risk_returns, simulation_horizon, simulation_method, use_forecast_drift):
+            drift = forecast_drift(list(risk_returns.columns)) if use_forecast_drift else None
+            simulated_values = simulate_portfolio_values(
+                risk_returns,
+                weights,
+                n_paths=SIMULATION_PATHS,
+                horizon_days=simulation_horizon,
+                method="bootstrap" if simulation_method == "Bootstrap" else "normal",
+                drift=drift,
+            )
+            drift_missing = drift is not None and np.isnan(drift).all()
+            return value_quantiles(simulated_values), summarize_outcomes(simulated_values), drift_missing
+
+        quantiles, outcomes, drift_missing = graph.get("simulation")
+        if drift_missing:
+            st.write("No batch forecasts are available, so the simulation uses the historical mean returns.")
+        quantiles = quantiles * total_invested_money
+        outcomes = {
+            key: value if key == "probability_of_loss" else value * total_invested_money
+            for key, value in outcomes.items()
+        }
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Median Value", f"{outcomes['median_value']:,.0f} VND")
+            st.metric("Probability of Loss", f"{outcomes['probability_of_loss'] * 100:.1f}%")
+        with col2:
+            st.metric(f"{simulation_horizon}-Day VaR 95%", f"{outcomes['value_at_risk']:,.0f} VND")
+            st.metric("Expected Shortfall 95%", f"{outcomes['expected_shortfall']:,.0f} VND")
+
+        fig_simulation = go.Figure()
+        for lower, upper, color in [("q5", "q95", "rgba(31, 119, 180, 0.15)"), ("q25", "q75", "rgba(31, 119, 180, 0.35)")]:
+            fig_simulation.add_trace(go.Scatter(x=quantiles.index, y=quantiles[upper], mode="lines", line=dict(width=0), showlegend=False))
+            fig_simulation.add_trace(go.Scatter(
+                x=quantiles.index, y=quantiles[lower], mode="lines", line=dict(width=0),
+                fill="tonexty", fillcolor=color, name=f"{lower[1:]}-{upper[1:]}th percentile"
+            ))
+        fig_simulation.add_trace(go.Scatter(x=quantiles.index, y=quantiles["q50"], mode="lines", name="Median", line=dict(width=2)))
+        fig_simulation.update_layout(
+            title=f"{SIMULATION_PATHS:,} Simulated Paths of the Portfolio Value",
+            xaxis=dict(title="Trading days ahead"),
+            yaxis=dict(title="Value (VND)"),
+            template="plotly_white",
+            height=500
+        )
+        st.plotly_chart(fig_simulation, use_container_width=True)
 
-        # Ensure proper datetime format
-        combined_data["TradingDate"] = pd.to_datetime(combined_data["TradingDate"])
+    if portfolio_data:
+        st.header("Stock Performance with Moving Averages")
 
-        # Create Plotly subplots
-        fig = make_subplots(
-            rows=2, cols=1,
-            shared_xaxes=True,
-            vertical_spacing=0.1,
-            row_heights=[0.7, 0.3]
-        )
+        @graph.node("tickers", "history_version")
+        def performance_figure(tickers, history_version):
+            # Shared across sessions by selection and data version, so the tickers are drawn in sorted order
+            def build():
+                histories = graph.get("histories")
+                # Combine data for all selected tickers
+                combined_data = pd.DataFrame()
+
+                for ticker in sorted(histories):
+                    # Copy the cached history before adding columns to it
+                    history_data = histories[ticker].copy()
+                    history_data["Ticker"] = ticker
+
+                    # Add moving averages
+                    history_data["MA_Close_20"] = history_data["Close"].rolling(window=20).mean()  # 20-day moving average
+                    history_data["MA_Open_20"] = history_data["Open"].rolling(window=20).mean()  # 20-day moving average for Open
+
+                    # Add volume color
+                    history_data["Volume_Color"] = [
+                        "green" if close > open_ else "red"
+                        for close, open_ in zip(history_data["Close"], history_data["Open"])
+                    ]
+
+                    # Combine all data
+                    combined_data = pd.concat([combined_data, history_data], axis=0)
+
+                # Ensure proper datetime format
+                combined_data["TradingDate"] = pd.to_datetime(combined_data["TradingDate"])
+
+                # Create Plotly subplots
+                fig = make_subplots(
+                    rows=2, cols=1,
+                    shared_xaxes=True,
+                    vertical_spacing=0.1,
+                    row_heights=[0.7, 0.3]
+                )
 
-        # Add traces for each ticker
-        for ticker in selected_company:
-            ticker_data = combined_data[combined_data["Ticker"] == ticker.strip()]
-
-            # Dynamically scale bar color intensity based on volume
-            max_volume = ticker_data["Volume"].max()
-            scaled_colors = [
-                f"rgba(50, 255, 50, {0.3 + 0.7 * (volume / max_volume)})" if color == "green"
-                else f"rgba(255, 50, 50, {0.3 + 0.7 * (volume / max_volume)})"
-                for volume, color in zip(ticker_data["Volume"], ticker_data["Volume_Color"])
-            ]
-
-            fig.add_trace(
-                go.Bar(
-                    x=ticker_data["TradingDate"],
-                    y=ticker_data["Volume"],
-                    name=f"{ticker.strip()} Volume",
-                    marker=dict(
-                        color=scaled_colors,
-                        line=dict(width=0.5)  # Add an outline to bars
-                    ),
-                    opacity=1.0  # Increase opacity for better visibility
-                ),
-                row=2, col=1
-            )
-            # Add Moving Average for Close Price
-            fig.add_trace(
-                go.Scatter(
-                    x=ticker_data["TradingDate"],
-                    y=ticker_data["MA_Close_20"],
-                    mode="lines",
-                    name=f"{ticker.strip()} MA (20-day) Close",
-                    line=dict(width=1.5, dash="dot")
-                ),
-                row=1, col=1
-            )
+                # Add traces for each ticker
+                for ticker in sorted(histories):
+                    ticker_data = combined_data[combined_data["Ticker"] == ticker]
+
+                    # Dynamically scale bar color intensity based on volume
+                    max_volume = ticker_data["Volume"].max()
+                    scaled_colors = [
+                        f"rgba(50, 255, 50, {0.3 + 0.7 * (volume / max_volume)})" if color == "green"
+                        else f"rgba(255, 50, 50, {0.3 + 0.7 * (volume / max_volume)})"
+                        for volume, color in zip(ticker_data["Volume"], ticker_data["Volume_Color"])
+                    ]
+
+                    fig.add_trace(
+                        go.Bar(
+                            x=ticker_data["TradingDate"],
+                            y=ticker_data["Volume"],
+                            name=f"{ticker} Volume",
+                            marker=dict(
+                                color=scaled_colors,
+                                line=dict(width=0.5)  # Add an outline to bars
+                            ),
+                            opacity=1.0  # Increase opacity for better visibility
+                        ),
+                        row=2, col=1
+                    )
+                    # Add Moving Average for Close Price
+                    fig.add_trace(
+                        go.Scatter(
+                            x=ticker_data["TradingDate"],
+                            y=ticker_data["MA_Close_20"],
+                            mode="lines",
+                            name=f"{ticker} MA (20-day) Close",
+                            line=dict(width=1.5, dash="dot")
+                        ),
+                        row=1, col=1
+                    )
 
-            # Add Open Price line
-            fig.add_trace(
-                go.Scatter(
-                    x=ticker_data["TradingDate"],
-                    y=ticker_data["Open"],
-                    mode="lines",
-                    name=f"{ticker.strip()} Open Price",
-                    line=dict(width=2)
-                ),
-                row=1, col=1
-            )
+                    # Add Open Price line
+                    fig.add_trace(
+                        go.Scatter(
+                            x=ticker_data["TradingDate"],
+                            y=ticker_data["Open"],
+                            mode="lines",
+                            name=f"{ticker} Open Price",
+                            line=dict(width=2)
+                        ),
+                        row=1, col=1
+                    )
 
-            # Add Moving Average for Open Price
-            fig.add_trace(
-                go.Scatter(
-                    x=ticker_data["TradingDate"],
-                    y=ticker_data["MA_Open_20"],
-                    mode="lines",
-                    name=f"{ticker.strip()} MA (20-day) Open",
-                    line=dict(width=1.5, dash="dot")
-                ),
-                row=1, col=1
-            )
+                    # Add Moving Average for Open Price
+                    fig.add_trace(
+                        go.Scatter(
+                            x=ticker_data["TradingDate"],
+                            y=ticker_data["MA_Open_20"],
+                            mode="lines",
+                            name=f"{ticker} MA (20-day) Open",
+                            line=dict(width=1.5, dash="dot")
+                        ),
+                        row=1, col=1
+                    )
 
-            # Add Volume as Bar Chart
-            fig.add_trace(
-                go.Bar(
-                    x=ticker_data["TradingDate"],
-                    y=ticker_data["Volume"],
-                    name=f"{ticker.strip()} Volume",
-                    marker=dict(color=ticker_data["Volume_Color"]),
-                    opacity=0.8
-                ),
-                row=2, col=1
-            )
+                    # Add Volume as Bar Chart
+                    fig.add_trace(
+                        go.Bar(
+                            x=ticker_data["TradingDate"],
+                            y=ticker_data["Volume"],
+                            name=f"{ticker} Volume",
+                            marker=dict(color=ticker_data["Volume_Color"]),
+                            opacity=0.8
+                        ),
+                        row=2, col=1
+                    )
 
-        # Update layout for better visualization
-        fig.update_layout(
-            title="Stock Price and Volume Performance with Moving Averages",
-            xaxis=dict(title="Date"),
-            yaxis=dict(title="Price (VND)", showgrid=True),
-            yaxis2=dict(title="Volume", showgrid=True),
-            legend_title="Ticker",
-            template="plotly_white",  # Optional: Use "plotly_dark" for a dark theme
-            height=800,
-            showlegend=True
-        )
+                # Update layout for better visualization
+                fig.update_layout(
+                    title="Stock Price and Volume Performance with Moving Averages",
+                    xaxis=dict(title="Date"),
+                    yaxis=dict(title="Price (VND)", showgrid=True),
+                    yaxis2=dict(title="Volume", showgrid=True),
+                    legend_title="Ticker",
+                    template="plotly_white",  # Optional: Use "plotly_dark" for a dark theme
+                    height=800,
+                    showlegend=True
+                )
         
-        fig.update_yaxes(
-            title="Volume",
-            type="linear",  # Switch to "log" for better scaling if needed
-            row=2, col=1
-        )
+                fig.update_yaxes(
+                    title="Volume",
+                    type="linear",  # Switch to "log" for better scaling if needed
+                    row=2, col=1
+                )
 
-        fig.update_layout(
-            barmode="overlay",  # Avoid stacked bars
-            bargap=0.05,  # Minimize gaps between bars
-            template="plotly_white"  # Optional: Use a light theme for better contrast
-        )
+                fig.update_layout(
+                    barmode="overlay",  # Avoid stacked bars
+                    bargap=0.05,  # Minimize gaps between bars
+                    template="plotly_white"  # Optional: Use a light theme for better contrast
+                )
+                return fig
+
+            return cached_figure(figure_key("portfolio-performance", tickers, version=history_version), build)
 
         # Render the chart in Streamlit
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(graph.get("performance_figure"), use_container_width=True)
     
     # Buy/Sell Prediction Section
-    if recalculate and portfolio_data:
+    if portfolio_data:
         st.header("Buy / Sell Prediction")
 
+        @graph.node("histories", shared=True)
+        def buy_sell_signals(histories):
+            # Predict buy and sell probabilities on copies, as the indicators are added to the data
+            return {
+                ticker: (
+                    predict_buy_sell_probability(BUY_INDICATOR_MODEL, history_data.copy()),  # Binary: 1 = Buy, 0 = Don't Buy
+                    predict_buy_sell_probability(SELL_INDICATOR_MODEL, history_data.copy()),  # Binary: 1 = Sell, 0 = Don't Sell
+                )
+                for ticker, history_data in histories.items()
+            }
+
+        signals = graph.get("buy_sell_signals")
+
         # Create individual buy/sell prediction containers
         cols = st.columns(len(portfolio_data))  # One column per ticker
 
         for col, data in zip(cols, portfolio_data):
             ticker = data["ticker"]
-
-            # Load stock data for the ticker
-            company_info = ticker_info[ticker_info["ticker"] == ticker].iloc[0]
-            exchange = company_info["exchange"]
-            stock_data = read_history_data(ticker, exchange)
-
-            # Predict buy and sell probabilities
-            is_buy = predict_buy_sell_probability(BUY_INDICATOR_MODEL, stock_data)  # Binary: 1 = Buy, 0 = Don't Buy
-            is_sell = predict_buy_sell_probability(SELL_INDICATOR_MODEL, stock_data)  # Binary: 1 = Sell, 0 = Don't Sell
+            is_buy, is_sell = signals[ticker]
 
             # Determine visualization details
             buy_label = "✓ Buy" if is_buy >= 1 else "✗ Don't Buy"
@@ -378,26 +530,28 @@ if recalculate and selected_company:
     if portfolio_data:
         st.header("Next Open Price Prediction")
         if portfolio_data:
-            try:
-                for ticker in selected_company:
-                    company_info = ticker_info[ticker_info["ticker"] == ticker.strip()].iloc[0]
-                    exchange = company_info["exchange"]
-
-                    # Read historical data for the ticker
-                    history_data = read_history_data(ticker.strip(), exchange)
+            @graph.node("histories", shared=True)
+            def open_predictions(histories):
+                predictions = {}
+                for ticker, history_data in histories.items():
                     last_open_price = history_data["Open"].iloc[-1]
 
                     # Predict Next Day Open Price
                     next_day_price = predict_new_data(history_data, ["Close", "High", "Low"], 30)[-1]
-                    next_day_price = float(next_day_price)  # Ensure it's a scalar value
+                    next_day_price = float(np.squeeze(next_day_price))  # Ensure it's a scalar value
 
                     # Predict Next 3rd Day Open Price
                     next_3rd_day_price = predict_3rd_day_open_price(history_data, ["Close", "High", "Low"], 30)[-1]
-                    next_3rd_day_price = float(next_3rd_day_price)  # Ensure it's a scalar value
+                    next_3rd_day_price = float(np.squeeze(next_3rd_day_price))  # Ensure it's a scalar value
 
                     # Predict Next 3 Days Consecutive Open Prices
                     next_3_days_prices_raw = predict_3_consecutive_days_open_price(history_data, ["Close", "High", "Low"], 30)
                     next_3_days_prices = [float(price) for price in next_3_days_prices_raw[0]]  # Flatten the array and convert to float
+                    predictions[ticker] = (last_open_price, next_day_price, next_3rd_day_price, next_3_days_prices)
+                return predictions
+
+            try:
+                for ticker, (last_open_price, next_day_price, next_3rd_day_price, next_3_days_prices) in graph.get("open_predictions").items():
 
                     # Calculate differences for the first day in the 3 consecutive predictions
                     diff_next_day = next_day_price - last_open_price
@@ -461,4 +615,11 @@ if recalculate and selected_company:
                         unsafe_allow_html=True,
                     )
             except Exception as e:
-                st.write("Please turn on the API server to enable predictions. The API server is currently off. Please allocate to the Google Colab and run the task 5.1 to start the NGROK server.")
\ No newline at end of file
+                st.write("Please turn on the API server to enable predictions. The API server is currently off. Please allocate to the Google Colab and run the task 5.1 to start the NGROK server.")
+
+# Which page computations were reused from the previous run and which were recomputed
+if show_graph_debug:
+    with st.expander("Computation cache", expanded=True):
+        graph_runs = graph.debug_frame()
+        st.write(f"{(graph_runs['status'] == 'hit').sum()} hits, {(graph_runs['status'] == 'miss').sum()} misses")
+        st.dataframe(graph_runs, hide_index=True, use_container_width=True)
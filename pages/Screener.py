@@ -0,0 +1,45 @@
+import time
+import streamlit as st
+import pandas as pd
+from utils.metrics import track_session
+from utils.screener import load_screener_table, screen, SCREENER_FIELDS, SCREENER_TABLE_PATH
+
+track_session()
+
+st.title("Stock Screener")
+st.write("Filter the whole market by valuation, profitability and technical indicators.")
+
+table = load_screener_table()
+if table is None:
+    st.warning(f"The screener table ({SCREENER_TABLE_PATH}) has not been built yet. "
+               "Run `python -m utils.screener --build` to create it.")
+    st.stop()
+
+with st.sidebar:
+    order_fields = sorted(name for name, column in SCREENER_FIELDS.items() if column in table.order)
+    order_by = st.selectbox("Order by", order_fields, index=order_fields.index("marcap"))
+    descending = st.radio("Sort order", ["Descending", "Ascending"], horizontal=True) == "Descending"
+    limit = st.selectbox("Results", [25, 50, 100, 250], index=1)
+
+query = st.text_input(
+    "Screen",
+    value="P/B < 1 and ROE > 15% and RSI < 50 on HOSE",
+    help="Combine comparisons with and, or, not and parentheses. 'on HOSE' keeps one exchange, "
+         "industry = \"Ngân hàng\" one industry. Fractions such as ROE accept percentages (15% = 0.15)."
+)
+
+try:
+    start = time.perf_counter()
+    count, results = screen(table, query, order_by, descending, limit)
+    elapsed = time.perf_counter() - start
+except ValueError as e:
+    st.error(str(e))
+else:
+    st.caption(f"{count} of {table.size} tickers match, showing {len(results)} ({elapsed * 1000:.1f} ms)")
+    st.dataframe(results, hide_index=True)
+
+with st.expander("Fields"):
+    fields = pd.Series(SCREENER_FIELDS).rename_axis("Name").reset_index(name="Column")
+    st.dataframe(fields.groupby("Column")["Name"].agg(", ".join).reset_index(), hide_index=True)
+    st.caption("Valuation comes from the industry analysis (or the latest quarterly ratios), price and indicators "
+               "from the last trading day. Marcap is in billion VND; change, returns and MA gaps in percent.")
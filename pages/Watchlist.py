@@ -1,8 +1,16 @@
+import time
 import streamlit as st
 import pandas as pd
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
-from utils.data_related import load_ticker_generic_info, combine_ticker_name, construct_wishlist_table, read_history_data
+from utils.data_related import load_ticker_generic_info, combine_ticker_name, build_wishlist_data, stream_wishlist_rows, wishlist_frame_from_rows, sort_and_paginate_wishlist, count_wishlist_pages, style_wishlist_table, read_history_data, dataset_version
+from utils.figure_cache import cached_figure, figure_key
+from utils.metrics import track_session
+from utils.ticker_search import ranked_options
+from utils.alerts import (load_rules, add_rule, remove_rule, read_alerts, describe_alert, ALERT_FIELDS, ALERT_OPERATORS,
+                          ALERT_POLL_SECONDS)
+
+track_session()
 
 st.title("Your Watchlist")
 st.write("Choose the stocks you want to keep an eye on.")
@@ -12,140 +20,256 @@ ticker_name_list = [str(i).split("-")[0] for i in list(combine_ticker_name(ticke
 title_name = "{company_name} Information"
 
 with st.sidebar:
+    # Narrow the companies by ticker, name or industry, with or without Vietnamese diacritics
+    company_query = st.text_input("Search companies", placeholder="Ticker, name or industry, e.g. ngan hang")
+    # The default selection is set once in the session state: a default passed to the widget would have to be
+    # among the searched options on every run, even after the user removed it
+    current_companies = st.session_state.setdefault("watchlist_companies", ["ACB ", "BID ", "CTG ", "VCB ", "EIB "])
     selected_company = st.multiselect(
     "Choose the ticker to add to your watchlist",
-    list(ticker_name_list),
-    ["ACB ", "BID ", "CTG ", "VCB ", "EIB "]
+    ranked_options(company_query, ticker_name_list, ticker_info, keep=current_companies),
+    key="watchlist_companies"
 )
 
+    # Server-side sorting and pagination of the watchlist table
+    sort_by = st.selectbox(
+        "Sort the watchlist by",
+        ["Default Order", "Name", "Last Close", "Change", "Change %", "Volume",
+         "Predict Next Day Open", "Predict Day 3 After Open", "Predict Average 3 Days Later Open"]
+    )
+    ascending = st.radio("Sort order", ["Ascending", "Descending"], horizontal=True) == "Ascending"
+    page_size = st.selectbox("Rows per page", [10, 25, 50, 100], index=1)
+    stream_rows = st.checkbox("Show rows as soon as they are ready", value=True)
+
 if selected_company:
-    wishlist_df = construct_wishlist_table(selected_company, ticker_info)
-    
-    # Apply conditional formatting
-    st.dataframe(construct_wishlist_table(selected_company, ticker_info))
-    
+    total_pages = count_wishlist_pages(len(selected_company), page_size)
+    page = st.number_input("Page", min_value=1, max_value=total_pages, value=1, step=1)
+    st.caption(f"Page {page} of {total_pages} ({len(selected_company)} tickers)")
+
+    def render_wishlist_page(wishlist_df, placeholder):
+        # Apply conditional formatting to the visible rows only
+        page_df = sort_and_paginate_wishlist(
+            wishlist_df,
+            sort_by=None if sort_by == "Default Order" else sort_by,
+            ascending=ascending,
+            page=page,
+            page_size=page_size
+        )
+        placeholder.dataframe(style_wishlist_table(page_df))
+
+    table_placeholder = st.empty()
+    try:
+        if stream_rows:
+            # Show market data as soon as it is read and fill in forecasts as they arrive
+            wishlist_rows = [None] * len(selected_company)
+            last_render = 0.0
+            for event, position, values in stream_wishlist_rows(selected_company, ticker_info):
+                if event == "market":
+                    wishlist_rows[position] = values
+                else:
+                    wishlist_rows[position].update(values)
+
+                # Throttle re-rendering so large watchlists are not restyled for every event
+                if time.monotonic() - last_render > 0.25:
+                    render_wishlist_page(wishlist_frame_from_rows([row for row in wishlist_rows if row is not None]), table_placeholder)
+                    last_render = time.monotonic()
+
+            wishlist_df = wishlist_frame_from_rows(wishlist_rows)
+        else:
+            wishlist_df = build_wishlist_data(selected_company, ticker_info)
+
+        render_wishlist_page(wishlist_df, table_placeholder)
+        st.caption("± after a prediction is that forecast's mean absolute percentage error over the past year "
+                   "of this ticker, from `python -m utils.forecast_accuracy`.")
+    except Exception as e:
+        st.write("Please turn on the API server to enable predictions. The API server is currently off. Please allocate to the Google Colab and run the task 5.1 to start the NGROK server.")
+
+    # Alert rules on the watched tickers, evaluated after every ingest of new bars by `python -m utils.alerts`
+    watched_tickers = [ticker.strip() for ticker in selected_company]
+    with st.expander("Alerts"):
+        with st.form("add_alert", clear_on_submit=True):
+            alert_columns = st.columns(4)
+            alert_ticker = alert_columns[0].selectbox("Ticker", watched_tickers)
+            alert_field = alert_columns[1].selectbox("When", list(ALERT_FIELDS), format_func=ALERT_FIELDS.get)
+            alert_operator = alert_columns[2].selectbox("Direction", list(ALERT_OPERATORS), format_func=ALERT_OPERATORS.get)
+            alert_threshold = alert_columns[3].number_input("Level", value=30.0)
+            if st.form_submit_button("Add alert"):
+                add_rule(alert_ticker, alert_field, alert_operator, alert_threshold)
+
+        alert_rules = load_rules()
+        alert_rules = alert_rules[alert_rules["ticker"].isin(watched_tickers)]
+        if alert_rules.empty:
+            st.caption("No alerts on these tickers yet.")
+        else:
+            rule_labels = {
+                rule.rule_id: f"{rule.ticker}: {ALERT_FIELDS[rule.field]} {ALERT_OPERATORS[rule.operator]} {rule.threshold:,.2f}"
+                for rule in alert_rules.itertuples()
+            }
+            st.write("\n".join(f"- {label}" for label in rule_labels.values()))
+            removed_rule = st.selectbox("Alert to remove", list(rule_labels), format_func=rule_labels.get)
+            if st.button("Remove alert"):
+                remove_rule(removed_rule)
+                st.rerun()
+
+    @st.fragment(run_every=ALERT_POLL_SECONDS)
+    def show_new_alerts():
+        # Only the part of the alert log appended since the session's last poll is read
+        new_alerts, st.session_state["alert_offset"] = read_alerts(st.session_state.get("alert_offset"))
+        recent_alerts = st.session_state.setdefault("recent_alerts", [])
+        for alert in new_alerts:
+            if alert["ticker"] in watched_tickers:
+                st.toast(describe_alert(alert))
+                recent_alerts.insert(0, alert)
+        del recent_alerts[10:]
+        if recent_alerts:
+            st.caption("Recent alerts: " + "; ".join(describe_alert(alert) for alert in recent_alerts))
+
+    show_new_alerts()
+
     # Line chart for stock performance
     st.header("Stock Price Performance (Open / Close Price and Volume)")
 
-    # Prepare combined data
-    combined_data = pd.DataFrame()
-    line_colors = {}  # Store line colors for tickers
-
-    for ticker in selected_company:
-        # Retrieve company info
-        company_info = ticker_info[ticker_info["ticker"] == ticker.strip()].iloc[0]
-        exchange = company_info["exchange"]
-
-        # Read historical data
-        history_data = read_history_data(ticker.strip(), exchange)
-        history_data["Ticker"] = ticker  # Add a column for the ticker
-        history_data["Color"] = [
-            "green" if close > open_ else "red"
-            for close, open_ in zip(history_data["Close"], history_data["Open"])
-        ]  # Color based on price movement
-        combined_data = pd.concat([combined_data, history_data], axis=0)
-
-    # Ensure proper datetime format
-    combined_data["TradingDate"] = pd.to_datetime(combined_data["TradingDate"])
-
-    # Create a Plotly figure with subplots for Close Price and Volume
-    fig_close_volume = make_subplots(
-        rows=2, cols=1, 
-        shared_xaxes=True,  # Share the x-axis between price and volume
-        vertical_spacing=0.1,  # Space between subplots
-        row_heights=[0.7, 0.3]  # Adjust heights (70% for price, 30% for volume)
-    )
+    # Charts are cached by selection and data version, so they draw the tickers in sorted order
+    chart_tickers = sorted(selected_company)
+    chart_exchanges = [(ticker.strip(), ticker_info[ticker_info["ticker"] == ticker.strip()].iloc[0]["exchange"]) for ticker in chart_tickers]
+    history_version = dataset_version("stock-historical-data", chart_exchanges)
+    loaded = {}
 
-    # Add stock price traces (Close Price)
-    for ticker in selected_company:
-        ticker_data = combined_data[combined_data["Ticker"] == ticker]
-        # Assign a unique color for each ticker line
-        line_color = f"hsl({hash(ticker) % 150}, 70%, 50%)"
-        line_colors[ticker] = line_color
-
-        fig_close_volume.add_trace(
-            go.Scatter(
-                x=ticker_data["TradingDate"],
-                y=ticker_data["Close"],
-                mode="lines",
-                name=f"{ticker} Close Price",
-                line=dict(color=line_color)  # Use the dynamically assigned color
-            ),
-            row=1, col=1
-        )
+    def load_combined_data():
+        # Read the histories once, and only if one of the figures is not cached
+        if "combined_data" in loaded:
+            return loaded["combined_data"]
+
+        # Prepare combined data
+        combined_data = pd.DataFrame()
+        for ticker, (ticker_name, exchange) in zip(chart_tickers, chart_exchanges):
+            # Read historical data
+            history_data = read_history_data(ticker_name, exchange)
+            history_data["Ticker"] = ticker  # Add a column for the ticker
+            history_data["Color"] = [
+                "green" if close > open_ else "red"
+                for close, open_ in zip(history_data["Close"], history_data["Open"])
+            ]  # Color based on price movement
+            combined_data = pd.concat([combined_data, history_data], axis=0)
 
-    # Add volume traces and Volume_MA traces
-    for ticker in selected_company:
-        ticker_data = combined_data[combined_data["Ticker"] == ticker]
-        # Add volume bars
-        fig_close_volume.add_trace(
-            go.Bar(
-                x=ticker_data["TradingDate"],
-                y=ticker_data["Volume"],
-                name=f"{ticker} Volume",
-                marker=dict(color=ticker_data["Color"]),  # Dynamic bar colors
-                opacity=0.8  # Slight transparency for better visualization
-            ),
-            row=2, col=1
+        # Ensure proper datetime format
+        combined_data["TradingDate"] = pd.to_datetime(combined_data["TradingDate"])
+        loaded["combined_data"] = combined_data
+        return combined_data
+
+    # Assign a unique color for each ticker line, shared by both charts
+    line_colors = {ticker: f"hsl({hash(ticker) % 150}, 70%, 50%)" for ticker in chart_tickers}
+
+    def build_close_volume_figure():
+        combined_data = load_combined_data()
+
+        # Create a Plotly figure with subplots for Close Price and Volume
+        fig_close_volume = make_subplots(
+            rows=2, cols=1, 
+            shared_xaxes=True,  # Share the x-axis between price and volume
+            vertical_spacing=0.1,  # Space between subplots
+            row_heights=[0.7, 0.3]  # Adjust heights (70% for price, 30% for volume)
         )
+
+        # Add stock price traces (Close Price)
+        for ticker in chart_tickers:
+            ticker_data = combined_data[combined_data["Ticker"] == ticker]
+            line_color = line_colors[ticker]
+
+            fig_close_volume.add_trace(
+                go.Scatter(
+                    x=ticker_data["TradingDate"],
+                    y=ticker_data["Close"],
+                    mode="lines",
+                    name=f"{ticker} Close Price",
+                    line=dict(color=line_color)  # Use the dynamically assigned color
+                ),
+                row=1, col=1
+            )
+
+        # Add volume traces and Volume_MA traces
+        for ticker in chart_tickers:
+            ticker_data = combined_data[combined_data["Ticker"] == ticker]
+            # Add volume bars
+            fig_close_volume.add_trace(
+                go.Bar(
+                    x=ticker_data["TradingDate"],
+                    y=ticker_data["Volume"],
+                    name=f"{ticker} Volume",
+                    marker=dict(color=ticker_data["Color"]),  # Dynamic bar colors
+                    opacity=0.8  # Slight transparency for better visualization
+                ),
+                row=2, col=1
+            )
         
-        # Calculate the 20-day moving average of volume
-        ticker_data["Volume_MA"] = ticker_data["Volume"].rolling(window=20).mean()
+            # Calculate the 20-day moving average of volume
+            ticker_data["Volume_MA"] = ticker_data["Volume"].rolling(window=20).mean()
         
-        # Add Volume_MA line using the same color as the Close Price line
-        fig_close_volume.add_trace(
-            go.Scatter(
-                x=ticker_data["TradingDate"],
-                y=ticker_data["Volume_MA"],
-                mode="lines",
-                name=f"{ticker} Volume (20-day MA)",
-                line=dict(color=line_colors[ticker], dash="dot")  # Match the color
-            ),
-            row=2, col=1
+            # Add Volume_MA line using the same color as the Close Price line
+            fig_close_volume.add_trace(
+                go.Scatter(
+                    x=ticker_data["TradingDate"],
+                    y=ticker_data["Volume_MA"],
+                    mode="lines",
+                    name=f"{ticker} Volume (20-day MA)",
+                    line=dict(color=line_colors[ticker], dash="dot")  # Match the color
+                ),
+                row=2, col=1
+            )
+
+        # Update layout for Close Price and Volume chart
+        fig_close_volume.update_layout(
+            title="Stock Close Price and Volume Performance",
+            xaxis=dict(title="Date"),
+            yaxis=dict(title="Close Price (VND)", showgrid=True),
+            yaxis2=dict(title="Volume", showgrid=True),
+            legend_title="Ticker",
+            template="plotly_dark",  # Optional: Change to "plotly" for light theme
+            height=800,  # Adjust overall height
+            showlegend=True,
+            barmode="relative"  # Prevent bars from overlapping
         )
+        return fig_close_volume
 
-    # Update layout for Close Price and Volume chart
-    fig_close_volume.update_layout(
-        title="Stock Close Price and Volume Performance",
-        xaxis=dict(title="Date"),
-        yaxis=dict(title="Close Price (VND)", showgrid=True),
-        yaxis2=dict(title="Volume", showgrid=True),
-        legend_title="Ticker",
-        template="plotly_dark",  # Optional: Change to "plotly" for light theme
-        height=800,  # Adjust overall height
-        showlegend=True,
-        barmode="relative"  # Prevent bars from overlapping
-    )
+    def build_open_price_figure():
+        combined_data = load_combined_data()
 
-    # Render the Close Price and Volume Plotly chart in Streamlit
-    st.plotly_chart(fig_close_volume, use_container_width=True)
-
-    # Line chart for stock performance Open
-    fig_open_price = go.Figure()
-
-    # Add Open Price traces
-    for ticker in selected_company:
-        ticker_data = combined_data[combined_data["Ticker"] == ticker]
-        fig_open_price.add_trace(
-            go.Scatter(
-                x=ticker_data["TradingDate"],
-                y=ticker_data["Open"],
-                mode="lines",
-                name=f"{ticker} Open Price",
-                line=dict(color=line_colors[ticker])  # Use the same color as the Close Price
+        # Line chart for stock performance Open
+        fig_open_price = go.Figure()
+
+        # Add Open Price traces
+        for ticker in chart_tickers:
+            ticker_data = combined_data[combined_data["Ticker"] == ticker]
+            fig_open_price.add_trace(
+                go.Scatter(
+                    x=ticker_data["TradingDate"],
+                    y=ticker_data["Open"],
+                    mode="lines",
+                    name=f"{ticker} Open Price",
+                    line=dict(color=line_colors[ticker])  # Use the same color as the Close Price
+                )
             )
+
+        # Update layout for Open Price chart
+        fig_open_price.update_layout(
+            title="Stock Open Price Performance",
+            xaxis=dict(title="Date"),
+            yaxis=dict(title="Open Price (VND)", showgrid=True),
+            legend_title="Ticker",
+            template="plotly_dark",  # Optional: Change to "plotly" for light theme
+            height=600,  # Adjust overall height
+            showlegend=True
         )
+        return fig_open_price
 
-    # Update layout for Open Price chart
-    fig_open_price.update_layout(
-        title="Stock Open Price Performance",
-        xaxis=dict(title="Date"),
-        yaxis=dict(title="Open Price (VND)", showgrid=True),
-        legend_title="Ticker",
-        template="plotly_dark",  # Optional: Change to "plotly" for light theme
-        height=600,  # Adjust overall height
-        showlegend=True
+    # Render the Close Price and Volume Plotly chart in Streamlit
+    st.plotly_chart(
+        cached_figure(figure_key("watchlist-close-volume", chart_tickers, version=history_version), build_close_volume_figure),
+        use_container_width=True
     )
 
     # Render the Open Price Plotly chart in Streamlit
-    st.plotly_chart(fig_open_price, use_container_width=True)
+    st.plotly_chart(
+        cached_figure(figure_key("watchlist-open-price", chart_tickers, version=history_version), build_open_price_figure),
+        use_container_width=True
+    )
@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from utils.data_related import load_ticker_generic_info, read_history_data, read_forecast_table, resolve_dataset
+from utils.ml_model import calculate_rsi
+
+ALERTS_DIR = "data/derived/alerts"
+ALERT_RULES_PATH = os.path.join(ALERTS_DIR, "rules.csv")
+ALERT_STATE_PATH = os.path.join(ALERTS_DIR, "state.json")  # Whether each rule's condition held at the last evaluation
+ALERT_VALUES_PATH = os.path.join(ALERTS_DIR, "latest-values.parquet")
+ALERT_LOG_PATH = os.path.join(ALERTS_DIR, "alerts.jsonl")  # Triggered alerts, one JSON object per line
+ALERT_POLL_SECONDS = 30
+
+RULE_COLUMNS = ["rule_id", "ticker", "field", "operator", "threshold", "created_at"]
+# Fields a rule can watch; prices and indicators come from the last bar, the rest from the batch forecast of that bar
+ALERT_FIELDS = {
+    "close": "Close",
+    "change_percent": "Change %",
+    "volume": "Volume",
+    "rsi": "RSI",
+    "buy_probability": "Buy probability",
+    "sell_probability": "Sell probability",
+    "next_day_open": "Predicted next day open",
+}
+BAR_FIELDS = ["close", "change_percent", "volume", "rsi"]
+FORECAST_FIELDS = ["buy_probability", "sell_probability", "next_day_open"]
+ALERT_OPERATORS = {"above": "rises above", "below": "falls below"}
+RSI_WINDOW = 14
+
+def load_rules(path=ALERT_RULES_PATH):
+    """
+    Returns the registered rules, or an empty frame with the rule columns if there are none.
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=RULE_COLUMNS)
+    return pd.read_csv(path, dtype={"rule_id": str, "ticker": str})
+
+@contextmanager
+def _locked_rules(path):
+    import fcntl  # POSIX only, like the server processes that share the rules
+
+    # Rules are changed by read-modify-write; without the lock two sessions adding a rule at once would lose one
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _write_rules(rules, path):
+    # A temporary file of its own, so a writer never replaces the rules with another writer's half-written file
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path), suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "w", newline="") as file:
+            rules[RULE_COLUMNS].to_csv(file, index=False)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+def add_rule(ticker, field, operator, threshold, path=ALERT_RULES_PATH):
+    """
+    Registers a rule that fires when `field` of `ticker` rises above or falls below `threshold`.
+    Returns the id of the new rule.
+    """
+    if field not in ALERT_FIELDS:
+        raise ValueError(f"Unknown alert field: {field}")
+    if operator not in ALERT_OPERATORS:
+        raise ValueError(f"Unknown alert operator: {operator}")
+    rule = {
+        "rule_id": uuid.uuid4().hex[:12], "ticker": ticker.strip(), "field": field, "operator": operator,
+        "threshold": float(threshold), "created_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+    }
+    with _locked_rules(path):
+        _write_rules(pd.concat([load_rules(path), pd.DataFrame([rule])], ignore_index=True), path)
+    return rule["rule_id"]
+
+def remove_rule(rule_id, path=ALERT_RULES_PATH):
+    with _locked_rules(path):
+        rules = load_rules(path)
+        _write_rules(rules[rules["rule_id"] != rule_id], path)
+
+def bar_values(ticker, exchange):
+    """
+    Returns the last trading date and the bar fields of a ticker from the tail of its history:
+    only the last RSI_WINDOW + 1 closes are needed, so the rest of the history is not recomputed.
+    """
+    history_data = read_history_data(ticker, exchange).drop_duplicates(subset="TradingDate", keep="last")
+    tail = history_data.iloc[-(RSI_WINDOW + 1):]
+    close = tail["Close"].astype(np.float64)
+    return {
+        "ticker": ticker,
+        "last_trading_date": tail["TradingDate"].iloc[-1],
+        "close": close.iloc[-1],
+        "change_percent": 100 * (close.iloc[-1] / close.iloc[-2] - 1) if len(close) > 1 else np.nan,
+        "volume": float(tail["Volume"].iloc[-1]),
+        "rsi": calculate_rsi(close, RSI_WINDOW).iloc[-1],
+    }
+
+def latest_values(tickers, ticker_info_df, path=ALERT_VALUES_PATH):
+    """
+    Returns the watched fields of every ticker, indexed by ticker. Bar fields are stored with the checksum
+    of the history they were read from and only read again for the tickers whose history changed, i.e.
+    received new bars. Forecast fields are taken from the batch forecast table when it was computed from the same bar.
+    """
+    stored = pd.read_parquet(path).set_index("ticker") if os.path.exists(path) else pd.DataFrame()
+    exchanges = ticker_info_df.dropna(subset=["ticker"]).set_index("ticker")["exchange"]
+
+    rows = []
+    for ticker in tickers:
+        entry = resolve_dataset("stock-historical-data", ticker, exchanges.get(ticker))
+        if entry is None:
+            continue
+        if ticker in stored.index and stored.at[ticker, "checksum"] == entry["checksum"]:
+            rows.append(stored.loc[ticker].to_dict() | {"ticker": ticker})
+        else:
+            rows.append(bar_values(ticker, exchanges[ticker]) | {"checksum": entry["checksum"]})
+
+    values = pd.DataFrame(rows, columns=["ticker", "last_trading_date", "checksum", *BAR_FIELDS]).set_index("ticker")
+    if len(values):
+        refreshed = pd.concat([stored[~stored.index.isin(values.index)], values]) if len(stored) else values
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        refreshed.reset_index().to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+    forecast_table = read_forecast_table()
+    if forecast_table is None:
+        forecast_table = pd.DataFrame(columns=["last_trading_date", *FORECAST_FIELDS])
+    forecasts = forecast_table.reindex(values.index)
+    current = pd.to_datetime(forecasts["last_trading_date"]).dt.normalize() == pd.to_datetime(values["last_trading_date"]).dt.normalize()
+    for field in FORECAST_FIELDS:
+        values[field] = forecasts[field].astype(np.float64).where(current)
+    return values
+
+def evaluate_rules(rules, values, held):
+    """
+    Evaluates every rule in one vectorized pass over the latest values. `held` tells whether each rule's
+    condition held at the previous evaluation; a rule fires when its condition starts holding, so a level
+    crossed once alerts once. Rules whose value is missing keep their previous state.
+    Returns the mask of rules that fired, their current values and the new state.
+    """
+    matrix = values.reindex(columns=list(ALERT_FIELDS)).to_numpy(dtype=np.float64)
+    rows = values.index.get_indexer(rules["ticker"])
+    columns = pd.Index(list(ALERT_FIELDS)).get_indexer(rules["field"])
+
+    current = np.where(rows >= 0, matrix[rows, columns] if len(matrix) else np.nan, np.nan)
+    threshold = rules["threshold"].to_numpy(dtype=np.float64)
+    above = rules["operator"].to_numpy() == "above"
+    with np.errstate(invalid="ignore"):
+        holds = np.where(above, current > threshold, current < threshold)
+    holds = np.where(np.isnan(current), held, holds)
+    return holds & ~held, current, holds
+
+def run_alerts(ticker_info_df=None, rules_path=ALERT_RULES_PATH, state_path=ALERT_STATE_PATH, log_path=ALERT_LOG_PATH):
+    """
+    Evaluates all rules against the latest bars and forecasts, appends the alerts that fired to the alert log
+    and stores the rules' state. Meant to run after every ingest of new bars. Returns the new alerts.
+    """
+    rules = load_rules(rules_path)
+    if rules.empty:
+        return []
+    if ticker_info_df is None:
+        ticker_info_df = load_ticker_generic_info()
+
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path, encoding="utf-8") as file:
+            state = json.load(file)
+    held = np.array([state.get(rule_id, False) for rule_id in rules["rule_id"]], dtype=bool)
+
+    values = latest_values(rules["ticker"].unique(), ticker_info_df)
+    fired, current, holds = evaluate_rules(rules, values, held)
+
+    alerts = []
+    triggered_at = pd.Timestamp.now().isoformat(timespec="seconds")
+    for position in np.flatnonzero(fired):
+        rule = rules.iloc[position]
+        alerts.append({
+            "rule_id": rule["rule_id"], "ticker": rule["ticker"], "field": rule["field"], "operator": rule["operator"],
+            "threshold": float(rule["threshold"]), "value": float(current[position]),
+            "trading_date": str(values.at[rule["ticker"], "last_trading_date"])[:10], "triggered_at": triggered_at,
+        })
+
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    if alerts:
+        with open(log_path, "a", encoding="utf-8") as file:
+            file.writelines(json.dumps(alert) + "\n" for alert in alerts)
+    with open(state_path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(dict(zip(rules["rule_id"], holds.tolist())), file)
+    os.replace(state_path + ".tmp", state_path)
+    return alerts
+
+def read_alerts(offset=None, path=ALERT_LOG_PATH):
+    """
+    Returns the alerts appended to the log after byte `offset` and the offset to poll from next time.
+    Without an offset no alert is returned, only the end of the log, so a new reader starts from there.
+    """
+    if not os.path.exists(path):
+        return [], 0
+    if offset is None:
+        return [], os.path.getsize(path)
+    with open(path, "rb") as file:
+        file.seek(offset)
+        data = file.read()
+    # A line still being written is left for the next poll
+    complete = data[:data.rfind(b"\n") + 1]
+    return [json.loads(line) for line in complete.splitlines() if line.strip()], offset + len(complete)
+
+def describe_alert(alert):
+    return (f"{alert['ticker']}: {ALERT_FIELDS[alert['field']]} {ALERT_OPERATORS[alert['operator']]} "
+            f"{alert['threshold']:,.2f} ({alert['value']:,.2f} on {alert['trading_date']})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the alert rules against the latest bars and forecasts.")
+    parser.add_argument("--watch", type=float, help="Evaluate again every this many seconds")
+    parser.add_argument("--benchmark", type=int, help="Time one evaluation of this many random rules instead")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        from utils.market_panel import list_tickers
+
+        ticker_info = load_ticker_generic_info()
+        tickers = [ticker for ticker, _ in list_tickers(ticker_info)]
+        start = time.perf_counter()
+        values = latest_values(tickers, ticker_info, path=os.path.join(ALERTS_DIR, "benchmark-values.parquet"))
+        print(f"Latest values of {len(values)} tickers in {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        values = latest_values(tickers, ticker_info, path=os.path.join(ALERTS_DIR, "benchmark-values.parquet"))
+        print(f"Again without new bars in {time.perf_counter() - start:.2f}s")
+
+        generator = np.random.default_rng(0)
+        fields = generator.choice(list(ALERT_FIELDS), args.benchmark)
+        rules = pd.DataFrame({
+            "rule_id": [f"r{position}" for position in range(args.benchmark)],
+            "ticker": generator.choice(values.index.to_numpy(), args.benchmark),
+            "field": fields,
+            "operator": generator.choice(list(ALERT_OPERATORS), args.benchmark),
+        })
+        rules["threshold"] = values.reindex(columns=list(ALERT_FIELDS)).median().reindex(fields).to_numpy()
+        start = time.perf_counter()
+        fired, _, _ = evaluate_rules(rules, values, np.zeros(len(rules), dtype=bool))
+        print(f"Evaluated {len(rules)} rules in {(time.perf_counter() - start) * 1000:.1f} ms, {fired.sum()} fired")
+    else:
+        while True:
+            for alert in run_alerts():
+                print(describe_alert(alert))
+            if not args.watch:
+                break
+            time.sleep(args.watch)
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+import aiohttp
+import numpy as np
+
+DEFAULT_TICKERS = ["ACB", "BID", "CTG", "VCB", "EIB", "HPG", "FPT", "MWG", "VNM", "SSI", "VIC", "MSN"]
+
+# Request mix: (weight, method, path template, needs a JSON body)
+SCENARIOS = {
+    "snapshot": (4, "GET", "/snapshot/{ticker}", False),
+    "snapshots": (1, "POST", "/snapshots", True),
+    "history": (2, "GET", "/history/{ticker}", False),
+    "forecast": (2, "GET", "/forecast/{ticker}", False),
+}
+
+async def _wait_until_healthy(session, base_url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(base_url + "/health") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"API server at {base_url} did not become healthy within {timeout}s")
+
+async def run_load_test(base_url, concurrency=16, total_requests=500, scenarios=None, tickers=None, conditional=False, seed=0):
+    """
+    Sends `total_requests` requests from `concurrency` virtual users and returns the latency of each request.
+    With `conditional`, clients replay the ETag they last saw so repeated requests can be answered with 304.
+    """
+    scenarios = scenarios or list(SCENARIOS)
+    tickers = tickers or DEFAULT_TICKERS
+    weights = [SCENARIOS[name][0] for name in scenarios]
+    random_state = random.Random(seed)
+    remaining = iter(range(total_requests))
+    results = []  # (scenario, status, latency seconds, bytes)
+
+    async def virtual_user(session):
+        etags = {}
+        for _ in remaining:
+            scenario = random_state.choices(scenarios, weights)[0]
+            _, method, path, has_body = SCENARIOS[scenario]
+            ticker = random_state.choice(tickers)
+            url = base_url + path.format(ticker=ticker)
+            body = {"tickers": random_state.sample(tickers, min(5, len(tickers)))} if has_body else None
+            headers = {"If-None-Match": etags[url]} if conditional and url in etags else {}
+
+            start = time.perf_counter()
+            async with session.request(method, url, json=body, headers=headers) as response:
+                content = await response.read()
+            results.append((scenario, response.status, time.perf_counter() - start, len(content)))
+            if "ETag" in response.headers:
+                etags[url] = response.headers["ETag"]
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        await _wait_until_healthy(session, base_url)
+        start = time.perf_counter()
+        await asyncio.gather(*[virtual_user(session) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    return results, elapsed
+
+def summarize(results, elapsed):
+    """
+    Formats throughput, status counts and latency percentiles per scenario.
+    """
+    lines = [f"{len(results)} requests in {elapsed:.2f}s: {len(results) / elapsed:.1f} requests/sec"]
+    lines.append(f"{'scenario':<12}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}  statuses")
+    for scenario in sorted({result[0] for result in results}) + ["all"]:
+        selected = [result for result in results if scenario in ("all", result[0])]
+        latencies = np.array([result[2] for result in selected]) * 1000
+        statuses = {}
+        for result in selected:
+            statuses[result[1]] = statuses.get(result[1], 0) + 1
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        lines.append(f"{scenario:<12}{len(selected):>7}{p50:>10.1f}{p90:>10.1f}{p99:>10.1f}{latencies.max():>10.1f}  {statuses}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure requests/sec and latency of the HTTP API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="Base URL of a running API server")
+    parser.add_argument("--concurrency", type=int, default=16, help="Number of concurrent virtual users")
+    parser.add_argument("--requests", type=int, default=500, help="Total number of requests to send")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), help="Restrict the request mix")
+    parser.add_argument("--tickers", nargs="+", help="Tickers to pick requests from")
+    parser.add_argument("--conditional", action="store_true", help="Send If-None-Match with previously seen ETags")
+    parser.add_argument("--spawn", action="store_true",
+                        help="Start a local API server backed by the prediction stub for the duration of the test")
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="Latency of the spawned prediction stub")
+    args = parser.parse_args()
+
+    processes = []
+    base_url = args.url.rstrip("/")
+    if args.spawn:
+        environment = dict(os.environ, PREDICTION_API_URL="http://127.0.0.1:8500/")
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "utils.prediction_stub", "--port", "8500", "--latency", str(args.stub_latency)],
+            env=environment
+        ))
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "utils.api_server", "--port", base_url.rsplit(":", 1)[-1]],
+            env=environment
+        ))
+
+    try:
+        results, elapsed = asyncio.run(run_load_test(
+            base_url, args.concurrency, args.requests, args.scenarios, args.tickers, args.conditional
+        ))
+        print(summarize(results, elapsed))
+    finally:
+        for process in processes:
+            process.terminate()
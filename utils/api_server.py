@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from aiohttp import web
+
+from utils.data_related import load_ticker_generic_info, read_history_data, build_market_row, predict_open_prices
+from utils.export import EXPORT_SCHEMA, export_frames, export_tables
+from utils.market_panel import list_tickers
+
+HISTORY_CHUNK_ROWS = 500  # Rows written per chunk when streaming a history
+MAX_BATCH_TICKERS = 200
+FORECAST_COLUMNS = ["Predict Next Day Open", "Predict Day 3 After Open", "Predict Average 3 Days Later Open"]
+
+def _json_ready(values):
+    # Convert NumPy scalars to plain Python values, and NaN and infinities, which JSON cannot hold, to null
+    ready = {}
+    for key, value in values.items():
+        if isinstance(value, pd.Timestamp):
+            value = value.strftime("%Y-%m-%d")
+        elif isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, float) and not math.isfinite(value):
+            value = None
+        ready[key] = value
+    return ready
+
+def _etag(*parts):
+    return '"' + hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:16] + '"'
+
+class StockDataService:
+    """
+    Wraps the data loaders and the prediction calls for the HTTP handlers.
+    Blocking work runs in a thread pool so the event loop keeps serving other requests.
+    """
+
+    def __init__(self, ticker_info_df, max_workers=8):
+        self.ticker_info = ticker_info_df.dropna(subset=["ticker"]).set_index("ticker", drop=False)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def exchange_of(self, ticker):
+        if ticker not in self.ticker_info.index:
+            raise web.HTTPNotFound(text=f"Unknown ticker: {ticker}")
+        return self.ticker_info.at[ticker, "exchange"]
+
+    async def run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def history(self, ticker):
+        return await self.run(read_history_data, ticker, self.exchange_of(ticker))
+
+    async def snapshot(self, ticker):
+        history_data = await self.history(ticker)
+        row = build_market_row(self.ticker_info.loc[ticker], history_data)
+        row["Last Trading Date"] = history_data["TradingDate"].iloc[-1]
+        for pred_col in FORECAST_COLUMNS:
+            row.pop(pred_col)
+        return _json_ready(row)
+
+    async def forecast(self, ticker, history_data=None):
+        if history_data is None:
+            history_data = await self.history(ticker)
+        forecast = await self.run(predict_open_prices, history_data, ticker)
+        forecast["Ticker"] = ticker
+        forecast["Last Trading Date"] = history_data["TradingDate"].iloc[-1]
+        return _json_ready(forecast)
+
+def _conditional_response(request, body, etag):
+    # Answer 304 when the client already holds the version for the same last trading date
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers={"ETag": etag})
+    return web.json_response(body, headers={"ETag": etag})
+
+def _bad_request(message):
+    return web.HTTPBadRequest(text=json.dumps({"error": message}), content_type="application/json")
+
+async def _batch_tickers(request):
+    try:
+        payload = await request.json()
+    except json.JSONDecodeError:
+        raise _bad_request('The body must be JSON, e.g. {"tickers": ["FPT", "VNM"]}')
+    tickers = payload.get("tickers") if isinstance(payload, dict) else None
+    if not isinstance(tickers, list) or not tickers or len(tickers) > MAX_BATCH_TICKERS:
+        raise _bad_request(f"Send between 1 and {MAX_BATCH_TICKERS} tickers")
+    return [str(ticker).strip() for ticker in tickers]
+
+def _query_date(request, name):
+    # Dates are checked before a streamed response starts; once it has, an error can only cut the stream
+    value = request.query.get(name)
+    if not value:
+        return None
+    try:
+        date = pd.Timestamp(value)
+    except ValueError:
+        date = pd.NaT
+    if pd.isna(date):
+        raise _bad_request(f"{name} must be a date such as 2024-01-31")
+    return date
+
+async def _gather_batch(tickers, fetch):
+    # Run the per-ticker calls concurrently and report failures per ticker instead of failing the batch
+    results = await asyncio.gather(*[fetch(ticker) for ticker in tickers], return_exceptions=True)
+    return {
+        ticker: {"error": getattr(result, "text", str(result))} if isinstance(result, Exception) else result
+        for ticker, result in zip(tickers, results)
+    }
+
+async def handle_health(request):
+    return web.json_response({"status": "ok"})
+
+async def handle_tickers(request):
+    service = request.app["service"]
+    columns = ["ticker", "exchange", "shortName", "industry", "industryEn"]
+    records = service.ticker_info[columns].astype(object).where(service.ticker_info[columns].notna(), None)
+    return web.json_response(records.to_dict(orient="records"))
+
+async def handle_snapshot(request):
+    service = request.app["service"]
+    ticker = request.match_info["ticker"]
+    snapshot = await service.snapshot(ticker)
+    return _conditional_response(request, snapshot, _etag("snapshot", ticker, snapshot["Last Trading Date"]))
+
+async def handle_snapshots(request):
+    service = request.app["service"]
+    tickers = await _batch_tickers(request)
+    snapshots = await _gather_batch(tickers, service.snapshot)
+    etag = _etag("snapshots", *[(ticker, value.get("Last Trading Date")) for ticker, value in snapshots.items()])
+    return _conditional_response(request, snapshots, etag)
+
+async def handle_forecast(request):
+    service = request.app["service"]
+    ticker = request.match_info["ticker"]
+    forecast = await service.forecast(ticker)
+    # Failed predictions come back as nulls; they get no ETag, so clients ask again instead of keeping them
+    if any(forecast[column] is None for column in FORECAST_COLUMNS):
+        return web.json_response(forecast)
+    return _conditional_response(request, forecast, _etag("forecast", ticker, forecast["Last Trading Date"]))
+
+async def handle_forecasts(request):
+    service = request.app["service"]
+    tickers = await _batch_tickers(request)
+    return web.json_response(await _gather_batch(tickers, service.forecast))
+
+async def handle_history(request):
+    """
+    Streams a ticker's history as NDJSON (default) or CSV, HISTORY_CHUNK_ROWS rows at a time.
+    Optional `start` and `end` query parameters filter on TradingDate (YYYY-MM-DD).
+    """
+    service = request.app["service"]
+    ticker = request.match_info["ticker"]
+    output_format = request.query.get("format", "ndjson")
+    if output_format not in ("ndjson", "csv"):
+        raise web.HTTPBadRequest(text="format must be ndjson or csv")
+
+    history_data = await service.history(ticker)
+    start, end = request.query.get("start"), request.query.get("end")
+    etag = _etag("history", ticker, history_data["TradingDate"].iloc[-1], start, end, output_format)
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers={"ETag": etag})
+
+    history_data = history_data.drop(columns=["Unnamed: 0"], errors="ignore")
+    history_data["TradingDate"] = history_data["TradingDate"].dt.strftime("%Y-%m-%d")
+    if start:
+        history_data = history_data[history_data["TradingDate"] >= start]
+    if end:
+        history_data = history_data[history_data["TradingDate"] <= end]
+
+    response = web.StreamResponse(headers={
+        "ETag": etag,
+        "Content-Type": "application/x-ndjson" if output_format == "ndjson" else "text/csv",
+    })
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+
+    for offset in range(0, len(history_data), HISTORY_CHUNK_ROWS):
+        chunk = history_data.iloc[offset:offset + HISTORY_CHUNK_ROWS]
+        if output_format == "ndjson":
+            text = chunk.to_json(orient="records", lines=True).rstrip("\n") + "\n"
+        else:
+            text = chunk.to_csv(index=False, header=offset == 0)
+        await response.write(text.encode())
+
+    await response.write_eof()
+    return response
+
+async def handle_export(request):
+    """
+    Streams the joined history, indicators, ratios and forecasts of several tickers as CSV (default)
+    or an Arrow IPC stream, one chunk of tickers at a time.
+    Query parameters: `tickers` and `exchanges` (comma-separated, default the whole market), `start`, `end`.
+    """
+    service = request.app["service"]
+    output_format = request.query.get("format", "csv")
+    if output_format not in ("csv", "arrow"):
+        raise web.HTTPBadRequest(text="format must be csv or arrow")
+
+    exchanges = [exchange for exchange in request.query.get("exchanges", "").split(",") if exchange] or None
+    tickers = [ticker for ticker, _ in list_tickers(service.ticker_info.reset_index(drop=True), exchanges)]
+    if request.query.get("tickers"):
+        requested = request.query["tickers"].split(",")
+        for ticker in requested:
+            service.exchange_of(ticker)
+        tickers = [ticker for ticker in tickers if ticker in set(requested)]
+    start_date, end_date = _query_date(request, "start"), _query_date(request, "end")
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/csv" if output_format == "csv" else "application/vnd.apache.arrow.stream",
+    })
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+
+    # Each chunk is produced in the thread pool and written out before the next one is read
+    tables = export_tables(export_frames(tickers, service.ticker_info, start_date, end_date))
+    buffer = io.BytesIO()
+    writer = pa_csv.CSVWriter(buffer, EXPORT_SCHEMA) if output_format == "csv" else pa.ipc.new_stream(buffer, EXPORT_SCHEMA)
+    while (table := await service.run(next, tables, None)) is not None:
+        writer.write_table(table)
+        await response.write(buffer.getvalue())
+        buffer.seek(0)
+        buffer.truncate()
+    writer.close()
+    await response.write(buffer.getvalue())
+
+    await response.write_eof()
+    return response
+
+def create_app(ticker_info_df=None, max_workers=8):
+    """
+    Creates the HTTP application serving ticker snapshots, histories, forecasts and exports.
+    """
+    if ticker_info_df is None:
+        ticker_info_df = load_ticker_generic_info()
+
+    app = web.Application()
+    app["service"] = StockDataService(ticker_info_df, max_workers)
+    app.add_routes([
+        web.get("/health", handle_health),
+        web.get("/tickers", handle_tickers),
+        web.get("/snapshot/{ticker}", handle_snapshot),
+        web.post("/snapshots", handle_snapshots),
+        web.get("/history/{ticker}", handle_history),
+        web.get("/forecast/{ticker}", handle_forecast),
+        web.post("/forecasts", handle_forecasts),
+        web.get("/export", handle_export),
+    ])
+
+    async def shutdown_executor(app):
+        app["service"].executor.shutdown(wait=False)
+
+    app.on_cleanup.append(shutdown_executor)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve ticker snapshots, histories and forecasts over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=8, help="Threads used for loaders and prediction calls")
+    args = parser.parse_args()
+
+    web.run_app(create_app(max_workers=args.workers), host=args.host, port=args.port)
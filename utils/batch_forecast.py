@@ -0,0 +1,183 @@
+import argparse
+import glob
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.data_related import load_ticker_generic_info, read_history_data, FORECAST_TABLE_PATH
+from utils.market_panel import list_tickers
+from utils.compiled_forest import load_forest_model, SKLEARN_FASTER_ROWS
+from utils.ml_model import prepare_inference_window, prepare_buy_sell_features, request_predictions, load_sklearn_model
+
+CHECKPOINT_DIR = "data/derived/forecast-checkpoint"
+LSTM_FEATURES = ["Close", "High", "Low"]
+WINDOW_SIZE = 30
+MAX_RETRIES = 3
+
+def prepare_ticker_features(ticker, exchange):
+    """
+    Reads a ticker's history and prepares everything the models need: the normalized LSTM window
+    with its Close min/max, and the buy/sell indicator features. Runs in a worker process.
+    """
+    try:
+        history_data = read_history_data(ticker, exchange)
+        window_norm, min_feature, max_feature = prepare_inference_window(history_data, LSTM_FEATURES, WINDOW_SIZE)
+        buy_sell_features = prepare_buy_sell_features(history_data.copy())[0].astype(np.float64)
+        if len(window_norm) < WINDOW_SIZE or not np.isfinite(window_norm).all():
+            raise ValueError("history too short or incomplete for a forecast window")
+    except Exception as e:
+        return {"ticker": ticker, "exchange": exchange, "error": str(e)}
+
+    return {
+        "ticker": ticker,
+        "exchange": exchange,
+        "last_trading_date": str(history_data["TradingDate"].max())[:10],
+        "last_open": float(history_data["Open"].iloc[-1]),
+        "last_close": float(history_data["Close"].iloc[-1]),
+        "window_norm": window_norm.astype(np.float64),
+        "close_min": float(min_feature[0]),
+        "close_max": float(max_feature[0]),
+        "buy_sell_features": buy_sell_features,
+        "error": None,
+    }
+
+def predict_in_batches(endpoint, windows, batch_size):
+    """
+    Sends the stacked windows to an endpoint `batch_size` samples per request, retrying failed requests.
+    Returns the normalized predictions with one row per window.
+    """
+    predictions = []
+    for start in range(0, len(windows), batch_size):
+        batch = windows[start:start + batch_size]
+        for attempt in range(MAX_RETRIES):
+            try:
+                predictions.append(np.asarray(request_predictions(endpoint, batch), dtype=np.float64).reshape(len(batch), -1))
+                break
+            except Exception:
+                if attempt == MAX_RETRIES - 1:
+                    raise
+                time.sleep(2 ** attempt)
+    return np.concatenate(predictions)
+
+def forecast_chunk(prepared, buy_model, sell_model, batch_size):
+    """
+    Runs the three LSTM horizons and the buy/sell models over a chunk of prepared tickers.
+    """
+    ready = [item for item in prepared if item["error"] is None]
+    rows = pd.DataFrame([
+        {key: value for key, value in item.items() if key not in ("window_norm", "buy_sell_features")}
+        for item in prepared
+    ])
+    for column in ["next_day_open", "day_3_open", "next_3_days_open_1", "next_3_days_open_2", "next_3_days_open_3",
+                   "avg_3_days_open", "buy_probability", "sell_probability"]:
+        rows[column] = np.nan
+
+    if ready:
+        positions = rows.index[rows["error"].isna()]
+        windows = np.stack([item["window_norm"] for item in ready])
+        close_min = np.array([item["close_min"] for item in ready])[:, None]
+        close_range = np.array([item["close_max"] for item in ready])[:, None] - close_min
+
+        # Denormalize with the Close min/max of each window, as in the interactive predictions
+        next_day = predict_in_batches("predict-next-day", windows, batch_size) * close_range + close_min
+        day_3 = predict_in_batches("predict-3rd-day", windows, batch_size) * close_range + close_min
+        next_3_days = predict_in_batches("predict-3-consecutive-days", windows, batch_size) * close_range + close_min
+
+        rows.loc[positions, "next_day_open"] = next_day[:, -1]
+        rows.loc[positions, "day_3_open"] = day_3[:, -1]
+        for day in range(3):
+            rows.loc[positions, f"next_3_days_open_{day + 1}"] = next_3_days[:, day]
+        rows.loc[positions, "avg_3_days_open"] = next_3_days[:, :3].mean(axis=1)
+
+        features = np.stack([item["buy_sell_features"] for item in ready])
+        rows.loc[positions, "buy_probability"] = buy_model.predict_proba(features)[:, 1] * 100
+        rows.loc[positions, "sell_probability"] = sell_model.predict_proba(features)[:, 1] * 100
+
+    rows["generated_at"] = pd.Timestamp.now().isoformat(timespec="seconds")
+    return rows
+
+def completed_tickers(checkpoint_dir):
+    """
+    Returns the tickers already written to the checkpoint parts of an interrupted run.
+    """
+    parts = sorted(glob.glob(os.path.join(checkpoint_dir, "part-*.parquet")))
+    if not parts:
+        return set()
+    return set(pd.concat([pd.read_parquet(part, columns=["ticker"]) for part in parts])["ticker"])
+
+def run_batch_forecast(tickers, output_path=FORECAST_TABLE_PATH, checkpoint_dir=CHECKPOINT_DIR,
+                       chunk_size=100, batch_size=64, workers=None, restart=False):
+    """
+    Forecasts every (ticker, exchange) pair, writing one checkpoint part per chunk so an interrupted run
+    resumes with the remaining tickers. When all chunks are done the parts are merged into the forecast table,
+    replacing the rows of the forecast tickers only.
+    """
+    if restart:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    done = completed_tickers(checkpoint_dir)
+    remaining = [(ticker, exchange) for ticker, exchange in tickers if ticker not in done]
+    print(f"{len(done)} tickers already forecast, {len(remaining)} remaining")
+
+    # Both forms give the same probabilities; large chunks are faster through sklearn
+    load_model = load_sklearn_model if chunk_size >= SKLEARN_FASTER_ROWS else load_forest_model
+    buy_model = load_model("models/buy_indicator.pkl")
+    sell_model = load_model("models/sell_indicator.pkl")
+    part_number = len(glob.glob(os.path.join(checkpoint_dir, "part-*.parquet")))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(remaining), chunk_size):
+            chunk = remaining[start:start + chunk_size]
+            chunk_start = time.perf_counter()
+            prepared = list(executor.map(prepare_ticker_features, *zip(*chunk), chunksize=8))
+            rows = forecast_chunk(prepared, buy_model, sell_model, batch_size)
+
+            # Write the part atomically so a crash never leaves a partial checkpoint behind
+            part_path = os.path.join(checkpoint_dir, f"part-{part_number:05d}.parquet")
+            rows.to_parquet(part_path + ".tmp", index=False)
+            os.replace(part_path + ".tmp", part_path)
+            part_number += 1
+            print(f"Forecast {start + len(chunk)}/{len(remaining)} tickers "
+                  f"({rows['error'].notna().sum()} skipped) in {time.perf_counter() - chunk_start:.1f}s")
+
+    parts = sorted(glob.glob(os.path.join(checkpoint_dir, "part-*.parquet")))
+    forecast_table = pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True)
+    forecast_table = forecast_table.drop_duplicates(subset="ticker", keep="last")
+    # A run over some tickers only replaces their rows; the forecasts of the other tickers are kept
+    if os.path.exists(output_path):
+        previous = pd.read_parquet(output_path)
+        forecast_table = pd.concat([previous[~previous["ticker"].isin(forecast_table["ticker"])], forecast_table],
+                                   ignore_index=True)
+    forecast_table = forecast_table.sort_values("ticker", ignore_index=True)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    forecast_table.to_parquet(output_path + ".tmp", index=False)
+    os.replace(output_path + ".tmp", output_path)
+    shutil.rmtree(checkpoint_dir)
+    return forecast_table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forecast open prices and buy/sell probabilities for every ticker.")
+    parser.add_argument("--tickers", nargs="+", help="Only forecast these tickers (default: the whole market)")
+    parser.add_argument("--output", default=FORECAST_TABLE_PATH, help="Path of the Parquet forecast table")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR, help="Directory holding the progress of a run")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Tickers per checkpoint")
+    parser.add_argument("--batch-size", type=int, default=64, help="Windows per prediction request")
+    parser.add_argument("--workers", type=int, default=None, help="Processes used for feature preparation")
+    parser.add_argument("--restart", action="store_true", help="Discard the progress of an interrupted run")
+    args = parser.parse_args()
+
+    tickers = list_tickers(load_ticker_generic_info())
+    if args.tickers:
+        tickers = [(ticker, exchange) for ticker, exchange in tickers if ticker in set(args.tickers)]
+
+    start = time.perf_counter()
+    forecast_table = run_batch_forecast(tickers, args.output, args.checkpoint_dir, args.chunk_size,
+                                        args.batch_size, args.workers, args.restart)
+    print(f"Wrote {len(forecast_table)} forecasts to {args.output} in {time.perf_counter() - start:.1f}s")
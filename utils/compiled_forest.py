@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from utils.ml_model import load_sklearn_model
+
+COMPILED_MODEL_DIR = "data/derived/models"
+BATCH_ROWS = 8192  # Rows evaluated together, which bounds the (rows x trees) working arrays
+# From about this many rows at once, sklearn's own compiled trees outrun the NumPy evaluator below;
+# the compiled form wins on the small batches and single rows of the pages
+SKLEARN_FASTER_ROWS = 400
+NODE_ARRAYS = ["feature", "threshold", "left", "right", "missing_left", "leaf_proba", "roots"]
+
+class CompiledForest:
+    """
+    A RandomForestClassifier flattened into contiguous node arrays shared by all its trees.
+    `left` and `right` hold global node indices and `roots` the first node of every tree. Leaves point to
+    themselves with an infinite threshold, so the whole forest is evaluated for a batch of rows at once,
+    one tree level per step, without checking which (row, tree) pairs already reached a leaf.
+    Probabilities are bit-identical to `predict_proba` of the original model.
+    """
+
+    def __init__(self, arrays, meta):
+        for name in NODE_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.meta = meta
+        self.classes_ = np.array(meta["classes"])
+        self.n_features_in_ = meta["n_features"]
+
+    @classmethod
+    def from_sklearn(cls, model, source=None):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+
+        def concatenate(values, dtype):
+            return np.ascontiguousarray(np.concatenate(values), dtype=dtype)
+
+        # Children are shifted by the tree's offset; leaves become their own children
+        nodes = np.arange(offsets[-1], dtype=np.int32)
+        is_leaf = np.concatenate([tree.children_left < 0 for tree in trees])
+        left = concatenate([tree.children_left + offset for tree, offset in zip(trees, offsets)], np.int32)
+        right = concatenate([tree.children_right + offset for tree, offset in zip(trees, offsets)], np.int32)
+        left[is_leaf] = nodes[is_leaf]
+        right[is_leaf] = nodes[is_leaf]
+
+        # Leaf values normalized exactly as DecisionTreeClassifier.predict_proba does
+        leaf_proba = concatenate([tree.value[:, 0, :] for tree in trees], np.float64)
+        normalizer = leaf_proba.sum(axis=1)[:, None]
+        normalizer[normalizer == 0.0] = 1.0
+        leaf_proba /= normalizer
+
+        arrays = {
+            "feature": np.where(is_leaf, 0, concatenate([tree.feature for tree in trees], np.int32)).astype(np.int32),
+            "threshold": np.where(is_leaf, np.inf, concatenate([tree.threshold for tree in trees], np.float64)),
+            "left": left,
+            "right": right,
+            "missing_left": concatenate([tree.missing_go_to_left for tree in trees], np.bool_),
+            "leaf_proba": leaf_proba,
+            "roots": np.ascontiguousarray(offsets[:-1], dtype=np.int32),
+        }
+        meta = {
+            "classes": model.classes_.tolist(),
+            "n_features": int(model.n_features_in_),
+            "n_trees": len(trees),
+            "max_depth": int(max(tree.max_depth for tree in trees)),
+            "source": source,
+        }
+        return cls(arrays, meta)
+
+    def save(self, directory):
+        """
+        Writes one .npy file per node array plus meta.json, replacing any previous version.
+        """
+        # A directory of its own next to the target, so processes compiling the same model never share one
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        temporary = tempfile.mkdtemp(dir=parent, prefix=os.path.basename(directory) + ".", suffix=".tmp")
+        try:
+            os.chmod(temporary, 0o755)  # mkdtemp makes it private to this user
+            for name in NODE_ARRAYS:
+                np.save(os.path.join(temporary, f"{name}.npy"), getattr(self, name))
+            with open(os.path.join(temporary, "meta.json"), "w", encoding="utf-8") as file:
+                json.dump(self.meta, file)
+            # The previous version is renamed aside, not deleted in place, so no reader sees it half-removed
+            try:
+                os.rename(directory, temporary + ".old")
+            except FileNotFoundError:
+                pass
+            try:
+                os.replace(temporary, directory)
+            except OSError:
+                # Another process put its copy in place first; it was compiled from the same model
+                if not os.path.exists(os.path.join(directory, "meta.json")):
+                    raise
+        finally:
+            shutil.rmtree(temporary, ignore_errors=True)
+            shutil.rmtree(temporary + ".old", ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Memory-maps a compiled forest; pages are only read from disk as nodes are visited.
+        """
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as file:
+            meta = json.load(file)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in NODE_ARRAYS}
+        return cls(arrays, meta)
+
+    def apply(self, X):
+        """
+        Returns the global index of the leaf reached in every tree, shape (rows, trees).
+        """
+        X = np.asarray(X, dtype=np.float32)  # Trees compare float32 features, as sklearn does
+        n_trees = len(self.roots)
+        nodes = np.tile(np.asarray(self.roots), len(X))
+        offsets = np.repeat(np.arange(len(X)) * X.shape[1], n_trees)
+        values = X.ravel()
+        has_missing = np.isnan(values).any()
+
+        # Only the (row, tree) pairs that moved on the last level are carried to the next one
+        active = np.arange(len(nodes))
+        current = nodes
+        for _ in range(self.meta["max_depth"]):
+            feature_values = values[offsets[active] + self.feature[current]]
+            go_left = feature_values <= self.threshold[current]
+            if has_missing:
+                go_left = np.where(np.isnan(feature_values), self.missing_left[current], go_left)
+            following = np.where(go_left, self.left[current], self.right[current])
+            moved = following != current
+            nodes[active] = following
+            active, current = active[moved], following[moved]
+            if not len(active):
+                break
+        return nodes.reshape(len(X), n_trees)
+
+    def predict_proba(self, X):
+        """
+        Averages the leaf probabilities over the trees. The trees are summed one after another in their
+        original order and divided by the number of trees, as sklearn does, so results match it bit for bit.
+        """
+        X = np.asarray(X)
+        proba = np.empty((len(X), len(self.classes_)), dtype=np.float64)
+        for start in range(0, len(X), BATCH_ROWS):
+            leaf_proba = self.leaf_proba[self.apply(X[start:start + BATCH_ROWS])]  # (rows, trees, classes)
+            proba[start:start + BATCH_ROWS] = np.cumsum(leaf_proba, axis=1)[:, -1] / self.meta["n_trees"]
+        return proba
+
+def _source_stamp(model_path):
+    stat = os.stat(model_path)
+    return {"path": model_path, "bytes": stat.st_size, "modified_ns": stat.st_mtime_ns}
+
+def compiled_model_path(model_path, directory=COMPILED_MODEL_DIR):
+    return os.path.join(directory, os.path.splitext(os.path.basename(model_path))[0])
+
+def compile_model(model_path, directory=COMPILED_MODEL_DIR):
+    """
+    Unpickles a RandomForestClassifier and writes its compiled form. Returns the compiled forest.
+    """
+    forest = CompiledForest.from_sklearn(load_sklearn_model(model_path), _source_stamp(model_path))
+    forest.save(compiled_model_path(model_path, directory))
+    return forest
+
+def load_forest_model(model_path, directory=COMPILED_MODEL_DIR):
+    """
+    Loads the compiled form of a pickled forest, compiling it first if it is missing or older than the pickle.
+    The result is a drop-in replacement for the model in `predict_buy_sell_probability`.
+    """
+    compiled_path = compiled_model_path(model_path, directory)
+    try:
+        forest = CompiledForest.load(compiled_path)
+        if forest.meta["source"] == _source_stamp(model_path):
+            return forest
+    except FileNotFoundError:
+        pass  # Not compiled yet, or being replaced by another process right now
+    return compile_model(model_path, directory)
+
+
+if __name__ == "__main__":
+    import warnings
+
+    from utils.data_related import load_ticker_generic_info, read_history_data
+    from utils.market_panel import list_tickers
+    from utils.ml_model import BUY_SELL_FEATURES, prepare_data_for_buy_sell_prediction
+
+    parser = argparse.ArgumentParser(description="Compile the buy/sell forests and check them against sklearn.")
+    parser.add_argument("--models", nargs="+", default=["models/buy_indicator.pkl", "models/sell_indicator.pkl"])
+    parser.add_argument("--tickers", type=int, default=100, help="Tickers whose full histories are used for the check")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", module="sklearn")
+
+    # Every day of a sample of histories, with the features the models were trained on
+    ticker_info = load_ticker_generic_info()
+    features = []
+    for ticker, exchange in list_tickers(ticker_info)[:args.tickers]:
+        try:
+            features.append(prepare_data_for_buy_sell_prediction(read_history_data(ticker, exchange))[BUY_SELL_FEATURES].to_numpy())
+        except FileNotFoundError:
+            continue
+    features = np.concatenate(features)
+
+    for model_path in args.models:
+        start = time.perf_counter()
+        model = load_sklearn_model(model_path)
+        unpickle_seconds = time.perf_counter() - start
+        compile_model(model_path)
+        start = time.perf_counter()
+        forest = load_forest_model(model_path)
+        load_seconds = time.perf_counter() - start
+
+        timings = {}
+        for name, predictor in [("sklearn", model), ("compiled", forest)]:
+            start = time.perf_counter()
+            for row in features[:200]:
+                predictor.predict_proba(row.reshape(1, -1))
+            single = (time.perf_counter() - start) / 200
+            start = time.perf_counter()
+            proba = predictor.predict_proba(features)
+            timings[name] = (single, time.perf_counter() - start, proba)
+
+        identical = np.array_equal(timings["sklearn"][2], timings["compiled"][2])
+        print(f"{model_path}: {forest.meta['n_trees']} trees, {len(forest.feature)} nodes, "
+              f"bit-identical on {len(features)} rows: {identical}")
+        print(f"  load: unpickle {unpickle_seconds * 1000:.1f} ms, memory-mapped {load_seconds * 1000:.2f} ms")
+        for name, (single, batch, _) in timings.items():
+            print(f"  {name}: {single * 1000:.3f} ms per single row, {batch:.3f}s for the batch")
@@ -0,0 +1,97 @@
+import hashlib
+import time
+
+import pandas as pd
+import streamlit as st
+
+from utils.metrics import record_cache_lookup
+from utils.shared_cache import cached
+
+class ComputeGraph:
+    """
+    Memoizes the computations of a page across Streamlit reruns.
+    Leaf inputs (tickers, amounts, dataset versions) are set on every run, and each node declares the inputs
+    or other nodes it depends on. A node's key is built from the keys of its dependencies, so a node is only
+    recomputed when something upstream of it changed, and a cached node never evaluates its dependencies.
+    Results are kept in `store` (the session state by default), one entry per node; callers must not modify them.
+    """
+
+    def __init__(self, name, store=None):
+        self.name = name
+        self.store = st.session_state if store is None else store
+        self.inputs = {}
+        self.nodes = {}
+        self.shared = set()
+        self.runs = []  # Hits and misses of the current script run
+        self._keys = {}
+        self._values = {}
+
+    def set_inputs(self, **inputs):
+        self.inputs.update(inputs)
+        self._keys.clear()
+        self._values.clear()
+
+    def node(self, *dependencies, shared=False):
+        """
+        Registers the decorated function as a node named after it, called with the values of `dependencies`.
+        Shared nodes are also looked up in the shared cache (utils/shared_cache.py) by graph, node and key, so
+        sessions of other server processes reuse them; their key must therefore only depend on data versions
+        and inputs, and their value must be picklable.
+        """
+        def register(function):
+            self.nodes[function.__name__] = (function, dependencies)
+            if shared:
+                self.shared.add(function.__name__)
+            return function
+        return register
+
+    def key_of(self, name):
+        if name in self.inputs:
+            return repr(self.inputs[name])
+        if name not in self._keys:
+            _, dependencies = self.nodes[name]
+            tokens = "|".join(f"{dependency}={self.key_of(dependency)}" for dependency in dependencies)
+            self._keys[name] = hashlib.sha1(f"{name}|{tokens}".encode()).hexdigest()[:16]
+        return self._keys[name]
+
+    def get(self, name):
+        """
+        Returns the value of an input or node, computing the node only if its key changed since it was cached.
+        """
+        if name in self.inputs:
+            return self.inputs[name]
+        if name in self._values:
+            return self._values[name]
+
+        cache = self.store.setdefault(f"compute_graph:{self.name}", {})
+        key = self.key_of(name)
+        record_cache_lookup("compute_graph", name in cache and cache[name][0] == key)
+        if name in cache and cache[name][0] == key:
+            value = cache[name][1]
+            self.runs.append({"node": name, "status": "hit", "seconds": 0.0, "key": key})
+        else:
+            function, dependencies = self.nodes[name]
+            # Dependencies of a shared node are only evaluated if no process has computed it yet
+            arguments = None if name in self.shared else [self.get(dependency) for dependency in dependencies]
+            start = time.perf_counter()
+            try:
+                if arguments is None:
+                    value = cached("compute_graph", f"{self.name}|{name}|{key}",
+                                   lambda: function(*[self.get(dependency) for dependency in dependencies]))
+                else:
+                    value = function(*arguments)
+            except Exception:
+                # Failures are not cached, so the node runs again on the next rerun
+                self.runs.append({"node": name, "status": "error", "seconds": time.perf_counter() - start, "key": key})
+                raise
+            cache[name] = (key, value)
+            self.runs.append({"node": name, "status": "miss", "seconds": time.perf_counter() - start, "key": key})
+
+        self._values[name] = value
+        return value
+
+    def debug_frame(self):
+        """
+        Returns the nodes evaluated in this run with whether they hit the cache and how long they took.
+        """
+        return pd.DataFrame(self.runs, columns=["node", "status", "seconds", "key"])
@@ -0,0 +1,166 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.data_related import (load_ticker_generic_info, read_compact_csv, resolve_dataset, load_quality_masks,
+                                QUALITY_MASKS_PATH, QUALITY_REPORT_PATH, QUALITY_FLAGS, SKIPPED_FLAGS,
+                                MISSING_VALUE, NON_POSITIVE_VALUE, DUPLICATE_ROW, INCONSISTENT_RANGE, PRICE_JUMP,
+                                TRADING_GAP, INVALID_VALUE)
+from utils.market_panel import list_tickers
+
+SCANNED_DATASETS = ["stock-historical-data", "dividend-history", "financial-ratio"]
+PRICE_COLUMNS = ["Open", "High", "Low", "Close"]
+JUMP_RATIO = 2.0  # Daily Close ratio (either way) beyond which a row is flagged as a likely unadjusted split
+GAP_DAYS = 30  # Calendar days without trading after which the next row is flagged
+# Share of the price by which Open or Close may leave [Low, High]; adjusted prices are rounded to the tick,
+# which puts a fifth of the rows slightly outside their range
+RANGE_TOLERANCE = 0.02
+
+def history_flags(data):
+    """
+    Checks a price history in trading date order and returns the flags of every row in file order.
+    Jumps and gaps are measured from the previous row that is not skipped.
+    """
+    flags = np.zeros(len(data), dtype=np.uint8)
+    if data.empty:
+        return flags
+    order = np.argsort(data["TradingDate"].to_numpy(), kind="stable")
+    prices = data[PRICE_COLUMNS].to_numpy(dtype=np.float64)[order]
+    volume = data["Volume"].to_numpy(dtype=np.float64)[order]
+    dates = data["TradingDate"].to_numpy()[order]
+
+    sorted_flags = np.zeros(len(data), dtype=np.uint8)
+    sorted_flags[np.isnan(prices).any(axis=1) | np.isnat(dates)] |= MISSING_VALUE
+    with np.errstate(invalid="ignore"):
+        sorted_flags[(prices <= 0).any(axis=1) | (volume < 0)] |= NON_POSITIVE_VALUE
+        open_price, high, low, close = prices.T
+        excess = np.maximum.reduce([open_price - high, close - high, low - open_price, low - close, low - high])
+        outside = excess > RANGE_TOLERANCE * np.abs(close)
+    sorted_flags[outside] |= INCONSISTENT_RANGE
+    # Callers keep the last row of a repeated date
+    sorted_flags[pd.Series(dates).duplicated(keep="last").to_numpy()] |= DUPLICATE_ROW
+
+    kept = np.flatnonzero((sorted_flags & SKIPPED_FLAGS) == 0)
+    if len(kept) > 1:
+        ratio = close[kept[1:]] / close[kept[:-1]]
+        sorted_flags[kept[1:][(ratio > JUMP_RATIO) | (ratio < 1 / JUMP_RATIO)]] |= PRICE_JUMP
+        gaps = (dates[kept[1:]] - dates[kept[:-1]]) / np.timedelta64(1, "D")
+        sorted_flags[kept[1:][gaps > GAP_DAYS]] |= TRADING_GAP
+
+    flags[order] = sorted_flags
+    return flags
+
+def dividend_flags(data):
+    """
+    Returns the flags of every dividend row: missing dates or amounts, negative amounts, repeated rows.
+    """
+    flags = np.zeros(len(data), dtype=np.uint8)
+    if data.empty:
+        return flags
+    flags[(data["exerciseDate"].isna() | data["cashDividendPercentage"].isna()).to_numpy()] |= MISSING_VALUE
+    flags[(data["cashDividendPercentage"] < 0).to_numpy()] |= NON_POSITIVE_VALUE
+    flags[data.duplicated(keep="first").to_numpy()] |= DUPLICATE_ROW
+    return flags
+
+def ratio_flags(data):
+    """
+    Returns the flags of every financial ratio row: missing or invalid periods, infinite ratios and repeated
+    periods. Rows are stored newest first, so the first row of a repeated period is kept.
+    """
+    flags = np.zeros(len(data), dtype=np.uint8)
+    if data.empty or "year" not in data:
+        return flags
+    flags[(data["year"].isna() | data["quarter"].isna()).to_numpy()] |= MISSING_VALUE
+    flags[(~data["quarter"].isin(range(1, 5))).to_numpy()] |= INVALID_VALUE
+    numeric = data.select_dtypes("number").to_numpy(dtype=np.float64)
+    flags[np.isinf(numeric).any(axis=1)] |= INVALID_VALUE
+    flags[data.duplicated(subset=["year", "quarter"], keep="first").to_numpy()] |= DUPLICATE_ROW
+    return flags
+
+DATASET_CHECKS = {
+    "stock-historical-data": history_flags,
+    "dividend-history": dividend_flags,
+    "financial-ratio": ratio_flags,
+}
+
+def scan_file(dataset, ticker, exchange, path, checksum):
+    """
+    Reads one dataset file and returns its row flags. Runs in a worker process.
+    """
+    return dataset, ticker, exchange, checksum, DATASET_CHECKS[dataset](read_compact_csv(path, dataset))
+
+def quality_report(results):
+    """
+    Summarizes the scan as one row per file with the number of rows carrying each flag.
+    """
+    rows = []
+    for dataset, ticker, exchange, _, flags in results:
+        row = {"dataset": dataset, "ticker": ticker, "exchange": exchange, "rows": len(flags),
+               "skipped": int(((flags & SKIPPED_FLAGS) != 0).sum())}
+        row.update({name: int(((flags & bit) != 0).sum()) for name, bit in QUALITY_FLAGS.items()})
+        rows.append(row)
+    return pd.DataFrame(rows, columns=["dataset", "ticker", "exchange", "rows", "skipped", *QUALITY_FLAGS])
+
+def scan_datasets(ticker_info_df, path=QUALITY_MASKS_PATH, report_path=QUALITY_REPORT_PATH, full_rescan=False,
+                  max_workers=None):
+    """
+    Scans the history, dividend and ratio files of every ticker in parallel and writes their row flags
+    to `path` with the checksum of each scanned file, plus the per-file report to `report_path`.
+    Files whose checksum matches the previous scan keep their flags. Returns the report and the number of files scanned.
+    """
+    previous = {} if full_rescan else (load_quality_masks(path) or {})
+    results, pending = [], []
+    for ticker, exchange in list_tickers(ticker_info_df):
+        for dataset in SCANNED_DATASETS:
+            entry = resolve_dataset(dataset, ticker, exchange)
+            if entry is None:
+                continue
+            known = previous.get((dataset, ticker))
+            if known is not None and known[0] == entry["checksum"]:
+                results.append((dataset, ticker, exchange, *known))
+            else:
+                pending.append((dataset, ticker, exchange, entry["path"], entry["checksum"]))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results += list(executor.map(scan_file, *zip(*pending), chunksize=32))
+    results.sort(key=lambda result: (result[0], result[1]))
+
+    # All flags in one array; offsets[i]:offsets[i + 1] are the rows of file i
+    flags = [result[4] for result in results]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as file:
+        np.savez_compressed(
+            file,
+            datasets=np.array([result[0] for result in results]),
+            tickers=np.array([result[1] for result in results]),
+            checksums=np.array([result[3] for result in results]),
+            offsets=np.cumsum([0] + [len(file_flags) for file_flags in flags]),
+            flags=np.concatenate(flags) if flags else np.empty(0, dtype=np.uint8),
+        )
+    os.replace(path + ".tmp", path)
+
+    report = quality_report(results)
+    report.to_csv(report_path + ".tmp", index=False)
+    os.replace(report_path + ".tmp", report_path)
+    return report, len(pending)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan the dataset files for bad rows and store their validity flags.")
+    parser.add_argument("--full", action="store_true", help="Scan every file instead of only the changed ones")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report, scanned = scan_datasets(load_ticker_generic_info(), full_rescan=args.full)
+    print(f"Scanned {scanned} files ({len(report)} in the report) in {time.perf_counter() - start:.1f}s; "
+          f"flags in {QUALITY_MASKS_PATH} ({os.path.getsize(QUALITY_MASKS_PATH) / 1024:.0f} KiB), report in {QUALITY_REPORT_PATH}")
+    summary = report.groupby("dataset")[["rows", "skipped", *QUALITY_FLAGS]].sum()
+    summary["files_with_issues"] = report.assign(issues=report[list(QUALITY_FLAGS)].sum(axis=1) > 0).groupby("dataset")["issues"].sum()
+    print(summary.T.to_string())
+    worst = report[report["dataset"] == "stock-historical-data"].nlargest(5, "price_jump")
+    print("Most suspected splits:", ", ".join(f"{row.ticker} ({row.price_jump})" for row in worst.itertuples()))
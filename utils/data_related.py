@@ -1,10 +1,115 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+from utils.metrics import record_cache_lookup, record_load
+from utils.shared_cache import cached
 from utils.ml_model import predict_new_data, predict_3rd_day_open_price, predict_3_consecutive_days_open_price
 
-def load_ticker_generic_info():
-    ticker_info_df = pd.read_csv("data/ticker-overview.csv")
+# Compact column types per dataset. Numeric columns not listed keep the type pandas infers,
+# except where `downcast` is set, which turns every remaining float64/int64 column into float32/int32.
+DATASET_SCHEMAS = {
+    "ticker-overview": {
+        "category": ["exchange", "industry", "industryEn", "companyType"],
+    },
+    "stock-historical-data": {
+        "dtype": {"Open": "float32", "High": "float32", "Low": "float32", "Close": "float32"},
+        "dates": {"TradingDate": "%Y-%m-%d"},
+    },
+    "dividend-history": {
+        "dtype": {"cashYear": "int16", "cashDividendPercentage": "float32"},
+        "dates": {"exerciseDate": "%d/%m/%y"},
+        "category": ["issueMethod"],
+    },
+    "financial-ratio": {
+        "dtype": {"year": "int16", "quarter": "int8"},
+        "category": ["ticker"],
+        "downcast": True,
+    },
+    "industry-analysis": {},
+}
+
+EXCHANGE_INDEX_NAMES = {"UPCOM": "UpcomIndex", "HOSE": "VNINDEX", "HNX": "HNXIndex"}
+DATASET_FILE_SUFFIXES = {
+    "stock-historical-data": "History",
+    "dividend-history": "Dividend",
+    "financial-ratio": "Finance",
+    "industry-analysis": "Industry",
+}
+
+# Built at ingest by `python -m utils.dataset_manifest`; loaders fall back to the naming convention without it
+MANIFEST_PATH = "data/derived/manifest.csv"
+MANIFEST_COLUMNS = ["dataset", "ticker", "exchange", "path", "rows", "first_date", "last_date",
+                    "bytes", "modified_ns", "checksum"]
+
+# Manifest loaded by the current process, reloaded when the file on disk changes
+_manifest = {}
+
+# Compact frames shared by every session of the process, keyed by (path, checksum)
+DATASET_CACHE_ENTRIES = 256
+_dataset_cache = OrderedDict()
+_dataset_cache_lock = threading.Lock()
+
+# Built by `python -m utils.data_quality`; without it the loaders keep every row as it is
+QUALITY_MASKS_PATH = "data/derived/quality-masks.npz"
+QUALITY_REPORT_PATH = "data/derived/quality-report.csv"
+
+# Row flags of the quality scan, one bit per check
+MISSING_VALUE = 1  # Missing price, date or period
+NON_POSITIVE_VALUE = 2  # Zero or negative price or volume, negative dividend
+DUPLICATE_ROW = 4  # Repeated trading date (all but the last) or repeated reporting period
+INCONSISTENT_RANGE = 8  # Open or Close well outside [Low, High], or High well below Low
+PRICE_JUMP = 16  # Close more than doubled or halved in a day, likely an unadjusted split
+TRADING_GAP = 32  # First row after more than GAP_DAYS calendar days without trading
+INVALID_VALUE = 64  # Infinite ratio or quarter outside 1-4
+QUALITY_FLAGS = {
+    "missing_value": MISSING_VALUE, "non_positive_value": NON_POSITIVE_VALUE, "duplicate_row": DUPLICATE_ROW,
+    "inconsistent_range": INCONSISTENT_RANGE, "price_jump": PRICE_JUMP, "trading_gap": TRADING_GAP,
+    "invalid_value": INVALID_VALUE,
+}
+# Rows dropped by the loaders; INCONSISTENT_RANGE rows are repaired, the other flags are only reported
+SKIPPED_FLAGS = MISSING_VALUE | NON_POSITIVE_VALUE | DUPLICATE_ROW | INVALID_VALUE
+
+# Quality masks loaded by the current process, reloaded when the scan is rerun
+_quality_masks = {}
+
+def read_compact_csv(path, dataset):
+    """
+    Reads a dataset CSV with the compact column types of DATASET_SCHEMAS, without the unnamed index column.
+    """
+    schema = DATASET_SCHEMAS[dataset]
+    data = pd.read_csv(path, usecols=lambda column: not column.startswith("Unnamed"), dtype=schema.get("dtype"))
+
+    for column, date_format in schema.get("dates", {}).items():
+        if column in data:
+            data[column] = pd.to_datetime(data[column], format=date_format)
+    for column in schema.get("category", []):
+        if column in data:
+            data[column] = data[column].astype("category")
+    if schema.get("downcast"):
+        data = data.astype({column: "float32" for column in data.select_dtypes("float64").columns})
+        data = data.astype({column: "int32" for column in data.select_dtypes("int64").columns})
+
+    # Volume is whole numbers that fit in int32, unless some days have no volume recorded
+    if "Volume" in data:
+        data["Volume"] = data["Volume"].astype("float32" if data["Volume"].isna().any() else "int32")
+
+    return data
+
+def load_ticker_generic_info(compact=True):
+    if not compact:
+        return pd.read_csv("data/ticker-overview.csv")
+    # Shared between server processes when a shared cache is configured, keyed by the file's version
+    stat = os.stat("data/ticker-overview.csv")
+    ticker_info_df = cached("ticker-overview", f"{stat.st_size}:{stat.st_mtime_ns}",
+                            lambda: read_compact_csv("data/ticker-overview.csv", "ticker-overview"))
     return ticker_info_df
 
 def combine_ticker_name(ticker_info_df):
@@ -13,270 +118,481 @@ def combine_ticker_name(ticker_info_df):
 
 def retrieve_company_info(ticker_info_df, ticker_name):
     ticker_info = ticker_info_df[ticker_info_df["ticker_name"] == ticker_name]
-    return ticker_info.reset_index(drop=True).drop(columns=["Unnamed: 0"]).fillna("No Information")
+    return ticker_info.reset_index(drop=True).drop(columns=["Unnamed: 0"], errors="ignore").astype(object).fillna("No Information")
 
 def retrieve_wishlist_info(ticker_info_df, ticker_name):
     ticker_info = ticker_info_df[ticker_info_df["ticker"] == ticker_name]
-    return ticker_info.reset_index(drop=True).drop(columns=["Unnamed: 0"]).fillna("No Information")
-
-def read_dividend_data(ticker_name, exchange):
-    #print("Ticker Name: ", ticker_name)
-    if exchange == "UPCOM":
-        index_name = "UpcomIndex"  # Capitalized for consistency
-    elif exchange == "HOSE":
-        index_name = "VNINDEX"
-    elif exchange == "HNX":
-        index_name = "HNXIndex"
-    else:
-        index_name = ""  # Handle cases with unknown exchange
-    
-    path = f"data/dividend-history/{ticker_name}-{index_name}-Dividend.csv"
-    dividend_data = pd.read_csv(path)
-    return dividend_data
-
-def read_financial_data(ticker_name, exchange):
-    if exchange == "UPCOM":
-        index_name = "UpcomIndex"  # Capitalized for consistency
-    elif exchange == "HOSE":
-        index_name = "VNINDEX"
-    elif exchange == "HNX":
-        index_name = "HNXIndex"
-    else:
-        index_name = ""  # Handle cases with unknown exchange
-    
-    path = f"data/financial-ratio/{ticker_name}-{index_name}-Finance.csv"
-    financial_data = pd.read_csv(path)
-    return financial_data
-
-def read_analysis_data(ticker_name, exchange):
-    if exchange == "UPCOM":
-        index_name = "UpcomIndex"  # Capitalized for consistency
-    elif exchange == "HOSE":
-        index_name = "VNINDEX"
-    elif exchange == "HNX":
-        index_name = "HNXIndex"
-    else:
-        index_name = ""  # Handle cases with unknown exchange
-    
-    path = f"data/industry-analysis/{ticker_name}-{index_name}-Industry.csv"
-    analysis_data = pd.read_csv(path)
+    return ticker_info.reset_index(drop=True).drop(columns=["Unnamed: 0"], errors="ignore").astype(object).fillna("No Information")
+
+def dataset_path(dataset, ticker_name, exchange):
+    """
+    Returns the path of a ticker's dataset file following the data directory naming convention.
+    """
+    index_name = EXCHANGE_INDEX_NAMES.get(exchange, "")  # Empty for unknown exchanges
+    return f"data/{dataset}/{ticker_name}-{index_name}-{DATASET_FILE_SUFFIXES[dataset]}.csv"
+
+def load_manifest(path=MANIFEST_PATH):
+    """
+    Loads the dataset manifest once per process as a dict keyed by (dataset, ticker),
+    and reloads it when the manifest is rebuilt. Returns None if no manifest has been built.
+    """
+    if not os.path.exists(path):
+        return None
+
+    modified = os.stat(path).st_mtime_ns
+    if _manifest.get("modified") != modified:
+        manifest = pd.read_csv(path, dtype=str, keep_default_na=False)
+        manifest["rows"] = manifest["rows"].astype(int)
+        _manifest.update({
+            "modified": modified,
+            "entries": {(entry["dataset"], entry["ticker"]): entry for entry in manifest.to_dict(orient="records")},
+        })
+    return _manifest["entries"]
+
+def resolve_dataset(dataset, ticker_name, exchange):
+    """
+    Returns the manifest entry of a ticker's dataset file, or None if the ticker has no such file.
+    Without a manifest the path follows the naming convention and the checksum is the file's size and modification time.
+    """
+    manifest = load_manifest()
+    if manifest is not None:
+        return manifest.get((dataset, ticker_name))
+
+    path = dataset_path(dataset, ticker_name, exchange)
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return {"path": path, "rows": None, "checksum": f"{stat.st_size}:{stat.st_mtime_ns}"}
+
+def dataset_version(dataset, ticker_exchanges):
+    """
+    Returns a short fingerprint of the given (ticker, exchange) pairs' files of a dataset, built from their
+    manifest checksums. It changes whenever one of the files changes, so it can key results derived from them.
+    """
+    checksums = []
+    for ticker_name, exchange in ticker_exchanges:
+        entry = resolve_dataset(dataset, ticker_name, exchange)
+        checksums.append(f"{ticker_name}:{'missing' if entry is None else entry['checksum']}")
+    return hashlib.sha1("|".join(checksums).encode()).hexdigest()[:16]
+
+def available_datasets(ticker_name, exchange):
+    """
+    Returns the datasets that hold at least one row for a ticker.
+    """
+    available = []
+    for dataset in DATASET_FILE_SUFFIXES:
+        entry = resolve_dataset(dataset, ticker_name, exchange)
+        if entry is not None and entry["rows"] != 0:
+            available.append(dataset)
+    return available
+
+def load_quality_masks(path=QUALITY_MASKS_PATH):
+    """
+    Loads the row flags of the quality scan once per process as a dict keyed by (dataset, ticker) holding
+    the checksum of the scanned file and its flags, one uint8 per row in file order.
+    Returns None if the scan has not been run.
+    """
+    if not os.path.exists(path):
+        return None
+
+    modified = os.stat(path).st_mtime_ns
+    if _quality_masks.get("modified") != modified:
+        with np.load(path) as stored:
+            flags = np.split(stored["flags"], stored["offsets"][1:-1])
+            entries = {(dataset, ticker): (checksum, file_flags) for dataset, ticker, checksum, file_flags
+                       in zip(stored["datasets"].tolist(), stored["tickers"].tolist(), stored["checksums"].tolist(), flags)}
+        _quality_masks.update({"modified": modified, "entries": entries})
+    return _quality_masks["entries"]
+
+def quality_flags(dataset, ticker_name, entry):
+    """
+    Returns the row flags of a ticker's dataset file, or None if the file was not scanned in its current version.
+    """
+    masks = load_quality_masks()
+    if masks is None or (dataset, ticker_name) not in masks:
+        return None
+    checksum, flags = masks[(dataset, ticker_name)]
+    return flags if checksum == entry["checksum"] else None
+
+def apply_quality_flags(data, flags):
+    """
+    Drops the rows with SKIPPED_FLAGS and repairs inconsistent price ranges by widening High and Low
+    to include Open and Close. Frames without flags, or whose length differs from the scan, are returned as they are.
+    """
+    if flags is None or len(flags) != len(data):
+        return data
+    if "High" in data and (flags & INCONSISTENT_RANGE).any():
+        repair = (flags & INCONSISTENT_RANGE) != 0
+        prices = data.loc[repair, ["Open", "High", "Low", "Close"]]
+        data.loc[repair, "High"] = prices.max(axis=1)
+        data.loc[repair, "Low"] = prices.min(axis=1)
+    if (flags & SKIPPED_FLAGS).any():
+        data = data[(flags & SKIPPED_FLAGS) == 0]
+    return data
+
+def read_dataset(dataset, ticker_name, exchange, compact=True):
+    """
+    Reads a ticker's dataset file located through the manifest. Compact frames are cached by path and checksum,
+    so a file is only parsed again after it changes; callers receive a copy they are free to modify.
+    Compact frames are cleaned with the file's quality flags when it has been scanned (utils/data_quality.py).
+    """
+    entry = resolve_dataset(dataset, ticker_name, exchange)
+    if entry is None:
+        raise FileNotFoundError(f"No {dataset} file for {ticker_name}")
+    if not compact:
+        start = time.perf_counter()
+        data = pd.read_csv(entry["path"])
+        record_load(dataset, os.path.getsize(entry["path"]), len(data), time.perf_counter() - start)
+        return data
+
+    # Frames read before the file was scanned are read again once its flags are available
+    flags = quality_flags(dataset, ticker_name, entry)
+    key = (entry["path"], entry["checksum"], flags is not None)
+    with _dataset_cache_lock:
+        data = _dataset_cache.get(key)
+        if data is not None:
+            _dataset_cache.move_to_end(key)
+    record_cache_lookup("dataset", data is not None)
+    if data is None:
+        def load():
+            start = time.perf_counter()
+            loaded = read_compact_csv(entry["path"], dataset)
+            record_load(dataset, os.path.getsize(entry["path"]), len(loaded), time.perf_counter() - start)
+            return apply_quality_flags(loaded, flags)
+
+        # Another server process may already have parsed this version of the file
+        data = cached("dataset", "|".join(map(str, key)), load)
+        with _dataset_cache_lock:
+            _dataset_cache[key] = data
+            while len(_dataset_cache) > DATASET_CACHE_ENTRIES:
+                _dataset_cache.popitem(last=False)
+    return data.copy()
+
+def read_dividend_data(ticker_name, exchange, compact=True):
+    return read_dataset("dividend-history", ticker_name, exchange, compact)
+
+def read_financial_data(ticker_name, exchange, compact=True):
+    return read_dataset("financial-ratio", ticker_name, exchange, compact)
+
+def read_analysis_data(ticker_name, exchange, compact=True):
+    analysis_data = read_dataset("industry-analysis", ticker_name, exchange, compact)
     analysis_data = analysis_data[analysis_data["ticker"] == ticker_name]
     return analysis_data
 
-def read_history_data(ticker_name, exchange):
-    if exchange == "UPCOM":
-        index_name = "UpcomIndex"  # Capitalized for consistency
-    elif exchange == "HOSE":
-        index_name = "VNINDEX"
-    elif exchange == "HNX":
-        index_name = "HNXIndex"
-    else:
-        index_name = ""  # Handle cases with unknown exchange
-    
-    path = f"data/stock-historical-data/{ticker_name}-{index_name}-History.csv"
-    history_data = pd.read_csv(path)
+def read_history_data(ticker_name, exchange, compact=True):
+    history_data = read_dataset("stock-historical-data", ticker_name, exchange, compact)
     history_data = history_data.sort_values(by="TradingDate")
     return history_data
 
-def construct_wishlist_table(ticker_name_list, ticker_info_df):
-    wishlist_data = []  # Use a list to collect row data
-    try:
-        for ticker_name in ticker_name_list:
-            # Retrieve company info and historical data
-            company_info = retrieve_wishlist_info(ticker_info_df, ticker_name.strip()).iloc[0]
-            history_data = read_history_data(company_info["ticker"], company_info["exchange"])
+FORECAST_TABLE_PATH = "data/derived/forecasts.parquet"
+FORECAST_ACCURACY_PATH = "data/derived/forecast-accuracy.csv"
+
+# Forecast and accuracy tables loaded by the current process, reloaded when the file on disk changes
+_forecast_table = {}
+_forecast_accuracy = {}
+
+# Predicted price columns and the difference column used to colour each of them
+WISHLIST_PREDICTION_COLUMNS = {
+    "Predict Next Day Open": "Next Day Diff",
+    "Predict Day 3 After Open": "Day 3 Diff",
+    "Predict Average 3 Days Later Open": "Avg 3 Days Diff",
+}
+
+# Forecast horizon of the accuracy table behind each predicted price, and the column holding its MAPE
+WISHLIST_ACCURACY_COLUMNS = {
+    "Predict Next Day Open": ("next_day", "Next Day MAPE"),
+    "Predict Day 3 After Open": ("day_3", "Day 3 MAPE"),
+    "Predict Average 3 Days Later Open": ("avg_3_days", "Avg 3 Days MAPE"),
+}
+
+WISHLIST_COLUMNS = [
+    "Ticker", "Name", "Exchange", "Currency", "Last Close", "Change", "Change %", "Open", "High", "Low", "Volume",
+    "Predict Next Day Open", "Predict Day 3 After Open", "Predict Average 3 Days Later Open"
+]
+
+WISHLIST_DISPLAY_COLUMNS = [
+    "Name", "Exchange", "Currency", "Last Close", "Change", "Change %", "Open", "High", "Low", "Volume",
+    "Predict Next Day Open", "Predict Day 3 After Open", "Predict Average 3 Days Later Open"
+]
+
+POSITIVE_STYLE = 'background-color: lightgreen; color: black;'
+NEGATIVE_STYLE = 'background-color: salmon; color: black;'
+NEUTRAL_STYLE = 'background-color: white; color: black;'
+
+def build_market_row(company_info, history_data):
+    """
+    Builds a watchlist row from local market data only. Prediction columns are left empty.
+    """
+    # Calculate changes
+    last_close = history_data["Close"].iloc[-1]
+    previous_close = history_data["Close"].iloc[-2]
+    change = last_close - previous_close
+    change_percent = (change / previous_close) * 100
+
+    return {
+        "Ticker": company_info["ticker"],
+        "Name": company_info["shortName"],
+        "Exchange": company_info["exchange"],
+        "Currency": "VND",
+        "Last Close": last_close,
+        "Change": change,
+        "Change %": change_percent,
+        "Open": history_data["Open"].iloc[-1],
+        "High": history_data["High"].iloc[-1],
+        "Low": history_data["Low"].iloc[-1],
+        "Volume": history_data["Volume"].iloc[-1],
+        "Predict Next Day Open": np.nan,
+        "Predict Day 3 After Open": np.nan,
+        "Predict Average 3 Days Later Open": np.nan,
+    }
+
+def read_forecast_table(path=FORECAST_TABLE_PATH):
+    """
+    Reads the forecast table written by the batch forecast job (utils/batch_forecast.py), indexed by ticker.
+    The table is read once per process and again only when the file is rewritten. Returns None if it does not exist.
+    """
+    if not os.path.exists(path):
+        return None
 
-            # Calculate changes
-            last_close = history_data["Close"].iloc[-1]
-            previous_close = history_data["Close"].iloc[-2]
-            change = last_close - previous_close
-            change_percent = (change / previous_close) * 100
-
-            current_open = history_data["Open"].iloc[-1]
-
-            # Predict values using the API
-            try:
-                # Predict Next Day Open Price
-                next_day_open = predict_new_data(history_data, ["Close", "High", "Low"], 30)[-1]
-                next_day_open = float(next_day_open)  # Ensure it's a scalar value
-                next_day_open_diff = next_day_open - current_open
-
-                # Predict Day 3 After Open
-                day_3_open = predict_3rd_day_open_price(history_data, ["Close", "High", "Low"], 30)[-1]
-                day_3_open = float(day_3_open)  # Ensure it's a scalar value
-                day_3_open_diff = day_3_open - current_open
-
-                # Predict Average of Next 3 Days Open Prices
-                next_3_days_prices_raw = predict_3_consecutive_days_open_price(
-                    history_data, ["Close", "High", "Low"], 30
-                )[-3:]
-                next_3_days_prices = [float(price) for price in next_3_days_prices_raw[0]]
-                avg_3_days_open = sum(next_3_days_prices) / len(next_3_days_prices)
-                avg_3_days_open_diff = avg_3_days_open - current_open
-
-            except Exception as e:
-                # If API calls fail, set predictions to N/A
-                next_day_open = "N/A"
-                day_3_open = "N/A"
-                avg_3_days_open = "N/A"
-                next_day_open_diff = day_3_open_diff = avg_3_days_open_diff = None
-
-            # Create a dictionary for the row
-            row = {
-                "Name": company_info["shortName"],
-                "Exchange": company_info["exchange"],
-                "Currency": "VND",
-                "Last Close": last_close,
-                "Change": change,
-                "Change %": change_percent,
-                "Open": current_open,
-                "High": history_data["High"].iloc[-1],
-                "Low": history_data["Low"].iloc[-1],
-                "Volume": history_data["Volume"].iloc[-1],
-                "Predict Next Day Open": next_day_open,
-                "Predict Day 3 After Open": day_3_open,
-                "Predict Average 3 Days Later Open": avg_3_days_open,
-                # Store differences for styling
-                "Next Day Diff": next_day_open_diff if next_day_open_diff is not None else "N/A",
-                "Day 3 Diff": day_3_open_diff if day_3_open_diff is not None else "N/A",
-                "Avg 3 Days Diff": avg_3_days_open_diff if avg_3_days_open_diff is not None else "N/A"
+    modified = os.stat(path).st_mtime_ns
+    if _forecast_table.get("modified") != modified:
+        _forecast_table["table"] = pd.read_parquet(path).set_index("ticker")
+        _forecast_table["modified"] = modified
+    return _forecast_table["table"]
+
+def read_forecast_accuracy(path=FORECAST_ACCURACY_PATH):
+    """
+    Reads the accuracy table written by the backfill (utils/forecast_accuracy.py), indexed by ticker and horizon.
+    Cached like the forecast table. Returns None if it does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+
+    modified = os.stat(path).st_mtime_ns
+    if _forecast_accuracy.get("modified") != modified:
+        _forecast_accuracy["table"] = pd.read_csv(path).set_index(["ticker", "horizon"]).sort_index()
+        _forecast_accuracy["modified"] = modified
+    return _forecast_accuracy["table"]
+
+def lookup_batch_forecast(ticker, last_trading_date):
+    """
+    Returns the batch forecast row of a ticker if it was computed from the same last trading date, else None.
+    """
+    forecast_table = read_forecast_table()
+    if forecast_table is None or ticker not in forecast_table.index:
+        return None
+
+    forecast = forecast_table.loc[ticker]
+    if str(pd.Timestamp(forecast["last_trading_date"]).date()) != str(pd.Timestamp(last_trading_date).date()):
+        return None
+    return forecast
+
+def predict_open_prices(history_data, ticker=None):
+    """
+    Calls the prediction API for the three forecast columns of a watchlist row.
+    Forecasts already computed by the batch job for the same last trading date are reused.
+    If the API calls fail, the predictions are left empty.
+    """
+    if ticker is not None:
+        forecast = lookup_batch_forecast(ticker, history_data["TradingDate"].max())
+        if forecast is not None:
+            return {
+                "Predict Next Day Open": forecast["next_day_open"],
+                "Predict Day 3 After Open": forecast["day_3_open"],
+                "Predict Average 3 Days Later Open": forecast["avg_3_days_open"],
             }
 
-            # Append the row to the list
-            wishlist_data.append(row)
-
-        # Convert the list of rows into a DataFrame
-        wishlist_df = pd.DataFrame(wishlist_data)
-
-        # **Create Formatted Columns with Arrows**
-        def format_predicted_price(row, pred_col, diff_col):
-            val = row[pred_col]
-            diff = row[diff_col]
-            if isinstance(val, (int, float)):
-                if diff > 0:
-                    return f'↑ {val:.2f}'
-                elif diff < 0:
-                    return f'↓ {val:.2f}'
-                else:
-                    return f'{val:.2f}'
-            else:
-                return val
-
-        # Apply formatting to create new columns
-        wishlist_df['Predict Next Day Open Formatted'] = wishlist_df.apply(
-            lambda row: format_predicted_price(row, 'Predict Next Day Open', 'Next Day Diff'), axis=1)
-        wishlist_df['Predict Day 3 After Open Formatted'] = wishlist_df.apply(
-            lambda row: format_predicted_price(row, 'Predict Day 3 After Open', 'Day 3 Diff'), axis=1)
-        wishlist_df['Predict Average 3 Days Later Open Formatted'] = wishlist_df.apply(
-            lambda row: format_predicted_price(row, 'Predict Average 3 Days Later Open', 'Avg 3 Days Diff'), axis=1)
-
-        # **Select columns to display (exclude 'Diff' columns)**
-        display_columns = [
-            "Name", "Exchange", "Currency", "Last Close", "Change", "Change %", "Open", "High", "Low", "Volume",
-            "Predict Next Day Open Formatted", "Predict Day 3 After Open Formatted", "Predict Average 3 Days Later Open Formatted"
-        ]
-
-        # **Create display DataFrame**
-        display_df = wishlist_df[display_columns].copy()
-
-        # **Rename columns for display**
-        display_df = display_df.rename(columns={
-            "Predict Next Day Open Formatted": "Predict Next Day Open",
-            "Predict Day 3 After Open Formatted": "Predict Day 3 After Open",
-            "Predict Average 3 Days Later Open Formatted": "Predict Average 3 Days Later Open"
-        })
+    def request_open_prices():
+        # Predict Next Day Open Price
+        next_day_open = predict_new_data(history_data, ["Close", "High", "Low"], 30)[-1]
+        next_day_open = float(np.squeeze(next_day_open))  # Ensure it's a scalar value
 
-        # **Define helper functions for styling**
-
-        # Function to apply conditional formatting for 'Change' and 'Change %' columns
-        def highlight_positive_negative(val):
-            if isinstance(val, (int, float)) and val > 0:
-                color = 'lightgreen'
-            elif isinstance(val, (int, float)) and val < 0:
-                color = 'salmon'
-            else:
-                color = 'white'
-            return f'background-color: {color}; color: black;'
-
-        # Function to format change values to include arrows and signs
-        def format_change(val):
-            if isinstance(val, (int, float)):
-                if val > 0:
-                    return f'↑ {val:+.2f}'
-                elif val < 0:
-                    return f'↓ {val:+.2f}'
-                else:
-                    return f'{val:+.2f}'
-            return val  # Return as is if not a number
-
-        # **Function to apply conditional formatting to predicted prices**
-        def highlight_predicted_prices(row):
-            styles = []
-            index = row.name  # Get the index of the current row
-            for col, diff_col in [
-                ("Predict Next Day Open", "Next Day Diff"),
-                ("Predict Day 3 After Open", "Day 3 Diff"),
-                ("Predict Average 3 Days Later Open", "Avg 3 Days Diff")
-            ]:
-                diff = wishlist_df.loc[index, diff_col]  # Access 'Diff' columns from wishlist_df
-                if pd.isnull(diff) or diff == "N/A":
-                    styles.append('')
-                elif diff > 0:
-                    styles.append('background-color: lightgreen; color: black;')
-                elif diff < 0:
-                    styles.append('background-color: salmon; color: black;')
-                else:
-                    styles.append('background-color: white; color: black;')
-            return styles
-
-        # **Apply conditional formatting**
-        styled_display_df = display_df.style
-
-        # Apply conditional formatting to 'Change' and 'Change %' columns
-        styled_display_df = styled_display_df.applymap(
-            highlight_positive_negative, subset=['Change', 'Change %']
-        )
-
-        # Apply conditional formatting to predicted price columns
-        styled_display_df = styled_display_df.apply(
-            highlight_predicted_prices, axis=1, subset=[
-                "Predict Next Day Open",
-                "Predict Day 3 After Open",
-                "Predict Average 3 Days Later Open"
-            ]
-        )
-
-        # Format numeric columns
-        styled_display_df = styled_display_df.format({
-            'Change': format_change,
-            'Change %': lambda x: format_change(x) + '%',
-            'Last Close': '{:.2f}',
-            'Open': '{:.2f}',
-            'High': '{:.2f}',
-            'Low': '{:.2f}',
-            'Volume': '{:,.0f}',
-            # Predicted columns are already formatted
-            'Predict Next Day Open': '{}',
-            'Predict Day 3 After Open': '{}',
-            'Predict Average 3 Days Later Open': '{}'
-        })
+        # Predict Day 3 After Open
+        day_3_open = predict_3rd_day_open_price(history_data, ["Close", "High", "Low"], 30)[-1]
+        day_3_open = float(np.squeeze(day_3_open))  # Ensure it's a scalar value
+
+        # Predict Average of Next 3 Days Open Prices
+        next_3_days_prices_raw = predict_3_consecutive_days_open_price(
+            history_data, ["Close", "High", "Low"], 30
+        )[-3:]
+        next_3_days_prices = [float(price) for price in next_3_days_prices_raw[0]]
+        return next_day_open, day_3_open, sum(next_3_days_prices) / len(next_3_days_prices)
 
-        # Update the CSS styles to adjust column and cell sizes
-        styled_display_df = styled_display_df.set_table_styles([
-            {'selector': 'th', 'props': [('font-size', '14px'), ('text-align', 'center')]},  # Header styling
-            {'selector': 'td', 'props': [('font-size', '12px'), ('padding', '8px 10px')]},  # Cell padding
-            {'selector': 'td:nth-child(1)', 'props': [('min-width', '200px'), ('max-width', '200px')]},  # Expand "Name" column
-            {'selector': 'table', 'props': [('border-collapse', 'collapse'), ('width', '100%')]}  # Table layout
-        ])
+    try:
+        if ticker is None:
+            next_day_open, day_3_open, avg_3_days_open = request_open_prices()
+        else:
+            # Sessions of every server process share one set of API calls per ticker and trading day;
+            # failed calls raise before anything is cached
+            last_trading_date = str(history_data["TradingDate"].max())[:10]
+            next_day_open, day_3_open, avg_3_days_open = cached("forecast", f"{ticker}|{last_trading_date}", request_open_prices)
+    except Exception as e:
+        next_day_open = day_3_open = avg_3_days_open = np.nan
+
+    return {
+        "Predict Next Day Open": next_day_open,
+        "Predict Day 3 After Open": day_3_open,
+        "Predict Average 3 Days Later Open": avg_3_days_open,
+    }
+
+def wishlist_frame_from_rows(wishlist_data):
+    """
+    Converts the collected rows into the watchlist frame, with the differences used for styling.
+    """
+    wishlist_df = pd.DataFrame(wishlist_data, columns=WISHLIST_COLUMNS)
+
+    # Store differences for styling, computed for the whole column at once
+    for pred_col, diff_col in WISHLIST_PREDICTION_COLUMNS.items():
+        wishlist_df[diff_col] = wishlist_df[pred_col] - wishlist_df["Open"]
+
+    # Past error of each forecast, shown as its confidence; NaN until the accuracy backfill has run
+    accuracy = read_forecast_accuracy()
+    for horizon, mape_col in WISHLIST_ACCURACY_COLUMNS.values():
+        if accuracy is None:
+            wishlist_df[mape_col] = np.nan
+        else:
+            keys = pd.MultiIndex.from_arrays([wishlist_df["Ticker"], [horizon] * len(wishlist_df)])
+            wishlist_df[mape_col] = accuracy["mape"].reindex(keys).to_numpy(dtype=float)
+
+    return wishlist_df
+
+def build_wishlist_data(ticker_name_list, ticker_info_df):
+    """
+    Collects the market data and predicted open prices of every ticker in the watchlist.
+    Predictions that could not be retrieved are stored as NaN so all columns stay numeric.
+    """
+    wishlist_data = []  # Use a list to collect row data
+    for ticker_name in ticker_name_list:
+        # Retrieve company info and historical data
+        company_info = retrieve_wishlist_info(ticker_info_df, ticker_name.strip()).iloc[0]
+        history_data = read_history_data(company_info["ticker"], company_info["exchange"])
+
+        row = build_market_row(company_info, history_data)
+        row.update(predict_open_prices(history_data, company_info["ticker"]))
+        wishlist_data.append(row)
+
+    return wishlist_frame_from_rows(wishlist_data)
+
+def stream_wishlist_rows(ticker_name_list, ticker_info_df, max_workers=8):
+    """
+    Yields the watchlist progressively as ("market", position, row) and ("forecast", position, predictions) events.
+    Market data is yielded as soon as each ticker's history is read, while the prediction calls run
+    in a thread pool and are yielded as they complete, so a slow ticker does not hold back the others.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        for position, ticker_name in enumerate(ticker_name_list):
+            company_info = retrieve_wishlist_info(ticker_info_df, ticker_name.strip()).iloc[0]
+            history_data = read_history_data(company_info["ticker"], company_info["exchange"])
+
+            pending[executor.submit(predict_open_prices, history_data, company_info["ticker"])] = position
+            yield "market", position, build_market_row(company_info, history_data)
+
+            # Hand over any forecasts that finished while the local data was being read
+            done, _ = wait(pending, timeout=0, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield "forecast", pending.pop(future), future.result()
+
+        for future in as_completed(pending):
+            yield "forecast", pending[future], future.result()
+
+
+def sort_and_paginate_wishlist(wishlist_df, sort_by=None, ascending=True, page=1, page_size=None):
+    """
+    Sorts the watchlist on the server side and returns only the rows of the requested page.
+    The index of the returned frame is the position of each row in the sorted watchlist.
+    """
+    if sort_by is not None:
+        wishlist_df = wishlist_df.sort_values(by=sort_by, ascending=ascending, na_position="last", kind="stable")
+    wishlist_df = wishlist_df.reset_index(drop=True)
+
+    if page_size is None:
+        return wishlist_df
+
+    start = (max(page, 1) - 1) * page_size
+    return wishlist_df.iloc[start:start + page_size]
+
+def count_wishlist_pages(row_count, page_size):
+    return max(1, -(-row_count // page_size))
+
+def format_with_arrows(values, diffs, value_format="%.2f", missing="N/A"):
+    """
+    Formats a column of numbers with an up/down arrow given by the sign of diffs.
+    """
+    values = np.asarray(values, dtype=float)
+    diffs = np.asarray(diffs, dtype=float)
+
+    text = np.char.mod(value_format, np.nan_to_num(values))
+    arrows = np.select([diffs > 0, diffs < 0], ["↑ ", "↓ "], default="")
+    return np.where(np.isnan(values), missing, np.char.add(arrows, text))
+
+def classify_styles(diffs, missing_style):
+    """
+    Maps the sign of each difference to its background style.
+    """
+    diffs = np.asarray(diffs, dtype=float)
+    return np.select(
+        [diffs > 0, diffs < 0, diffs == 0],
+        [POSITIVE_STYLE, NEGATIVE_STYLE, NEUTRAL_STYLE],
+        default=missing_style
+    )
+
+def style_wishlist_table(wishlist_df):
+    """
+    Builds the styled watchlist table. Display text and cell styles are computed column-wise
+    up front, so the Styler only has to attach precomputed arrays.
+    """
+    display_df = wishlist_df[WISHLIST_DISPLAY_COLUMNS].copy()
+    styles = pd.DataFrame("", index=display_df.index, columns=display_df.columns)
+
+    # Change and Change % columns: arrow, sign and colour from the value itself
+    for col, suffix in [("Change", ""), ("Change %", "%")]:
+        values = wishlist_df[col].to_numpy(dtype=float)
+        display_df[col] = np.char.add(format_with_arrows(values, values, "%+.2f", missing=""), suffix)
+        styles[col] = classify_styles(values, NEUTRAL_STYLE)
+
+    # Predicted price columns: arrow and colour from the difference with the current open price,
+    # followed by the forecast's past mean absolute percentage error when it is known
+    for pred_col, diff_col in WISHLIST_PREDICTION_COLUMNS.items():
+        diffs = wishlist_df[diff_col].to_numpy(dtype=float)
+        mape = wishlist_df[WISHLIST_ACCURACY_COLUMNS[pred_col][1]].to_numpy(dtype=float)
+        text = format_with_arrows(wishlist_df[pred_col], diffs)
+        confidence = np.where(np.isnan(mape) | (text == "N/A"), "", np.char.mod(" ±%.1f%%", np.nan_to_num(mape)))
+        display_df[pred_col] = np.char.add(text, confidence)
+        styles[pred_col] = classify_styles(diffs, "")
+
+    styled_display_df = display_df.style.apply(lambda _: styles, axis=None)
+
+    # Format numeric columns
+    styled_display_df = styled_display_df.format({
+        'Last Close': '{:.2f}',
+        'Open': '{:.2f}',
+        'High': '{:.2f}',
+        'Low': '{:.2f}',
+        'Volume': '{:,.0f}',
+    })
+
+    # Update the CSS styles to adjust column and cell sizes
+    styled_display_df = styled_display_df.set_table_styles([
+        {'selector': 'th', 'props': [('font-size', '14px'), ('text-align', 'center')]},  # Header styling
+        {'selector': 'td', 'props': [('font-size', '12px'), ('padding', '8px 10px')]},  # Cell padding
+        {'selector': 'td:nth-child(1)', 'props': [('min-width', '200px'), ('max-width', '200px')]},  # Expand "Name" column
+        {'selector': 'table', 'props': [('border-collapse', 'collapse'), ('width', '100%')]}  # Table layout
+    ])
+
+    return styled_display_df
+
+def construct_wishlist_table(ticker_name_list, ticker_info_df, sort_by=None, ascending=True, page=1, page_size=None):
+    try:
+        wishlist_df = build_wishlist_data(ticker_name_list, ticker_info_df)
+        page_df = sort_and_paginate_wishlist(wishlist_df, sort_by, ascending, page, page_size)
+        return style_wishlist_table(page_df)
 
-        return styled_display_df
-    
     except Exception as e:
         st.write("Please turn on the API server to enable predictions. The API server is currently off. Please allocate to the Google Colab and run the task 5.1 to start the NGROK server.")
         return None
 
 
-
 # Create color coding for price changes
 def get_trend_color(next_3_days_prices, last_open_price, index):
     if index == 0:
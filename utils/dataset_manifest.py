@@ -0,0 +1,101 @@
+import argparse
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from utils.data_related import (load_ticker_generic_info, read_compact_csv, dataset_path, DATASET_FILE_SUFFIXES,
+                                MANIFEST_PATH, MANIFEST_COLUMNS)
+from utils.market_panel import list_tickers
+
+# Column holding the date of each row, used for the date range of a file
+DATE_COLUMNS = {"stock-historical-data": "TradingDate", "dividend-history": "exerciseDate"}
+
+def file_checksum(path, block_size=1 << 20):
+    """
+    Returns the BLAKE2b checksum of a file's contents as a hex string.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _date_range(dataset, data):
+    if data.empty:
+        return "", ""
+    if dataset in DATE_COLUMNS:
+        dates = data[DATE_COLUMNS[dataset]]
+    elif dataset == "financial-ratio":
+        # Quarterly ratios are dated by the last day of their quarter
+        dates = pd.PeriodIndex.from_fields(year=data["year"], quarter=data["quarter"], freq="Q").to_timestamp(how="end")
+    else:
+        return "", ""
+    return dates.min().strftime("%Y-%m-%d"), dates.max().strftime("%Y-%m-%d")
+
+def describe_file(dataset, ticker, exchange):
+    """
+    Returns the manifest entry of one dataset file, or None if the file does not exist.
+    """
+    path = dataset_path(dataset, ticker, exchange)
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    data = read_compact_csv(path, dataset)
+    first_date, last_date = _date_range(dataset, data)
+    return {
+        "dataset": dataset, "ticker": ticker, "exchange": exchange, "path": path, "rows": len(data),
+        "first_date": first_date, "last_date": last_date, "bytes": stat.st_size,
+        "modified_ns": stat.st_mtime_ns, "checksum": file_checksum(path),
+    }
+
+def build_manifest(ticker_info_df, path=MANIFEST_PATH, full_rebuild=False, max_workers=None):
+    """
+    Builds or updates the dataset manifest at `path`. Files whose size and modification time match the
+    previous manifest keep their entry; the others are read and checksummed again.
+    Returns the manifest and the number of files that were described again.
+    """
+    previous = {}
+    if os.path.exists(path) and not full_rebuild:
+        stored = pd.read_csv(path, dtype=str, keep_default_na=False)
+        previous = {(entry["dataset"], entry["ticker"]): entry for entry in stored.to_dict(orient="records")}
+
+    entries, pending = [], []
+    for ticker, exchange in list_tickers(ticker_info_df):
+        for dataset in DATASET_FILE_SUFFIXES:
+            file_path = dataset_path(dataset, ticker, exchange)
+            known = previous.get((dataset, ticker))
+            if known is not None and known["path"] == file_path and os.path.exists(file_path):
+                stat = os.stat(file_path)
+                if known["bytes"] == str(stat.st_size) and known["modified_ns"] == str(stat.st_mtime_ns):
+                    entries.append(known)
+                    continue
+            pending.append((dataset, ticker, exchange))
+
+    described = []
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            described = [entry for entry in executor.map(describe_file, *zip(*pending), chunksize=32) if entry is not None]
+    entries += described
+
+    manifest = pd.DataFrame(entries, columns=MANIFEST_COLUMNS).sort_values(["dataset", "ticker"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file first so loaders never see a half-written manifest
+    manifest.to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return manifest, len(described)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the manifest of the dataset files.")
+    parser.add_argument("--full", action="store_true", help="Describe every file instead of only the changed ones")
+    parser.add_argument("--output", default=MANIFEST_PATH, help="Path of the manifest CSV")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    manifest, described = build_manifest(load_ticker_generic_info(), args.output, args.full)
+    print(f"Described {described} files, {len(manifest)} entries written to {args.output} "
+          f"in {time.perf_counter() - start:.2f}s")
+    print(manifest.groupby("dataset")["rows"].agg(files="count", empty=lambda rows: (rows.astype(int) == 0).sum()).to_string())
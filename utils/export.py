@@ -0,0 +1,177 @@
+import argparse
+import os
+import resource
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from utils.data_related import load_ticker_generic_info, read_history_data, read_financial_data, read_forecast_table
+from utils.market_panel import list_tickers
+from utils.ml_model import calculate_rsi, calculate_macd, calculate_bollinger_bands
+
+EXPORT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".csv"}
+CHUNK_ROWS = 100_000  # Rows buffered before a write, which bounds the memory of an export
+
+HISTORY_COLUMNS = ["Open", "High", "Low", "Close"]
+INDICATOR_COLUMNS = ["RSI", "MACD", "MACD_signal", "BB_high", "BB_low", "MA_Close_20"]
+EXPORT_RATIO_COLUMNS = ["priceToEarning", "priceToBook", "roe", "roa", "earningPerShare", "bookValuePerShare",
+                        "debtOnEquity", "postTaxMargin", "epsChange", "dividend"]
+FORECAST_COLUMNS = ["next_day_open", "day_3_open", "avg_3_days_open", "buy_probability", "sell_probability"]
+
+EXPORT_SCHEMA = pa.schema(
+    [("ticker", pa.string()), ("exchange", pa.string()), ("TradingDate", pa.timestamp("us"))]
+    + [(column, pa.float32()) for column in HISTORY_COLUMNS]
+    + [("Volume", pa.int64())]
+    + [(column, pa.float32()) for column in INDICATOR_COLUMNS]
+    + [("ratio_period", pa.string())]
+    + [(column, pa.float32()) for column in EXPORT_RATIO_COLUMNS]
+    + [(column, pa.float32()) for column in FORECAST_COLUMNS]
+)
+
+def add_indicators(history_data):
+    """
+    Adds the technical indicators used by the buy/sell models, computed over the ticker's full history.
+    """
+    close = history_data["Close"].astype(np.float64)
+    history_data["RSI"] = calculate_rsi(close)
+    history_data["MACD"], history_data["MACD_signal"] = calculate_macd(close)
+    history_data["BB_high"], history_data["BB_low"] = calculate_bollinger_bands(close)
+    history_data["MA_Close_20"] = close.rolling(window=20).mean()
+    return history_data
+
+def attach_ratios(history_data, financial_data):
+    """
+    Joins to each trading day the ratios of the latest quarter that had ended by that day.
+    """
+    if financial_data is None or financial_data.empty or "year" not in financial_data:
+        history_data["ratio_period"] = None
+        return history_data.assign(**{column: np.nan for column in EXPORT_RATIO_COLUMNS})
+
+    periods = pd.PeriodIndex.from_fields(year=financial_data["year"], quarter=financial_data["quarter"], freq="Q")
+    ratios = financial_data.reindex(columns=EXPORT_RATIO_COLUMNS).assign(
+        ratio_period=periods.astype(str),
+        ratio_date=periods.to_timestamp(how="end").normalize().astype(history_data["TradingDate"].dtype),
+    )
+    ratios = ratios.sort_values("ratio_date").drop_duplicates(subset="ratio_date", keep="last")
+    joined = pd.merge_asof(history_data, ratios, left_on="TradingDate", right_on="ratio_date", direction="backward")
+    return joined.drop(columns="ratio_date")
+
+def attach_forecast(history_data, forecast):
+    """
+    Adds the cached batch forecast to the row of the trading date it was computed from; other rows are empty.
+    """
+    for column in FORECAST_COLUMNS:
+        history_data[column] = np.nan
+    if forecast is not None:
+        as_of = history_data["TradingDate"] == pd.Timestamp(forecast["last_trading_date"])
+        for column in FORECAST_COLUMNS:
+            history_data.loc[as_of, column] = forecast[column]
+    return history_data
+
+def export_frames(tickers, ticker_info_df, start_date=None, end_date=None):
+    """
+    Yields one frame per ticker with its history, indicators, ratios and cached forecast between the two dates,
+    in the column order and types of EXPORT_SCHEMA. Only one ticker's data is held at a time.
+    """
+    exchanges = ticker_info_df.dropna(subset=["ticker"]).set_index("ticker")["exchange"]
+    forecast_table = read_forecast_table()
+
+    for ticker in tickers:
+        exchange = exchanges[ticker]
+        try:
+            history_data = read_history_data(ticker, exchange)
+        except FileNotFoundError:
+            continue
+        history_data = add_indicators(history_data.drop_duplicates(subset="TradingDate", keep="last"))
+
+        # Indicators are computed over the full history first so they are warmed up at the start date
+        if start_date is not None:
+            history_data = history_data[history_data["TradingDate"] >= pd.Timestamp(start_date)]
+        if end_date is not None:
+            history_data = history_data[history_data["TradingDate"] <= pd.Timestamp(end_date)]
+        if history_data.empty:
+            continue
+
+        try:
+            financial_data = read_financial_data(ticker, exchange)
+        except FileNotFoundError:
+            financial_data = None
+        history_data = attach_ratios(history_data.reset_index(drop=True), financial_data)
+        forecast = forecast_table.loc[ticker] if forecast_table is not None and ticker in forecast_table.index else None
+        history_data = attach_forecast(history_data, forecast)
+
+        history_data["ticker"] = ticker
+        history_data["exchange"] = str(exchange)
+        history_data["Volume"] = history_data["Volume"].astype("Int64")
+        yield history_data[EXPORT_SCHEMA.names]
+
+def export_tables(frames, chunk_rows=CHUNK_ROWS):
+    """
+    Groups the per-ticker frames into Arrow tables of about `chunk_rows` rows.
+    """
+    buffered, buffered_rows = [], 0
+    for frame in frames:
+        buffered.append(frame)
+        buffered_rows += len(frame)
+        if buffered_rows >= chunk_rows:
+            yield pa.Table.from_pandas(pd.concat(buffered, ignore_index=True), schema=EXPORT_SCHEMA, preserve_index=False)
+            buffered, buffered_rows = [], 0
+    if buffered:
+        yield pa.Table.from_pandas(pd.concat(buffered, ignore_index=True), schema=EXPORT_SCHEMA, preserve_index=False)
+
+def _open_writer(path, export_format):
+    if export_format == "parquet":
+        return pq.ParquetWriter(path, EXPORT_SCHEMA)
+    elif export_format == "arrow":
+        return pa.ipc.new_file(path, EXPORT_SCHEMA)
+    elif export_format == "csv":
+        return pa_csv.CSVWriter(path, EXPORT_SCHEMA)
+    raise ValueError(f"Unknown export format: {export_format}")
+
+def export_dataset(tickers, ticker_info_df, path, export_format="parquet", start_date=None, end_date=None,
+                   chunk_rows=CHUNK_ROWS):
+    """
+    Writes the joined export of the given tickers to `path` as Parquet, Arrow IPC or CSV, one chunk at a time.
+    Returns the number of rows written.
+    """
+    rows = 0
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first so an interrupted export never leaves a truncated file behind
+    writer = _open_writer(path + ".tmp", export_format)
+    try:
+        for table in export_tables(export_frames(tickers, ticker_info_df, start_date, end_date), chunk_rows):
+            writer.write_table(table)
+            rows += table.num_rows
+    finally:
+        writer.close()
+    os.replace(path + ".tmp", path)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export histories with indicators, ratios and forecasts.")
+    parser.add_argument("--tickers", nargs="+", help="Tickers to export (default: the whole market)")
+    parser.add_argument("--exchanges", nargs="+", choices=["HOSE", "HNX", "UPCOM"], help="Only export these exchanges")
+    parser.add_argument("--start", help="First trading date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last trading date (YYYY-MM-DD)")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="parquet")
+    parser.add_argument("--output", help="Output file (default: data/derived/export<extension>)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows buffered before each write")
+    args = parser.parse_args()
+
+    ticker_info = load_ticker_generic_info()
+    tickers = [ticker for ticker, _ in list_tickers(ticker_info, args.exchanges)]
+    if args.tickers:
+        tickers = [ticker for ticker in tickers if ticker in set(args.tickers)]
+    output = args.output or f"data/derived/export{EXPORT_FORMATS[args.format]}"
+
+    start = time.perf_counter()
+    rows = export_dataset(tickers, ticker_info, output, args.format, args.start, args.end, args.chunk_rows)
+    print(f"Exported {rows} rows of {len(tickers)} tickers to {output} ({os.path.getsize(output) / 1e6:.1f} MB) "
+          f"in {time.perf_counter() - start:.1f}s, max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
@@ -0,0 +1,48 @@
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from utils.metrics import record_cache_lookup
+
+# Total size of the serialized figures kept by the process, shared by all sessions
+FIGURE_CACHE_BYTES = int(os.environ.get("FIGURE_CACHE_MB", "64")) * 1024 * 1024
+
+_figure_cache = OrderedDict()  # Key -> figure JSON, least recently used first
+_figure_cache_lock = threading.Lock()
+_figure_cache_size = {"bytes": 0}
+
+def figure_key(page, tickers, date_range=(None, None), version=None):
+    """
+    Builds the cache key of a figure. Tickers are sorted so every order of the same selection shares
+    an entry; the figure must therefore draw them in sorted order.
+    """
+    return (page, tuple(sorted(tickers)), tuple(str(date) if date is not None else None for date in date_range), version)
+
+def cached_figure(key, build):
+    """
+    Returns the figure cached under `key`, or calls `build` to make it and caches its JSON.
+    A cached figure is rebuilt from its JSON without validation, which skips constructing and checking
+    every trace; the least recently used figures are evicted beyond FIGURE_CACHE_BYTES.
+    """
+    with _figure_cache_lock:
+        payload = _figure_cache.get(key)
+        if payload is not None:
+            _figure_cache.move_to_end(key)
+    record_cache_lookup("figure", payload is not None)
+    if payload is not None:
+        return go.Figure(pio.json.from_json_plotly(payload), _validate=False)
+
+    figure = build()
+    payload = pio.to_json(figure, validate=False)
+    if len(payload) <= FIGURE_CACHE_BYTES:
+        with _figure_cache_lock:
+            if key not in _figure_cache:
+                _figure_cache[key] = payload
+                _figure_cache_size["bytes"] += len(payload)
+            while _figure_cache_size["bytes"] > FIGURE_CACHE_BYTES:
+                _, evicted = _figure_cache.popitem(last=False)
+                _figure_cache_size["bytes"] -= len(evicted)
+    return figure
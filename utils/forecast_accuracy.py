@@ -0,0 +1,145 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.batch_forecast import LSTM_FEATURES, WINDOW_SIZE, predict_in_batches
+from utils.data_related import load_ticker_generic_info, read_history_data, FORECAST_ACCURACY_PATH
+from utils.market_panel import list_tickers
+
+ACCURACY_DAYS = 250  # Trading days of forecasts evaluated per ticker
+HORIZON_DAYS = 3  # Trading days after a window needed to score all three horizons
+ACCURACY_COLUMNS = ["ticker", "exchange", "horizon", "windows", "mae", "mape", "directional_accuracy",
+                    "first_date", "last_date", "generated_at"]
+
+def historical_windows(history_data, features=LSTM_FEATURES, window_size=WINDOW_SIZE, days=ACCURACY_DAYS):
+    """
+    Builds the normalized inference window ending on each of the last `days` trading days that still have
+    HORIZON_DAYS days after them. The windows are a sliding view of the feature columns, so only the
+    normalized copy is allocated. Flat columns normalize to zeros, as in `prepare_inference_window`, so the
+    windows scored are those the live and batch forecasts serve; only windows with missing values are dropped.
+    Returns the windows (windows, window_size, features), their Close min/max, and the position of
+    the last row of each window in `history_data`.
+    """
+    values = history_data[features].to_numpy(dtype=np.float64)
+    n_windows = len(values) - window_size + 1 - HORIZON_DAYS
+    if n_windows <= 0:
+        return np.empty((0, window_size, len(features))), np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+
+    first = max(0, n_windows - days)
+    # (windows, features, window_size) view -> (windows, window_size, features), still without copying
+    windows = sliding_window_view(values, window_size, axis=0)[first:n_windows].transpose(0, 2, 1)
+    minimum = windows.min(axis=1)
+    spread = windows.max(axis=1) - minimum
+    usable = np.isfinite(spread).all(axis=1)
+
+    divisor = np.where(spread > 0, spread, 1)
+    normalized = (windows[usable] - minimum[usable, None, :]) / divisor[usable, None, :]
+    ends = np.arange(first, n_windows)[usable] + window_size - 1
+    return normalized, minimum[usable, 0], minimum[usable, 0] + spread[usable, 0], ends
+
+def score_forecasts(predicted, actual, reference):
+    """
+    Returns the mean absolute error, the mean absolute percentage error and the share of forecasts
+    that moved in the same direction from `reference` (the last Close) as the actual price.
+    """
+    valid = np.isfinite(predicted) & np.isfinite(actual) & (actual > 0)
+    predicted, actual, reference = predicted[valid], actual[valid], reference[valid]
+    if not len(actual):
+        return np.nan, np.nan, np.nan
+    errors = np.abs(predicted - actual)
+    return (
+        float(errors.mean()),
+        float(100 * (errors / actual).mean()),
+        float(100 * (np.sign(predicted - reference) == np.sign(actual - reference)).mean()),
+    )
+
+def evaluate_ticker(ticker, exchange, days=ACCURACY_DAYS, batch_size=256):
+    """
+    Replays the three LSTM forecasts over the ticker's recent history and scores them against
+    the opens that followed. Returns one row per horizon, or an empty list if no window is usable.
+    """
+    history_data = read_history_data(ticker, exchange).drop_duplicates(subset="TradingDate", keep="last")
+    history_data = history_data.reset_index(drop=True)
+    windows, close_min, close_max, ends = historical_windows(history_data, days=days)
+    if not len(windows):
+        return []
+
+    close_range = (close_max - close_min)[:, None]
+    next_day = predict_in_batches("predict-next-day", windows, batch_size) * close_range + close_min[:, None]
+    day_3 = predict_in_batches("predict-3rd-day", windows, batch_size) * close_range + close_min[:, None]
+    next_3_days = predict_in_batches("predict-3-consecutive-days", windows, batch_size) * close_range + close_min[:, None]
+
+    opens = history_data["Open"].to_numpy(dtype=np.float64)
+    future_opens = opens[ends[:, None] + np.arange(1, HORIZON_DAYS + 1)]
+    last_close = history_data["Close"].to_numpy(dtype=np.float64)[ends]
+    dates = history_data["TradingDate"].iloc[ends]
+
+    horizons = {
+        "next_day": (next_day[:, -1], future_opens[:, 0]),
+        "day_3": (day_3[:, -1], future_opens[:, 2]),
+        "avg_3_days": (next_3_days[:, :3].mean(axis=1), future_opens.mean(axis=1)),
+    }
+    rows = []
+    for horizon, (predicted, actual) in horizons.items():
+        mae, mape, directional_accuracy = score_forecasts(predicted, actual, last_close)
+        rows.append({
+            "ticker": ticker,
+            "exchange": exchange,
+            "horizon": horizon,
+            "windows": len(windows),
+            "mae": mae,
+            "mape": mape,
+            "directional_accuracy": directional_accuracy,
+            "first_date": dates.iloc[0].strftime("%Y-%m-%d"),
+            "last_date": dates.iloc[-1].strftime("%Y-%m-%d"),
+        })
+    return rows
+
+def backfill_accuracy(tickers, path=FORECAST_ACCURACY_PATH, days=ACCURACY_DAYS, batch_size=256):
+    """
+    Scores the forecasts of every (ticker, exchange) pair and merges the results into the accuracy table,
+    replacing the previous rows of those tickers. Returns the tickers that could not be scored with the reason.
+    """
+    rows, failures = [], {}
+    for ticker, exchange in tickers:
+        try:
+            rows.extend(evaluate_ticker(ticker, exchange, days, batch_size))
+        except Exception as e:
+            failures[ticker] = str(e)
+
+    accuracy = pd.DataFrame(rows, columns=ACCURACY_COLUMNS)
+    accuracy["generated_at"] = pd.Timestamp.now().isoformat(timespec="seconds")
+    if os.path.exists(path):
+        previous = pd.read_csv(path)
+        scored = {ticker for ticker, _ in tickers}
+        accuracy = pd.concat([previous[~previous["ticker"].isin(scored)], accuracy], ignore_index=True)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    accuracy.sort_values(["ticker", "horizon"]).to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score the past LSTM forecasts of each ticker against the actual opens.")
+    parser.add_argument("--tickers", nargs="+", help="Only score these tickers (default: the whole market)")
+    parser.add_argument("--days", type=int, default=ACCURACY_DAYS, help="Trading days of forecasts scored per ticker")
+    parser.add_argument("--batch-size", type=int, default=256, help="Windows per prediction request")
+    parser.add_argument("--output", default=FORECAST_ACCURACY_PATH, help="Path of the accuracy CSV")
+    args = parser.parse_args()
+
+    tickers = list_tickers(load_ticker_generic_info())
+    if args.tickers:
+        tickers = [(ticker, exchange) for ticker, exchange in tickers if ticker in set(args.tickers)]
+
+    start = time.perf_counter()
+    failures = backfill_accuracy(tickers, args.output, args.days, args.batch_size)
+    print(f"Scored {len(tickers) - len(failures)}/{len(tickers)} tickers in {time.perf_counter() - start:.1f}s")
+    for ticker, reason in list(failures.items())[:10]:
+        print(f"  {ticker}: {reason}")
+    accuracy = pd.read_csv(args.output)
+    print(accuracy.groupby("horizon")[["mae", "mape", "directional_accuracy"]].median().round(2).to_string())
@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from utils.data_related import read_history_data
+
+def list_tickers(ticker_info_df, exchanges=None):
+    """
+    Returns the (ticker, exchange) pairs of the market, optionally restricted to some exchanges.
+    """
+    tickers = ticker_info_df[["ticker", "exchange"]].dropna()
+    if exchanges is not None:
+        tickers = tickers[tickers["exchange"].isin(exchanges)]
+    return list(tickers.itertuples(index=False, name=None))
+
+def load_history_panel(tickers, ticker_info_df, fields=("Close",), start_date=None, max_workers=8):
+    """
+    Reads the daily history of each ticker and pivots it into one wide frame per field,
+    indexed by trading date with one column per ticker. Missing days are NaN.
+    """
+    exchanges = ticker_info_df.set_index("ticker")["exchange"]
+
+    def read_one(ticker):
+        history_data = read_history_data(ticker, exchanges[ticker])
+        history_data["TradingDate"] = pd.to_datetime(history_data["TradingDate"])
+        history_data = history_data.drop_duplicates(subset="TradingDate", keep="last").set_index("TradingDate")
+        if start_date is not None:
+            history_data = history_data[history_data.index >= pd.Timestamp(start_date)]
+        return history_data[list(fields)].astype("float32")
+
+    tickers = [ticker.strip() for ticker in tickers]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        histories = list(executor.map(read_one, tickers))
+
+    panel = {}
+    for field in fields:
+        panel[field] = pd.concat(
+            [history[field].rename(ticker) for ticker, history in zip(tickers, histories)], axis=1
+        ).sort_index()
+    return panel
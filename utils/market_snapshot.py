@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.data_related import load_ticker_generic_info
+from utils.market_panel import list_tickers, load_history_panel
+from utils.sector_index import MAX_DAILY_MOVE
+
+SNAPSHOT_PATH = "data/derived/market-snapshot.json"
+TOP_N = 10
+EXCHANGES = ["HOSE", "HNX", "UPCOM"]
+
+# Snapshot loaded by the current process, reloaded when the file on disk changes
+_loaded_snapshot = {}
+
+def _top(values, n, largest=True):
+    # Positions of the n largest (or smallest) finite values, ordered, using a partial sort
+    positions = np.flatnonzero(np.isfinite(values))
+    n = min(n, len(positions))
+    if n == 0:
+        return positions
+    keys = -values[positions] if largest else values[positions]
+    top = positions[np.argpartition(keys, n - 1)[:n]]
+    order = np.argsort(-values[top] if largest else values[top], kind="stable")
+    return top[order]
+
+def _rows(frame, positions):
+    return [
+        {key: (None if isinstance(value, float) and np.isnan(value) else value) for key, value in row.items()}
+        for row in frame.iloc[positions].to_dict(orient="records")
+    ]
+
+def daily_moves(close_panel, volume_panel, ticker_info_df):
+    """
+    Returns one row per ticker with its Close and Volume on the market's last trading date,
+    the change from its previous Close, and whether it traded that day.
+    """
+    market_date = close_panel.index.max()
+    prices = close_panel.where(close_panel > 0)
+    previous_close = prices[prices.index < market_date].ffill().iloc[-1] if len(prices) > 1 else prices.iloc[-1] * np.nan
+    close = prices.loc[market_date]
+
+    moves = pd.DataFrame({
+        "ticker": close_panel.columns,
+        "close": close.to_numpy(dtype=np.float64),
+        "previous_close": previous_close.to_numpy(dtype=np.float64),
+        "volume": volume_panel.loc[market_date].reindex(close_panel.columns).to_numpy(dtype=np.float64),
+    })
+    moves["change"] = moves["close"] - moves["previous_close"]
+    moves["change_percent"] = 100 * moves["change"] / moves["previous_close"]
+    moves["traded"] = moves["close"].notna()
+
+    info = ticker_info_df.dropna(subset=["ticker"]).set_index("ticker")
+    moves["name"] = info["shortName"].reindex(moves["ticker"]).astype(object).to_numpy()
+    moves["exchange"] = info["exchange"].reindex(moves["ticker"]).astype(object).to_numpy()
+    return market_date, moves
+
+def exchange_summary(moves, n=TOP_N):
+    """
+    Computes the advance/decline breadth and the top gainers, losers and most active tickers of a set of moves.
+    Moves beyond MAX_DAILY_MOVE are left out of the gainers and losers as bad prints.
+    """
+    change = moves["change_percent"].to_numpy(dtype=np.float64)
+    rankable = np.where(np.abs(change) <= 100 * MAX_DAILY_MOVE, change, np.nan)
+    volume = np.where(moves["traded"], moves["volume"].to_numpy(dtype=np.float64), np.nan)
+    columns = ["ticker", "name", "close", "change", "change_percent", "volume"]
+    ranked = moves[columns].round({"close": 2, "change": 2, "change_percent": 2})
+
+    return {
+        "breadth": {
+            "advancing": int((change > 0).sum()),
+            "declining": int((change < 0).sum()),
+            "unchanged": int((change == 0).sum()),
+            "not_traded": int((~moves["traded"]).sum()),
+            "total_volume": float(np.nansum(volume)),
+        },
+        "top_gainers": _rows(ranked, _top(np.where(rankable > 0, rankable, np.nan), n)),
+        "top_losers": _rows(ranked, _top(np.where(rankable < 0, rankable, np.nan), n, largest=False)),
+        "most_active": _rows(ranked, _top(np.where(volume > 0, volume, np.nan), n)),
+    }
+
+def build_market_snapshot(ticker_info_df, path=SNAPSHOT_PATH, n=TOP_N):
+    """
+    Builds the market snapshot of the last trading date: breadth and rankings for the whole market
+    and for each exchange, written as one small JSON file. Returns the snapshot.
+    """
+    tickers = [ticker for ticker, _ in list_tickers(ticker_info_df)]
+    panel = load_history_panel(tickers, ticker_info_df, fields=("Close", "Volume"))
+    market_date, moves = daily_moves(panel["Close"], panel["Volume"], ticker_info_df)
+
+    snapshot = {
+        "date": market_date.strftime("%Y-%m-%d"),
+        "generated_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "exchanges": {"ALL": exchange_summary(moves, n)},
+    }
+    for exchange in EXCHANGES:
+        snapshot["exchanges"][exchange] = exchange_summary(moves[moves["exchange"] == exchange], n)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file first so the homepage never reads a half-written snapshot
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(snapshot, file, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+    return snapshot
+
+def load_market_snapshot(path=SNAPSHOT_PATH):
+    """
+    Loads the market snapshot once per process and reloads it when the file is rebuilt.
+    Returns None if the snapshot has not been built yet.
+    """
+    if not os.path.exists(path):
+        return None
+
+    modified = os.stat(path).st_mtime_ns
+    if _loaded_snapshot.get("modified") != modified:
+        with open(path, encoding="utf-8") as file:
+            _loaded_snapshot["snapshot"] = json.load(file)
+        _loaded_snapshot["modified"] = modified
+    return _loaded_snapshot["snapshot"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the market snapshot shown on the homepage.")
+    parser.add_argument("--top", type=int, default=TOP_N, help="Number of tickers in each ranking")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    snapshot = build_market_snapshot(load_ticker_generic_info(), n=args.top)
+    print(f"Built the {snapshot['date']} snapshot in {time.perf_counter() - start:.2f}s "
+          f"({os.path.getsize(SNAPSHOT_PATH) / 1024:.1f} KB)")
+    for exchange, summary in snapshot["exchanges"].items():
+        print(exchange, summary["breadth"], "top gainer:", summary["top_gainers"][0]["ticker"] if summary["top_gainers"] else None)
@@ -0,0 +1,89 @@
+import argparse
+
+import pandas as pd
+
+from utils.data_related import (load_ticker_generic_info, read_history_data, read_dividend_data,
+                                read_financial_data, read_analysis_data)
+
+DATASET_LOADERS = {
+    "stock-historical-data": read_history_data,
+    "dividend-history": read_dividend_data,
+    "financial-ratio": read_financial_data,
+    "industry-analysis": read_analysis_data,
+}
+
+# Frames a typical session holds: the default watchlist and portfolio histories plus one company's datasets
+SESSION_HISTORY_TICKERS = ["ACB", "BID", "CTG", "VCB", "EIB"]
+SESSION_COMPANY_TICKER = "ACB"
+
+def frame_memory(data):
+    """
+    Returns the memory held by a frame in bytes, including the contents of string columns.
+    """
+    return int(data.memory_usage(deep=True).sum())
+
+def dataset_memory_report(tickers, ticker_info_df):
+    """
+    Measures the memory of each dataset for the given tickers, read with the default pandas types
+    and with the compact schema. Returns one row per dataset.
+    """
+    exchanges = ticker_info_df.set_index("ticker")["exchange"]
+    rows = []
+    for dataset, loader in DATASET_LOADERS.items():
+        before = after = loaded_rows = files = 0
+        for ticker in tickers:
+            try:
+                raw = loader(ticker, exchanges[ticker], compact=False)
+                compact = loader(ticker, exchanges[ticker])
+            except FileNotFoundError:
+                continue
+            before += frame_memory(raw)
+            after += frame_memory(compact)
+            loaded_rows += len(compact)
+            files += 1
+        rows.append({"dataset": dataset, "files": files, "rows": loaded_rows, "bytes_before": before, "bytes_after": after})
+
+    overview_before = frame_memory(load_ticker_generic_info(compact=False))
+    overview_after = frame_memory(ticker_info_df)
+    rows.append({"dataset": "ticker-overview", "files": 1, "rows": len(ticker_info_df),
+                 "bytes_before": overview_before, "bytes_after": overview_after})
+
+    report = pd.DataFrame(rows)
+    report["saved_%"] = (100 * (1 - report["bytes_after"] / report["bytes_before"].where(report["bytes_before"] > 0))).round(1)
+    return report
+
+def session_memory_report(ticker_info_df, history_tickers=SESSION_HISTORY_TICKERS, company_ticker=SESSION_COMPANY_TICKER):
+    """
+    Estimates the frames held by one session: the ticker overview, the watchlist histories
+    and every dataset of the company shown on the Company Information page.
+    """
+    exchanges = ticker_info_df.set_index("ticker")["exchange"]
+    before = frame_memory(load_ticker_generic_info(compact=False))
+    after = frame_memory(ticker_info_df)
+
+    loads = [(read_history_data, ticker) for ticker in history_tickers]
+    loads += [(loader, company_ticker) for loader in DATASET_LOADERS.values()]
+    for loader, ticker in loads:
+        try:
+            before += frame_memory(loader(ticker, exchanges[ticker], compact=False))
+            after += frame_memory(loader(ticker, exchanges[ticker]))
+        except FileNotFoundError:
+            continue
+    return before, after
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the memory held by the loaded datasets before and after the compact schema.")
+    parser.add_argument("--tickers", nargs="+", help="Tickers to measure (default: the whole market)")
+    parser.add_argument("--sessions", type=int, default=50, help="Number of concurrent sessions to extrapolate to")
+    args = parser.parse_args()
+
+    ticker_info = load_ticker_generic_info()
+    tickers = args.tickers or ticker_info["ticker"].dropna().tolist()
+
+    report = dataset_memory_report(tickers, ticker_info)
+    print(report.to_string(index=False))
+
+    before, after = session_memory_report(ticker_info)
+    print(f"\nPer session: {before / 1e6:.2f} MB before, {after / 1e6:.2f} MB after")
+    print(f"{args.sessions} sessions: {args.sessions * before / 1e6:.1f} MB before, {args.sessions * after / 1e6:.1f} MB after")
@@ -0,0 +1,203 @@
+import argparse
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SESSION_IDLE_SECONDS = 300  # A session without a rerun for this long is no longer counted as active
+
+# Type and help text of every exported metric
+METRICS = {
+    "stockify_prediction_request_seconds": ("histogram", "Latency of prediction API requests by endpoint."),
+    "stockify_prediction_request_errors_total": ("counter", "Failed prediction API requests by endpoint and reason."),
+    "stockify_cache_requests_total": ("counter", "Cache lookups by cache and result."),
+    "stockify_cache_hit_ratio": ("gauge", "Share of cache lookups answered from the cache since start."),
+    "stockify_loader_bytes_total": ("counter", "Bytes of dataset files parsed by the loaders."),
+    "stockify_loader_rows_total": ("counter", "Rows of dataset files parsed by the loaders."),
+    "stockify_loader_seconds_total": ("counter", "Time spent parsing dataset files."),
+    "stockify_active_sessions": ("gauge", f"Streamlit sessions with a rerun in the last {SESSION_IDLE_SECONDS} seconds."),
+}
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts, sum, count]
+_sessions = {}  # Streamlit session id -> time of its last rerun
+_server = {}
+
+def increment(name, labels=(), amount=1):
+    """
+    Adds `amount` to a counter; `labels` is a tuple of (label, value) pairs.
+    """
+    with _lock:
+        _counters[(name, labels)] = _counters.get((name, labels), 0) + amount
+
+def observe(name, labels, value, buckets=LATENCY_BUCKETS):
+    """
+    Records one observation in a histogram.
+    """
+    with _lock:
+        histogram = _histograms.setdefault((name, labels), [[0] * len(buckets), 0.0, 0])
+        position = bisect.bisect_left(buckets, value)
+        if position < len(buckets):
+            histogram[0][position] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+def record_prediction_request(endpoint, seconds, error=None):
+    observe("stockify_prediction_request_seconds", (("endpoint", endpoint),), seconds)
+    if error is not None:
+        increment("stockify_prediction_request_errors_total", (("endpoint", endpoint), ("reason", error)))
+
+def record_cache_lookup(cache, hit):
+    increment("stockify_cache_requests_total", (("cache", cache), ("result", "hit" if hit else "miss")))
+
+def record_load(dataset, n_bytes, rows, seconds):
+    labels = (("dataset", dataset),)
+    increment("stockify_loader_bytes_total", labels, n_bytes)
+    increment("stockify_loader_rows_total", labels, rows)
+    increment("stockify_loader_seconds_total", labels, seconds)
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render_metrics(buckets=LATENCY_BUCKETS):
+    """
+    Returns every metric in the Prometheus text exposition format.
+    """
+    now = time.monotonic()
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: (list(counts), total, count) for key, (counts, total, count) in _histograms.items()}
+        active_sessions = sum(now - seen < SESSION_IDLE_SECONDS for seen in _sessions.values())
+
+    # Hit ratios are derived from the lookup counters at scrape time
+    gauges = {("stockify_active_sessions", ()): active_sessions}
+    lookups = {}
+    for (name, labels), value in counters.items():
+        if name == "stockify_cache_requests_total":
+            cache, result = dict(labels)["cache"], dict(labels)["result"]
+            lookups.setdefault(cache, {"hit": 0, "miss": 0})[result] += value
+    for cache, results in lookups.items():
+        gauges[("stockify_cache_hit_ratio", (("cache", cache),))] = results["hit"] / (results["hit"] + results["miss"])
+
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+        if metric_type == "histogram":
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = np.cumsum(counts)
+                for bound, bucket_count in zip(buckets, cumulative):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {bucket_count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        else:
+            values = counters if metric_type == "counter" else gauges
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        content = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would flood the Streamlit log
+
+def start_metrics_server(host="127.0.0.1", port=9464):
+    """
+    Serves the metrics on http://host:port/metrics from a background thread, once per process.
+    Returns the server.
+    """
+    with _lock:
+        if "server" not in _server:
+            server = ThreadingHTTPServer((host, port), MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            _server["server"] = server
+        return _server["server"]
+
+def track_session():
+    """
+    Counts the current Streamlit session as active, and starts the metrics server
+    if the METRICS_PORT environment variable is set. Called at the top of every page.
+    """
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    context = get_script_run_ctx()
+    if context is not None:
+        with _lock:
+            _sessions[context.session_id] = time.monotonic()
+            for session_id, seen in list(_sessions.items()):
+                if time.monotonic() - seen >= 2 * SESSION_IDLE_SECONDS:
+                    del _sessions[session_id]
+    if os.environ.get("METRICS_PORT"):
+        try:
+            start_metrics_server(os.environ.get("METRICS_HOST", "127.0.0.1"), int(os.environ["METRICS_PORT"]))
+        except OSError:
+            pass  # The port is taken, e.g. by another Streamlit process; the app keeps working without metrics
+
+
+if __name__ == "__main__":
+    from utils import ml_model
+    from utils.data_related import load_ticker_generic_info, read_history_data
+    # The instrumented modules record into utils.metrics, which is a different module from __main__
+    from utils.metrics import render_metrics, start_metrics_server
+    from utils.prediction_stub import STUB_ENDPOINTS, start_prediction_stub
+
+    parser = argparse.ArgumentParser(description="Exercise the instrumented code against the prediction stub and show the metrics.")
+    parser.add_argument("--requests", type=int, default=30, help="Prediction requests sent to each endpoint")
+    parser.add_argument("--tickers", type=int, default=20, help="Histories read, twice each")
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="Latency of the prediction stub in seconds")
+    parser.add_argument("--stub-jitter", type=float, default=0.03, help="Random variation of the stub latency")
+    parser.add_argument("--stub-error-rate", type=float, default=0.1, help="Fraction of failed prediction requests")
+    parser.add_argument("--port", type=int, help="Keep serving the metrics on this port after the run")
+    args = parser.parse_args()
+
+    _, stub_url = start_prediction_stub(latency=args.stub_latency, jitter=args.stub_jitter, error_rate=args.stub_error_rate)
+    ml_model.BASE_API_URL = stub_url
+
+    windows = np.random.default_rng(0).random((1, 60, 5))
+    for endpoint in STUB_ENDPOINTS:
+        for _ in range(args.requests):
+            try:
+                ml_model.request_predictions(endpoint.lstrip("/"), windows)
+            except Exception:
+                pass  # Counted by the instrumentation
+
+    ticker_info = load_ticker_generic_info()
+    for ticker, exchange in ticker_info[["ticker", "exchange"]].dropna().head(args.tickers).itertuples(index=False):
+        for _ in range(2):
+            try:
+                read_history_data(ticker, exchange)
+            except FileNotFoundError:
+                pass
+
+    print(render_metrics(), end="")
+    if args.port:
+        start_metrics_server(port=args.port)
+        print(f"Serving the metrics on http://127.0.0.1:{args.port}/metrics, press Ctrl+C to stop")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -1,9 +1,14 @@
+import os
+import time
 import joblib
 import pandas as pd
 import numpy as np
 import requests
 
-BASE_API_URL = "https://efc1-35-240-221-166.ngrok-free.app/"
+from utils.metrics import record_prediction_request
+
+# The prediction server can be overridden, e.g. to point at a local stand-in (see utils/prediction_stub.py)
+BASE_API_URL = os.environ.get("PREDICTION_API_URL", "https://efc1-35-240-221-166.ngrok-free.app/").rstrip("/") + "/"
 
 # Load the trained model
 def load_sklearn_model(model_path):
@@ -25,13 +30,18 @@ def prepare_data_for_buy_sell_prediction(stock_data):
 
     return stock_data
 
-def predict_buy_sell_probability(model, stock_data):
+BUY_SELL_FEATURES = ['Close', 'RSI', 'MACD', 'MACD_signal', 'BB_high', 'BB_low']
+
+def prepare_buy_sell_features(stock_data):
     # Prepare data for prediction
     stock_data = prepare_data_for_buy_sell_prediction(stock_data)
 
     # Select the last row for prediction
     last_row = stock_data.iloc[-1]
-    features = last_row[['Close', 'RSI', 'MACD', 'MACD_signal', 'BB_high', 'BB_low']].values.reshape(1, -1)
+    return last_row[BUY_SELL_FEATURES].values.reshape(1, -1)
+
+def predict_buy_sell_probability(model, stock_data):
+    features = prepare_buy_sell_features(stock_data)
 
     # Predict probabilities
     buy_prob = model.predict_proba(features)[0][1] * 100  # Probability of "Buy" in percentage
@@ -64,9 +74,10 @@ def calculate_bollinger_bands(data, window=20, num_std_dev=2):
     bb_low = rolling_mean - (rolling_std * num_std_dev)
     return bb_high, bb_low
 
-def predict_new_data(new_data: pd.DataFrame, features: list[str], window_size: int):
+def prepare_inference_window(new_data: pd.DataFrame, features: list[str], window_size: int):
     """
-    Preprocesses input data, sends it to the API for inference, and post-processes predictions.
+    Selects the last window_size rows and min-max normalizes each feature column.
+    Returns the normalized window (window_size, n_features) with the column-wise min and max.
     """
     # Sort and select the last window_size rows
     new_data = new_data.sort_values("TradingDate", ascending=True)
@@ -76,25 +87,48 @@ def predict_new_data(new_data: pd.DataFrame, features: list[str], window_size: i
     X_last_window = last_window[features].values
     min_feature = np.min(X_last_window, axis=0)  # Column-wise min
     max_feature = np.max(X_last_window, axis=0)  # Column-wise max
-    X_last_window_norm = (X_last_window - min_feature) / (max_feature - min_feature)
+    # A flat column (e.g. a suspended ticker) normalizes to zeros instead of dividing by zero
+    spread = max_feature - min_feature
+    X_last_window_norm = (X_last_window - min_feature) / np.where(spread > 0, spread, 1)
 
-    # Reshape to match the LSTM input format (samples, timesteps, features)
-    X_last_window_norm = X_last_window_norm.reshape(1, window_size, len(features))
+    return X_last_window_norm, min_feature, max_feature
 
+def request_predictions(endpoint: str, X_inference_norm: np.ndarray):
+    """
+    Sends normalized windows (samples, timesteps, features) to a prediction endpoint
+    and returns the normalized predictions, one row per sample.
+    """
     # Prepare payload for the API
     payload = {
-        "X_inference_norm": X_last_window_norm.tolist()  # Convert NumPy array to JSON-compatible format
+        "X_inference_norm": X_inference_norm.tolist()  # Convert NumPy array to JSON-compatible format
     }
 
-    # Call the API endpoint
-    response = requests.post(BASE_API_URL + "predict-next-day", json=payload)
+    # Call the API endpoint, timing it for the metrics whether it succeeds or not
+    start = time.perf_counter()
+    try:
+        response = requests.post(BASE_API_URL + endpoint, json=payload)
+    except requests.RequestException as error:
+        record_prediction_request(endpoint, time.perf_counter() - start, type(error).__name__)
+        raise
 
     # Check if the API call is successful
     if response.status_code == 200:
-        y_pred_norm = np.array(response.json()["predictions"])
+        record_prediction_request(endpoint, time.perf_counter() - start)
+        return np.array(response.json()["predictions"])
     else:
+        record_prediction_request(endpoint, time.perf_counter() - start, str(response.status_code))
         raise Exception(f"API request failed with status code {response.status_code}: {response.text}")
 
+def predict_new_data(new_data: pd.DataFrame, features: list[str], window_size: int):
+    """
+    Preprocesses input data, sends it to the API for inference, and post-processes predictions.
+    """
+    X_last_window_norm, min_feature, max_feature = prepare_inference_window(new_data, features, window_size)
+
+    # Reshape to match the LSTM input format (samples, timesteps, features)
+    X_last_window_norm = X_last_window_norm.reshape(1, window_size, len(features))
+    y_pred_norm = request_predictions("predict-next-day", X_last_window_norm)
+
     # Denormalize the prediction
     y_pred_denorm = y_pred_norm * (max_feature[0] - min_feature[0]) + min_feature[0]
 
@@ -105,32 +139,11 @@ def predict_3rd_day_open_price(new_data: pd.DataFrame, features: list[str], wind
     Preprocesses input data, sends it to the API for 3rd-day open price inference, 
     and post-processes predictions.
     """
-    # Sort and select the last window_size rows
-    new_data = new_data.sort_values("TradingDate", ascending=True)
-    last_window = new_data.iloc[-window_size:]
-
-    # Extract feature values and normalize them
-    X_last_window = last_window[features].values
-    min_feature = np.min(X_last_window, axis=0)  # Column-wise min
-    max_feature = np.max(X_last_window, axis=0)  # Column-wise max
-    X_last_window_norm = (X_last_window - min_feature) / (max_feature - min_feature)
+    X_last_window_norm, min_feature, max_feature = prepare_inference_window(new_data, features, window_size)
 
     # Reshape to match the LSTM input format (samples, timesteps, features)
     X_last_window_norm = X_last_window_norm.reshape(1, window_size, len(features))
-
-    # Prepare payload for the API
-    payload = {
-        "X_inference_norm": X_last_window_norm.tolist()  # Convert NumPy array to JSON-compatible format
-    }
-
-    # Call the API endpoint
-    response = requests.post(BASE_API_URL + "predict-3rd-day", json=payload)
-
-    # Check if the API call is successful
-    if response.status_code == 200:
-        y_pred_norm = np.array(response.json()["predictions"])
-    else:
-        raise Exception(f"API request failed with status code {response.status_code}: {response.text}")
+    y_pred_norm = request_predictions("predict-3rd-day", X_last_window_norm)
 
     # Denormalize the prediction
     y_pred_denorm = y_pred_norm * (max_feature[0] - min_feature[0]) + min_feature[0]
@@ -142,31 +155,11 @@ def predict_3_consecutive_days_open_price(new_data: pd.DataFrame, features: list
     Preprocesses input data, sends it to the API for 3 consecutive days' open prices inference, 
     and post-processes predictions.
     """
-    # Sort and select the last window_size rows
-    new_data = new_data.sort_values("TradingDate", ascending=True)
-    last_window = new_data.iloc[-window_size:]
-
-    # Extract feature values and normalize them
-    X_last_window = last_window[features].values
-    min_feature = np.min(X_last_window, axis=0)  # Column-wise min
-    max_feature = np.max(X_last_window, axis=0)  # Column-wise max
-    X_last_window_norm = (X_last_window - min_feature) / (max_feature - min_feature)
+    X_last_window_norm, min_feature, max_feature = prepare_inference_window(new_data, features, window_size)
 
     # Reshape to match the LSTM input format (samples, timesteps, features)
     X_last_window_norm = X_last_window_norm.reshape(1, window_size, len(features))
-
-    # Prepare payload for the API
-    payload = {
-        "X_inference_norm": X_last_window_norm.tolist()  # Convert NumPy array to JSON-compatible format
-    }
-
-    response = requests.post(BASE_API_URL + "predict-3-consecutive-days", json=payload)
-
-    # Check if the API call is successful
-    if response.status_code == 200:
-        y_pred_norm = np.array(response.json()["predictions"])
-    else:
-        raise Exception(f"API request failed with status code {response.status_code}: {response.text}")
+    y_pred_norm = request_predictions("predict-3-consecutive-days", X_last_window_norm)
 
     # Denormalize the predictions
     y_pred_denorm = y_pred_norm * (max_feature[0] - min_feature[0]) + min_feature[0]
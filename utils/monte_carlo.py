@@ -0,0 +1,122 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.data_related import load_ticker_generic_info, read_forecast_table
+from utils.risk_analytics import covariance_matrix, load_portfolio_returns
+
+SIMULATION_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+DEFAULT_TICKERS = ["ACB", "BID", "CTG", "VCB", "EIB", "HPG", "FPT", "MWG", "VNM", "SSI",
+                   "VIC", "MSN", "TCB", "MBB", "VPB", "STB", "GAS", "PLX", "VHM", "POW"]
+
+def forecast_drift(tickers, forecast_table=None):
+    """
+    Returns the mean daily log return implied by the LSTM 3-day forecasts of the batch forecast table,
+    from the last Close to the third forecast open. NaN for tickers without a forecast.
+    """
+    if forecast_table is None:
+        forecast_table = read_forecast_table()
+    if forecast_table is None:
+        return np.full(len(tickers), np.nan)
+
+    forecasts = forecast_table.reindex(tickers)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drift = np.log(forecasts["next_3_days_open_3"].to_numpy(dtype=np.float64)
+                       / forecasts["last_close"].to_numpy(dtype=np.float64)) / 3
+    return np.where(np.isfinite(drift), drift, np.nan)
+
+def simulate_portfolio_values(returns, weights, n_paths=100_000, horizon_days=20, method="bootstrap",
+                              drift=None, initial_value=1.0, seed=None):
+    """
+    Simulates a buy-and-hold portfolio over `horizon_days` trading days along `n_paths` paths.
+    Daily log returns are drawn either as whole past days of `returns` (`bootstrap`, which keeps the dependence
+    between tickers) or from a normal distribution with the historical covariance (`normal`).
+    Normal draws come in antithetic pairs, which halves the random numbers needed and reduces the variance.
+    Where `drift` is finite it replaces the historical mean daily log return of that ticker.
+    Returns a (horizon_days + 1, n_paths) float32 array of portfolio values starting at `initial_value`.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    weights = weights / weights.sum()
+    history = np.nan_to_num(returns.to_numpy(dtype=np.float64))
+    mean = history.mean(axis=0)
+    target = mean if drift is None else np.where(np.isfinite(drift), drift, mean)
+    random_state = np.random.default_rng(seed)
+
+    if method == "bootstrap":
+        draws = (history - mean + target).astype(np.float32)
+    elif method == "normal":
+        cov = np.nan_to_num(covariance_matrix(returns).to_numpy(dtype=np.float64))
+        # An eigendecomposition factor works for covariance matrices that are only semi-definite
+        eigenvalues, eigenvectors = np.linalg.eigh(cov)
+        factor = (eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))).T.astype(np.float32)
+        target = target.astype(np.float32)
+    else:
+        raise ValueError(f"Unknown simulation method: {method}")
+
+    # Only the horizon is looped over; each step draws the returns of every path and ticker at once
+    cumulative = np.zeros((n_paths, len(weights)), dtype=np.float32)
+    values = np.empty((horizon_days + 1, n_paths), dtype=np.float32)
+    values[0] = initial_value
+    scaled_weights = (weights * initial_value).astype(np.float32)
+    half = (n_paths + 1) // 2
+    for day in range(1, horizon_days + 1):
+        if method == "bootstrap":
+            cumulative += draws[random_state.integers(0, len(draws), n_paths)]
+        else:
+            shocks = random_state.standard_normal((half, len(weights)), dtype=np.float32) @ factor
+            cumulative[:half] += target + shocks
+            cumulative[half:] += target - shocks[:n_paths - half]
+        values[day] = np.exp(cumulative) @ scaled_weights
+    return values
+
+def value_quantiles(values, quantiles=SIMULATION_QUANTILES):
+    """
+    Returns the quantiles of the simulated portfolio value for every day, one column per quantile.
+    """
+    return pd.DataFrame(
+        np.quantile(values, quantiles, axis=1).T,
+        columns=[f"q{round(quantile * 100)}" for quantile in quantiles],
+        index=pd.RangeIndex(len(values), name="day"),
+    )
+
+def summarize_outcomes(values, confidence=0.95):
+    """
+    Summarizes the final simulated values: their mean and median, the probability of ending below the
+    initial value, and the Value at Risk and expected shortfall at `confidence` as positive losses.
+    """
+    initial_value = float(values[0, 0])
+    final = values[-1].astype(np.float64)
+    cutoff = np.quantile(final, 1 - confidence)
+    return {
+        "expected_value": float(final.mean()),
+        "median_value": float(np.median(final)),
+        "probability_of_loss": float((final < initial_value).mean()),
+        "value_at_risk": float(initial_value - cutoff),
+        "expected_shortfall": float(initial_value - final[final <= cutoff].mean()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the Monte Carlo simulation of an equally weighted portfolio.")
+    parser.add_argument("--tickers", nargs="+", default=DEFAULT_TICKERS, help="Tickers of the portfolio")
+    parser.add_argument("--paths", type=int, default=100_000, help="Number of simulated paths")
+    parser.add_argument("--horizon", type=int, default=20, help="Trading days to simulate")
+    parser.add_argument("--window", type=int, default=500, help="Trading days of history to draw from")
+    parser.add_argument("--drift", action="store_true", help="Center the draws on the LSTM 3-day forecasts")
+    args = parser.parse_args()
+
+    returns = load_portfolio_returns(args.tickers, load_ticker_generic_info(), window=args.window)
+    drift = forecast_drift(list(returns.columns)) if args.drift else None
+    weights = np.ones(returns.shape[1])
+    print(f"{args.paths} paths x {returns.shape[1]} tickers x {args.horizon} days from {len(returns)} days of returns")
+
+    for method in ["bootstrap", "normal"]:
+        start = time.perf_counter()
+        values = simulate_portfolio_values(returns, weights, args.paths, args.horizon, method, drift, seed=0)
+        quantiles = value_quantiles(values)
+        elapsed = time.perf_counter() - start
+        outcomes = summarize_outcomes(values)
+        print(f"{method}: {elapsed:.3f}s, final quantiles {np.round(quantiles.iloc[-1].to_numpy(), 4).tolist()}, "
+              f"P(loss) {outcomes['probability_of_loss']:.1%}, VaR 95% {outcomes['value_at_risk']:.2%}")
@@ -0,0 +1,171 @@
+import argparse
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import streamlit.logger
+
+from utils import ml_model
+from utils.data_related import load_ticker_generic_info
+from utils.prediction_stub import start_prediction_stub
+
+# Page scripts and the number of tickers a virtual user picks on each of them
+PAGES = {
+    "Watchlist": ("pages/Watchlist.py", 8),
+    "Portfolio": ("pages/Portfolio.py", 4),
+    "Company Information": ("pages/Company Information.py", 1),
+}
+
+def sample_ticker_selections(ticker_info_df, count, size, seed=0):
+    """
+    Draws `count` selections of `size` tickers. Widely held tickers are picked more often,
+    as they are the ones most users watch.
+    """
+    listed = ticker_info_df.dropna(subset=["ticker"])
+    weights = listed["noShareholders"].fillna(0).to_numpy(dtype=np.float64) + 1
+    random_state = np.random.default_rng(seed)
+    return [
+        listed["ticker"].to_numpy()[random_state.choice(len(listed), size, replace=False, p=weights / weights.sum())].tolist()
+        for _ in range(count)
+    ]
+
+def _interact(page, app, tickers):
+    # Apply a user's selection the way they would on each page
+    if page == "Watchlist":
+        app.multiselect[0].set_value([f"{ticker} " for ticker in tickers])
+    elif page == "Portfolio":
+        app.multiselect[0].set_value([f"{ticker} " for ticker in tickers])
+        app.button[0].click()
+    else:
+        selected = [option for option in app.selectbox[0].options if option.startswith(f"{tickers[0]} - ")]
+        app.selectbox[0].select(selected[0])
+
+def run_page_load_test(page, concurrency=10, rounds=2, timeout=300, synchronized=True, seed=0):
+    """
+    Runs `concurrency` virtual users against a page, each opening it `rounds` times and submitting a ticker
+    selection. With `synchronized`, every user submits at the same moment, like a crowd pressing Submit together.
+    Returns the (step, seconds, failed) results and the resources used by the run.
+    """
+    from streamlit.testing.v1 import AppTest  # Imported here so the CLI starts quickly when it only prints help
+
+    script, size = PAGES[page]
+    script = os.path.abspath(script)
+    selections = sample_ticker_selections(load_ticker_generic_info(), concurrency * rounds, size, seed)
+    barrier = threading.Barrier(concurrency) if synchronized else None
+    results = []
+    results_lock = threading.Lock()
+
+    def record(step, seconds, app):
+        with results_lock:
+            results.append((step, seconds, len(app.exception) > 0))
+
+    def virtual_user(user):
+        for round_number in range(rounds):
+            app = AppTest.from_file(script, default_timeout=timeout)
+            start = time.perf_counter()
+            app.run()
+            record("open", time.perf_counter() - start, app)
+
+            _interact(page, app, selections[user * rounds + round_number])
+            if barrier is not None:
+                try:
+                    barrier.wait(timeout)
+                except threading.BrokenBarrierError:
+                    pass  # Another user failed before submitting; carry on unsynchronized
+            start = time.perf_counter()
+            app.run()
+            record("submit", time.perf_counter() - start, app)
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(virtual_user, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    resources = {
+        "elapsed": elapsed,
+        "cpu_seconds": cpu_seconds,
+        "max_rss_mb": usage_after.ru_maxrss / 1024,  # ru_maxrss is in kilobytes on Linux
+        "rss_growth_mb": (usage_after.ru_maxrss - usage_before.ru_maxrss) / 1024,
+        "traced_peak_mb": tracemalloc.get_traced_memory()[1] / 1e6 if tracemalloc.is_tracing() else None,
+    }
+    return results, resources
+
+def check_search_after_deselect(page, removed="ACB ", query="fpt", timeout=300):
+    """
+    Removes a default ticker from a page's multiselect, then searches for companies that do not match it,
+    which used to fail because the widget's default was no longer among the searched options.
+    Returns the problems found, an empty list if the page behaved.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.abspath(PAGES[page][0]), default_timeout=timeout).run()
+    selection = [option for option in app.multiselect[0].value if option != removed]
+    app.multiselect[0].set_value(selection).run()
+    search = [widget for widget in app.sidebar.text_input if widget.label == "Search companies"][0]
+    search.set_value(query).run()
+
+    problems = [f"exception: {exception.value}" for exception in app.exception]
+    if not problems and app.multiselect[0].value != selection:
+        problems.append(f"selection changed from {selection} to {app.multiselect[0].value}")
+    return problems
+
+def summarize(page, results, resources):
+    """
+    Formats the latency percentiles per step and the CPU and memory used by a page's run.
+    """
+    lines = [f"{page}: {len(results) // 2} sessions in {resources['elapsed']:.1f}s, "
+             f"CPU {resources['cpu_seconds']:.1f}s ({100 * resources['cpu_seconds'] / resources['elapsed']:.0f}% of one core), "
+             f"max RSS {resources['max_rss_mb']:.0f} MB (+{resources['rss_growth_mb']:.0f} MB)"
+             + (f", traced peak {resources['traced_peak_mb']:.0f} MB" if resources["traced_peak_mb"] is not None else "")]
+    lines.append(f"  {'step':<8}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'failed':>8}")
+    for step in ["open", "submit"]:
+        selected = [result for result in results if result[0] == step]
+        latencies = np.array([result[1] for result in selected]) * 1000
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        failed = sum(result[2] for result in selected)
+        lines.append(f"  {step:<8}{len(selected):>7}{p50:>10.0f}{p90:>10.0f}{p99:>10.0f}{latencies.max():>10.0f}{failed:>8}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the Streamlit pages with concurrent virtual users.")
+    parser.add_argument("--pages", nargs="+", choices=list(PAGES), default=list(PAGES), help="Pages to test")
+    parser.add_argument("--concurrency", type=int, default=10, help="Number of simultaneous sessions")
+    parser.add_argument("--rounds", type=int, default=2, help="Sessions opened by each virtual user")
+    parser.add_argument("--no-sync", action="store_true", help="Let users submit independently instead of all at once")
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="Latency of the prediction stub in seconds")
+    parser.add_argument("--stub-jitter", type=float, default=0.05, help="Random variation of the stub latency")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Fraction of failed prediction requests")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Track the peak Python allocations with tracemalloc (slows the pages down)")
+    parser.add_argument("--check-search", action="store_true",
+                        help="Only check that searching after removing a default ticker keeps the selectors working")
+    args = parser.parse_args()
+
+    _, stub_url = start_prediction_stub(latency=args.stub_latency, jitter=args.stub_jitter, error_rate=args.stub_error_rate)
+    ml_model.BASE_API_URL = stub_url
+    print(f"Prediction stub at {stub_url} with {args.stub_latency * 1000:.0f} ms latency")
+
+    if args.check_search:
+        failed = False
+        for page in ["Watchlist", "Portfolio"]:
+            problems = check_search_after_deselect(page)
+            print(f"{page}: search after removing a default ticker: {'; '.join(problems) or 'ok'}")
+            failed = failed or bool(problems)
+        raise SystemExit(1 if failed else 0)
+
+    streamlit.logger.set_log_level("error")  # Keep the pages' deprecation notices out of the report
+    if args.trace_memory:
+        tracemalloc.start()
+    for page in args.pages:
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        results, resources = run_page_load_test(page, args.concurrency, args.rounds, synchronized=not args.no_sync)
+        print(summarize(page, results, resources))
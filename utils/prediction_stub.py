@@ -0,0 +1,88 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Number of predicted values per sample returned by each endpoint
+STUB_ENDPOINTS = {
+    "/predict-next-day": 1,
+    "/predict-3rd-day": 1,
+    "/predict-3-consecutive-days": 3,
+}
+
+def stub_predictions(X_inference_norm, n_outputs):
+    """
+    Predicts the normalized next open prices as the last normalized Close of each window
+    plus a small drift, in the same (samples, outputs) shape as the real prediction server.
+    """
+    X = np.asarray(X_inference_norm, dtype=np.float64)
+    last_close = X[:, -1, 0]
+    steps = np.arange(1, n_outputs + 1)
+    return last_close[:, None] + 0.01 * steps[None, :]
+
+def make_handler(latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+    """
+    Builds a request handler that answers the prediction endpoints after `latency` ± `jitter` seconds
+    and fails a fraction `error_rate` of the requests with a 500 error.
+    """
+    random_state = np.random.default_rng(seed)
+    lock = threading.Lock()
+
+    class PredictionStubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            n_outputs = STUB_ENDPOINTS.get(self.path.rstrip("/"))
+            if n_outputs is None:
+                self._reply(404, {"detail": "Not Found"})
+                return
+
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            with lock:
+                delay = max(0.0, latency + random_state.uniform(-jitter, jitter))
+                failed = random_state.random() < error_rate
+            time.sleep(delay)
+
+            if failed:
+                self._reply(500, {"detail": "Injected failure"})
+            else:
+                predictions = stub_predictions(payload["X_inference_norm"], n_outputs)
+                self._reply(200, {"predictions": predictions.tolist()})
+
+        def _reply(self, status, body):
+            content = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass  # Keep load tests quiet
+
+    return PredictionStubHandler
+
+def start_prediction_stub(host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0):
+    """
+    Starts the stand-in prediction server in a background thread.
+    Returns the server and its base URL, usable as PREDICTION_API_URL.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(latency, jitter, error_rate))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the LSTM prediction server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8500)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds to wait before answering")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform random variation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.latency, args.jitter, args.error_rate))
+    print(f"Prediction stub listening on http://{args.host}:{args.port}/ (set PREDICTION_API_URL to use it)")
+    server.serve_forever()
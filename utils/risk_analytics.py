@@ -0,0 +1,142 @@
+import argparse
+import time
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from utils.data_related import load_ticker_generic_info
+from utils.market_panel import list_tickers, load_history_panel
+
+TRADING_DAYS_PER_YEAR = 252
+
+def compute_return_matrix(close_panel, log_returns=True):
+    """
+    Converts a wide Close price panel (dates x tickers) into daily returns.
+    Non-positive prices and days without a previous price give NaN returns.
+    """
+    prices = close_panel.where(close_panel > 0)
+    if log_returns:
+        returns = np.log(prices).diff()
+    else:
+        returns = prices.pct_change(fill_method=None)
+    return returns.iloc[1:].astype("float32")
+
+def _pairwise_block(X_i, M_i, X_j, M_j, correlation):
+    # Pairwise-complete sums for one block pair, each computed as a single matrix product
+    n = M_i.T @ M_j
+    sum_xy = X_i.T @ X_j
+    sum_x = X_i.T @ M_j
+    sum_y = M_i.T @ X_j
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        co_moment = sum_xy - sum_x * sum_y / n
+        if correlation:
+            var_x = (X_i * X_i).T @ M_j - sum_x * sum_x / n
+            var_y = M_i.T @ (X_j * X_j) - sum_y * sum_y / n
+            return co_moment / np.sqrt(var_x * var_y), n
+        return co_moment / (n - 1), n
+
+def covariance_matrix(returns, window=None, min_periods=20, block_size=256, correlation=False):
+    """
+    Computes the pairwise covariance (or correlation) matrix of the return columns over the last `window` days.
+    The matrix is filled block by block with matrix products, so the full market never needs the
+    (days x tickers x tickers) intermediates of a naive computation. Pairs with fewer than
+    `min_periods` overlapping days are NaN, as in DataFrame.cov.
+    """
+    if window is not None:
+        returns = returns.iloc[-window:]
+
+    values = returns.to_numpy(dtype=np.float64)
+    mask = ~np.isnan(values)
+    values = np.where(mask, values, 0.0)
+    mask = mask.astype(np.float64)
+
+    n_tickers = values.shape[1]
+    result = np.full((n_tickers, n_tickers), np.nan, dtype=np.float32)
+
+    for i in range(0, n_tickers, block_size):
+        block_i = slice(i, i + block_size)
+        for j in range(i, n_tickers, block_size):
+            block_j = slice(j, j + block_size)
+            block, n = _pairwise_block(values[:, block_i], mask[:, block_i], values[:, block_j], mask[:, block_j], correlation)
+            block[n < min_periods] = np.nan
+            result[block_i, block_j] = block
+            result[block_j, block_i] = block.T
+
+    if correlation:
+        np.fill_diagonal(result, np.where(np.isnan(np.diag(result)), np.nan, 1.0))
+
+    return pd.DataFrame(result, index=returns.columns, columns=returns.columns)
+
+def correlation_matrix(returns, window=None, min_periods=20, block_size=256):
+    return covariance_matrix(returns, window, min_periods, block_size, correlation=True)
+
+def rolling_covariance(returns, window=60, step=20, min_periods=20, block_size=256, correlation=False):
+    """
+    Yields (date, matrix) pairs of the covariance (or correlation) matrix over a trailing window,
+    moving forward `step` trading days at a time.
+    """
+    for end in range(window, len(returns) + 1, step):
+        window_returns = returns.iloc[end - window:end]
+        yield window_returns.index[-1], covariance_matrix(window_returns, None, min_periods, block_size, correlation)
+
+def portfolio_volatility(weights, cov):
+    """
+    Returns the daily and annualized volatility of a portfolio given its weights and the daily covariance matrix.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    cov = np.nan_to_num(np.asarray(cov, dtype=np.float64))
+    daily_volatility = float(np.sqrt(weights @ cov @ weights))
+    return daily_volatility, float(daily_volatility * np.sqrt(TRADING_DAYS_PER_YEAR))
+
+def value_at_risk(weights, returns, confidence=0.95, horizon_days=1, method="historical"):
+    """
+    Returns the Value at Risk of the portfolio as a positive fraction of its value.
+    `historical` takes the loss quantile of the past portfolio returns, `parametric` assumes normal returns.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    portfolio_returns = np.nan_to_num(returns.to_numpy(dtype=np.float64)) @ weights
+
+    if method == "historical":
+        # Overlapping sums of daily returns give the horizon returns
+        if horizon_days > 1:
+            cumulative = np.concatenate([[0.0], np.cumsum(portfolio_returns)])
+            portfolio_returns = cumulative[horizon_days:] - cumulative[:-horizon_days]
+        return float(-np.quantile(portfolio_returns, 1 - confidence))
+    elif method == "parametric":
+        z_score = NormalDist().inv_cdf(confidence)
+        mean = portfolio_returns.mean() * horizon_days
+        volatility = portfolio_returns.std(ddof=1) * np.sqrt(horizon_days)
+        return float(z_score * volatility - mean)
+    else:
+        raise ValueError(f"Unknown VaR method: {method}")
+
+def load_portfolio_returns(tickers, ticker_info_df, window=None):
+    """
+    Loads the daily log-return matrix of the given tickers, keeping the last `window` days.
+    """
+    close_panel = load_history_panel(tickers, ticker_info_df, fields=("Close",))["Close"]
+    returns = compute_return_matrix(close_panel)
+    if window is not None:
+        returns = returns.iloc[-window:]
+    return returns
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute the full-market correlation matrix and report timings.")
+    parser.add_argument("--window", type=int, default=250, help="Number of trading days in the window")
+    parser.add_argument("--block-size", type=int, default=256, help="Number of tickers per block")
+    args = parser.parse_args()
+
+    ticker_info = load_ticker_generic_info()
+    tickers = [ticker for ticker, _ in list_tickers(ticker_info)]
+
+    start = time.perf_counter()
+    returns = load_portfolio_returns(tickers, ticker_info, window=args.window)
+    loaded = time.perf_counter()
+    corr = correlation_matrix(returns, block_size=args.block_size)
+    computed = time.perf_counter()
+
+    print(f"Return matrix: {returns.shape[0]} days x {returns.shape[1]} tickers ({returns.memory_usage().sum() / 1e6:.1f} MB)")
+    print(f"Loading: {loaded - start:.2f}s, correlation matrix: {computed - loaded:.2f}s ({corr.memory_usage().sum() / 1e6:.1f} MB)")
@@ -0,0 +1,337 @@
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.data_related import load_ticker_generic_info, read_history_data, read_financial_data, read_analysis_data
+from utils.market_panel import list_tickers
+from utils.ml_model import calculate_rsi, calculate_macd
+from utils.ticker_search import fold_text
+
+SCREENER_TABLE_PATH = "data/derived/screener-table.parquet"
+SCREEN_LIMIT = 50
+
+# Valuation columns taken from the industry analysis, or from the latest financial ratios when it lacks them
+VALUATION_COLUMNS = ["priceToEarning", "priceToBook", "roe", "roa", "dividend", "debtOnEquity", "postTaxMargin"]
+ANALYSIS_COLUMNS = ["marcap", "peg", "rs", "income5year", "sale5year"]
+RATIO_COLUMNS = ["earningPerShare", "epsChange", "bookValuePerShare", "debtOnAsset"]
+
+# Query name (lowercase, without spaces) -> table column
+SCREENER_FIELDS = {
+    "ticker": "ticker", "exchange": "exchange", "industry": "industry", "industryen": "industryEn",
+    "price": "close", "close": "close", "change": "change_percent", "change%": "change_percent",
+    "volume": "volume_20d", "avgvolume": "volume_20d",
+    "return1m": "return_1m", "return3m": "return_3m", "return1y": "return_1y",
+    "rsi": "rsi", "macd": "macd", "macdsignal": "macd_signal", "ma20gap": "ma20_gap", "ma50gap": "ma50_gap",
+    "pe": "priceToEarning", "p/e": "priceToEarning", "pb": "priceToBook", "p/b": "priceToBook",
+    "roe": "roe", "roa": "roa", "dividend": "dividend", "de": "debtOnEquity", "d/e": "debtOnEquity",
+    "margin": "postTaxMargin", "marcap": "marcap", "marketcap": "marcap", "peg": "peg", "rs": "rs",
+    "income5y": "income5year", "sales5y": "sale5year", "eps": "earningPerShare", "epsgrowth": "epsChange",
+    "bvps": "bookValuePerShare", "debt/asset": "debtOnAsset",
+}
+TEXT_COLUMNS = {"ticker", "exchange", "industry", "industryEn"}
+RESULT_COLUMNS = ["ticker", "shortName", "exchange", "industry", "close", "change_percent", "marcap",
+                  "priceToEarning", "priceToBook", "roe", "rsi"]
+
+# Table loaded by the current process, reloaded when the file on disk changes
+_screener_table = {}
+
+def screener_row(ticker, exchange):
+    """
+    Computes a ticker's row of the screener table: last price, returns and indicators from its history,
+    valuation from the industry analysis and the latest financial ratios. Runs in a worker process.
+    """
+    row = {"ticker": ticker}
+    try:
+        history_data = read_history_data(ticker, exchange).drop_duplicates(subset="TradingDate", keep="last")
+    except FileNotFoundError:
+        return row
+    close = history_data["Close"].astype(np.float64).where(lambda prices: prices > 0).ffill()
+    if close.notna().sum() < 2:
+        return row
+
+    macd, macd_signal = calculate_macd(close)
+    last = close.iloc[-1]
+    row.update({
+        "last_trading_date": history_data["TradingDate"].iloc[-1],
+        "close": last,
+        "change_percent": 100 * (last / close.iloc[-2] - 1),
+        "volume_20d": history_data["Volume"].astype(np.float64).iloc[-20:].mean(),
+        "return_1m": 100 * (last / close.iloc[-min(21, len(close))] - 1),
+        "return_3m": 100 * (last / close.iloc[-min(63, len(close))] - 1),
+        "return_1y": 100 * (last / close.iloc[-min(250, len(close))] - 1),
+        "rsi": calculate_rsi(close).iloc[-1],
+        "macd": macd.iloc[-1],
+        "macd_signal": macd_signal.iloc[-1],
+        "ma20_gap": 100 * (last / close.iloc[-20:].mean() - 1),
+        "ma50_gap": 100 * (last / close.iloc[-50:].mean() - 1),
+    })
+
+    try:
+        analysis = read_analysis_data(ticker, exchange)
+    except FileNotFoundError:
+        analysis = pd.DataFrame()
+    try:
+        ratios = read_financial_data(ticker, exchange)
+    except FileNotFoundError:
+        ratios = pd.DataFrame()
+    latest_ratios = (ratios.sort_values(["year", "quarter"]).iloc[-1] if not ratios.empty and "year" in ratios
+                     else pd.Series(dtype=object))
+    latest_analysis = analysis.iloc[0] if not analysis.empty else pd.Series(dtype=object)
+
+    for column in VALUATION_COLUMNS:
+        value = latest_analysis.get(column, np.nan)
+        row[column] = latest_ratios.get(column, np.nan) if pd.isna(value) else value
+    for column in ANALYSIS_COLUMNS:
+        row[column] = latest_analysis.get(column, np.nan)
+    for column in RATIO_COLUMNS:
+        row[column] = latest_ratios.get(column, np.nan)
+    return row
+
+def build_screener_table(ticker_info_df, path=SCREENER_TABLE_PATH, max_workers=None):
+    """
+    Builds the one-row-per-ticker screener table from every ticker's files and writes it as Parquet.
+    """
+    tickers = list_tickers(ticker_info_df)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        rows = list(executor.map(screener_row, *zip(*tickers), chunksize=16))
+
+    info = ticker_info_df.dropna(subset=["ticker"]).set_index("ticker")
+    table = pd.DataFrame(rows).set_index("ticker")
+    table = info[["shortName", "exchange", "industry", "industryEn"]].astype(object).join(table, how="inner")
+    table = table.reset_index()
+    numeric = table.columns.difference(["ticker", "shortName", "exchange", "industry", "industryEn", "last_trading_date"])
+    table[numeric] = table[numeric].apply(pd.to_numeric, errors="coerce").astype(np.float64)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return table
+
+class ScreenerTable:
+    """
+    Column arrays of the screener table with a presorted index per numeric column.
+    A range predicate is a binary search in the sorted values, and ordering by a column walks its index,
+    so a screen never sorts or compares more rows than it needs.
+    """
+
+    def __init__(self, table):
+        self.frame = table.reset_index(drop=True)
+        self.size = len(self.frame)
+        self.text = {column: self.frame[column].astype(object).fillna("").map(fold_text).to_numpy(dtype=str)
+                     for column in TEXT_COLUMNS if column in self.frame}
+        self.values, self.order, self.sorted_values, self.valid_counts = {}, {}, {}, {}
+        for column in self.frame.columns:
+            if column in TEXT_COLUMNS or not pd.api.types.is_float_dtype(self.frame[column]):
+                continue
+            values = self.frame[column].to_numpy(dtype=np.float64)
+            order = np.argsort(values, kind="stable")  # NaN sorts last
+            self.values[column] = values
+            self.order[column] = order
+            self.sorted_values[column] = values[order]
+            self.valid_counts[column] = int(np.isfinite(values).sum())
+
+    def compare(self, column, operator, value):
+        """
+        Returns the boolean mask of the rows where `column operator value` holds; missing values never match.
+        """
+        mask = np.zeros(self.size, dtype=bool)
+        if column in self.text:
+            matches = self.text[column] == fold_text(value)
+            if operator == "=":
+                return matches
+            if operator == "!=":
+                return ~matches
+            raise ValueError(f"{column} can only be compared with = or !=")
+
+        value = float(value)
+        sorted_values = self.sorted_values[column][:self.valid_counts[column]]
+        order = self.order[column]
+        if operator in ("<", "<="):
+            mask[order[:np.searchsorted(sorted_values, value, side="left" if operator == "<" else "right")]] = True
+        elif operator in (">", ">="):
+            mask[order[np.searchsorted(sorted_values, value, side="right" if operator == ">" else "left"):len(sorted_values)]] = True
+        elif operator in ("=", "!="):
+            start, end = np.searchsorted(sorted_values, [value, value], side="left")[0], np.searchsorted(sorted_values, value, side="right")
+            mask[order[start:end]] = True
+            if operator == "!=":
+                mask = ~mask
+                mask[order[len(sorted_values):]] = False
+        else:
+            raise ValueError(f"Unknown operator: {operator}")
+        return mask
+
+    def top(self, mask, column, descending=True, limit=SCREEN_LIMIT):
+        """
+        Returns the positions of up to `limit` rows of `mask` ordered by `column`, missing values last.
+        """
+        order = self.order[column]
+        valid = order[:self.valid_counts[column]]
+        ranked = np.concatenate([valid[::-1] if descending else valid, order[self.valid_counts[column]:]])
+        return ranked[mask[ranked]][:limit]
+
+_TOKEN = re.compile(r'\s*(?:(?P<number>-?\d+(?:\.\d+)?%?(?![\w/]))|(?P<operator><=|>=|!=|<|>|=)|(?P<paren>[()])'
+                    r'|"(?P<quoted>[^"]*)"|(?P<word>[^\s()<>=!"]+))')
+
+def _tokenize(query):
+    tokens, position = [], 0
+    query = query.strip()
+    while position < len(query):
+        match = _TOKEN.match(query, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Cannot read the query near: {query[position:position + 20]!r}")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+    return tokens
+
+class _QueryParser:
+    # expression := term ("or" term)* ; term := factor (["and"] factor)*, "and" being optional before "on"
+    # factor := "not" factor | "(" expression ")" | "on" EXCHANGE | field operator value
+
+    def __init__(self, tokens, table):
+        self.tokens = tokens
+        self.position = 0
+        self.table = table
+        self.columns = []
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def keyword(self, word):
+        kind, value = self.peek()
+        if kind == "word" and value.lower() == word:
+            self.position += 1
+            return True
+        return False
+
+    def expression(self):
+        mask = self.term()
+        while self.keyword("or"):
+            mask = mask | self.term()
+        return mask
+
+    def term(self):
+        mask = self.factor()
+        while self.keyword("and") or self.peek()[0] == "word" and self.peek()[1].lower() == "on":
+            mask = mask & self.factor()
+        return mask
+
+    def factor(self):
+        if self.keyword("not"):
+            return ~self.factor()
+        if self.keyword("on"):
+            kind, exchange = self.take()
+            if kind not in ("word", "quoted"):
+                raise ValueError("Expected an exchange after 'on'")
+            self.columns.append("exchange")
+            return self.table.compare("exchange", "=", exchange)
+        kind, value = self.peek()
+        if kind == "paren" and value == "(":
+            self.take()
+            mask = self.expression()
+            if self.take() != ("paren", ")"):
+                raise ValueError("Missing ')'")
+            return mask
+
+        # A field name may be several words, e.g. "market cap", up to the comparison operator
+        words = []
+        while self.peek()[0] == "word":
+            words.append(self.take()[1])
+        name = "".join(words).lower()
+        if name not in SCREENER_FIELDS:
+            raise ValueError(f"Unknown field: {' '.join(words) or value!r}. Known fields: {', '.join(sorted(SCREENER_FIELDS))}")
+        column = SCREENER_FIELDS[name]
+
+        kind, operator = self.take()
+        if kind != "operator":
+            raise ValueError(f"Expected a comparison after {' '.join(words)!r}")
+        kind, value = self.take()
+        if kind == "number":
+            value = float(value[:-1]) / 100 if value.endswith("%") and column not in PERCENT_COLUMNS else float(value.rstrip("%"))
+        elif kind not in ("word", "quoted"):
+            raise ValueError(f"Expected a value after {' '.join(words)} {operator}")
+        self.columns.append(column)
+        return self.table.compare(column, operator, value)
+
+# Columns already expressed in percent, where "5%" means 5 rather than 0.05
+PERCENT_COLUMNS = {"change_percent", "return_1m", "return_3m", "return_1y", "ma20_gap", "ma50_gap"}
+
+def screen(table, query, order_by=None, descending=True, limit=SCREEN_LIMIT):
+    """
+    Runs a screen such as 'P/B < 1 and ROE > 15% and RSI < 30 on HOSE' over the screener table.
+    Returns the number of matching tickers and the top `limit` of them ordered by `order_by`
+    (a field name, by default market cap), with the columns used by the query.
+    """
+    tokens = _tokenize(query)
+    parser = _QueryParser(tokens, table)
+    mask = parser.expression() if tokens else np.ones(table.size, dtype=bool)
+    if parser.position < len(tokens):
+        raise ValueError(f"Unexpected {parser.peek()[1]!r}")
+
+    column = SCREENER_FIELDS.get((order_by or "marcap").replace(" ", "").lower(), order_by)
+    if column not in table.order:
+        raise ValueError(f"Cannot order by {order_by!r}")
+    positions = table.top(mask, column, descending, limit)
+    columns = list(dict.fromkeys(RESULT_COLUMNS + parser.columns + [column]))
+    return int(mask.sum()), table.frame.iloc[positions][columns].reset_index(drop=True)
+
+def load_screener_table(path=SCREENER_TABLE_PATH):
+    """
+    Loads the screener table once per process and reloads it when the file is rebuilt.
+    Returns None if the table has not been built yet.
+    """
+    if not os.path.exists(path):
+        return None
+
+    modified = os.stat(path).st_mtime_ns
+    if _screener_table.get("modified") != modified:
+        _screener_table["table"] = ScreenerTable(pd.read_parquet(path))
+        _screener_table["modified"] = modified
+    return _screener_table["table"]
+
+BENCHMARK_SCREENS = [
+    ("P/B < 1 and ROE > 15% and RSI < 30 on HOSE", "roe"),
+    ("P/E < 10 and P/E > 0 and dividend > 0.05", "marcap"),
+    ("(exchange = HOSE or exchange = HNX) and return 3m > 20 and volume > 100000", "return3m"),
+    ('industry = "Ngân hàng" and P/B < 1.5', "pb"),
+    ("not on UPCOM and RSI > 70 and MA20 gap > 5", "rsi"),
+    ("market cap > 10000 and EPS growth > 0.2", "marcap"),
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the screener table and time typical screens.")
+    parser.add_argument("--build", action="store_true", help="Rebuild the table from the data files first")
+    parser.add_argument("--query", help="Run this screen instead of the benchmark screens")
+    parser.add_argument("--order-by", default="marcap")
+    parser.add_argument("--repeat", type=int, default=200, help="Runs of each benchmark screen")
+    args = parser.parse_args()
+
+    if args.build or not os.path.exists(SCREENER_TABLE_PATH):
+        start = time.perf_counter()
+        built = build_screener_table(load_ticker_generic_info())
+        print(f"Built the screener table of {len(built)} tickers in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    table = load_screener_table()
+    print(f"Loaded and indexed {table.size} tickers x {len(table.order)} numeric columns in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    screens = [(args.query, args.order_by)] if args.query else BENCHMARK_SCREENS
+    for query, order_by in screens:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            count, results = screen(table, query, order_by, limit=10)
+            timings.append(time.perf_counter() - start)
+        print(f"{query!r} by {order_by}: {count} matches, median {np.median(timings) * 1000:.3f} ms, "
+              f"max {np.max(timings) * 1000:.3f} ms; top: {', '.join(results['ticker'].head(5))}")
@@ -0,0 +1,177 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.data_related import load_ticker_generic_info, load_manifest
+from utils.market_panel import list_tickers, load_history_panel
+
+INDEX_PATH = "data/derived/sector-index.parquet"
+STATE_PATH = "data/derived/sector-index-state.parquet"
+BASE_LEVEL = 100.0
+# Daily moves beyond every exchange's price limit come from bad prints or unadjusted corporate actions
+MAX_DAILY_MOVE = 0.5
+GROUP_COLUMNS = {"industry": "industry", "exchange": "exchange"}  # Group type -> ticker overview column
+
+# Index loaded by the current process, reloaded when the file on disk changes
+_loaded_index = {}
+
+def group_matrix(labels, groups=None):
+    """
+    Returns the groups (by default the distinct non-missing labels) and the (tickers x groups) one-hot membership matrix.
+    """
+    labels = pd.Series(labels, dtype=object)
+    if groups is None:
+        groups = np.array(sorted(labels.dropna().unique()), dtype=object)
+    codes = pd.Categorical(labels, categories=groups).codes
+    return groups, (codes[:, None] == np.arange(len(groups))[None, :]).astype(np.float64)
+
+def group_returns(previous_close, close, shares, membership):
+    """
+    Computes the daily cap-weighted and equal-weighted returns of every group in one pass.
+    `previous_close` holds each ticker's last known Close before the first row of `close` (dates x tickers).
+    Each ticker's weight on a day is its market cap at the previous Close; tickers without a bar that day
+    or the day before, or moving more than MAX_DAILY_MOVE, are left out.
+    Returns the two (dates x groups) return arrays and the constituent counts.
+    """
+    prices = np.vstack([previous_close[None, :], close])
+    prices = np.where(prices > 0, prices, np.nan)
+    previous = pd.DataFrame(prices).ffill().to_numpy()[:-1]  # Last known Close before each day
+    current = prices[1:]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = current / previous - 1
+    valid = np.isfinite(returns) & (np.abs(returns) <= MAX_DAILY_MOVE)
+    returns = np.where(valid, returns, 0.0)
+    caps = np.where(valid, previous * shares[None, :], 0.0)
+    caps = np.nan_to_num(caps)
+
+    counts = valid.astype(np.float64) @ membership
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cap_weighted = (returns * caps) @ membership / (caps @ membership)
+        equal_weighted = (returns @ membership) / counts
+    return cap_weighted, equal_weighted, counts.astype(np.int32)
+
+def _levels(returns, last_levels):
+    # Chain daily returns onto the previous levels; days without constituents keep the level unchanged
+    return last_levels[None, :] * np.cumprod(1 + np.nan_to_num(returns), axis=0)
+
+def build_sector_index(ticker_info_df, path=INDEX_PATH, state_path=STATE_PATH, full_rebuild=False):
+    """
+    Builds the daily cap-weighted and equal-weighted index of every industry and exchange, or extends it
+    with the bars that arrived since the last build. With a dataset manifest only the tickers whose history
+    ends after the stored index are read again. Returns the number of dates added.
+    """
+    index_data, state = None, None
+    if os.path.exists(path) and os.path.exists(state_path) and not full_rebuild:
+        index_data = pd.read_parquet(path)
+        state = pd.read_parquet(state_path).set_index("ticker")["last_close"]
+    last_date = index_data["date"].max() if index_data is not None else None
+
+    tickers = [ticker for ticker, _ in list_tickers(ticker_info_df)]
+    manifest = load_manifest()
+    if last_date is not None and manifest is not None:
+        # Skip the tickers the manifest shows have no bars after the stored index
+        tickers = [
+            ticker for ticker in tickers
+            if manifest.get(("stock-historical-data", ticker), {}).get("last_date", "") > last_date.strftime("%Y-%m-%d")
+        ]
+    if not tickers:
+        return 0
+
+    close_panel = load_history_panel(tickers, ticker_info_df, fields=("Close",))["Close"]
+    if last_date is not None:
+        close_panel = close_panel[close_panel.index > last_date]
+    if close_panel.empty:
+        return 0
+
+    listed = ticker_info_df.dropna(subset=["ticker"]).set_index("ticker")
+    info = listed.reindex(close_panel.columns)
+    shares = info["outstandingShare"].to_numpy(dtype=np.float64)
+    previous_close = (state.reindex(close_panel.columns).to_numpy(dtype=np.float64) if state is not None
+                      else np.full(close_panel.shape[1], np.nan))
+    close = close_panel.to_numpy(dtype=np.float64)
+
+    frames = []
+    for group_type, column in GROUP_COLUMNS.items():
+        # Every group of the market gets a row for each new date, even if none of its tickers was read
+        groups, _ = group_matrix(listed[column].astype(object).to_numpy())
+        groups, membership = group_matrix(info[column].astype(object).to_numpy(), groups)
+        cap_weighted, equal_weighted, counts = group_returns(previous_close, close, shares, membership)
+
+        last_cap = np.full(len(groups), BASE_LEVEL)
+        last_equal = np.full(len(groups), BASE_LEVEL)
+        if index_data is not None:
+            # Groups new to the index start from the base level
+            latest = index_data[(index_data["group_type"] == group_type) & (index_data["date"] == last_date)].set_index("group")
+            last_cap = latest["cap_weighted"].reindex(groups).fillna(BASE_LEVEL).to_numpy()
+            last_equal = latest["equal_weighted"].reindex(groups).fillna(BASE_LEVEL).to_numpy()
+
+        frames.append(pd.DataFrame({
+            "date": np.repeat(close_panel.index.to_numpy(), len(groups)),
+            "group_type": group_type,
+            "group": np.tile(groups, len(close_panel)),
+            "cap_weighted": _levels(cap_weighted, last_cap).ravel(),
+            "equal_weighted": _levels(equal_weighted, last_equal).ravel(),
+            "constituents": counts.ravel(),
+        }))
+
+    new_rows = pd.concat(frames, ignore_index=True)
+    if index_data is not None:
+        new_rows = pd.concat([index_data, new_rows], ignore_index=True)
+    new_rows = new_rows.sort_values(["group_type", "group", "date"], ignore_index=True)
+
+    # The last known Close of each ticker is where the next update continues from
+    last_close = close_panel.where(close_panel > 0).ffill().iloc[-1]
+    if state is not None:
+        last_close = last_close.combine_first(state)
+    state_rows = last_close.rename("last_close").rename_axis("ticker").reset_index()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to temporary files first so readers never see a half-written index
+    new_rows.to_parquet(path + ".tmp", index=False)
+    state_rows.to_parquet(state_path + ".tmp", index=False)
+    os.replace(state_path + ".tmp", state_path)
+    os.replace(path + ".tmp", path)
+    return len(close_panel)
+
+def load_sector_index(path=INDEX_PATH):
+    """
+    Loads the sector index once per process and reloads it when the file is rebuilt.
+    Returns None if the index has not been built yet.
+    """
+    if not os.path.exists(path):
+        return None
+
+    modified = os.stat(path).st_mtime_ns
+    if _loaded_index.get("modified") != modified:
+        _loaded_index["index"] = pd.read_parquet(path).set_index(["group_type", "group"]).sort_index()
+        _loaded_index["modified"] = modified
+    return _loaded_index["index"]
+
+def benchmark_series(group_type, group, path=INDEX_PATH):
+    """
+    Returns the daily cap-weighted and equal-weighted levels of one industry or exchange, indexed by date.
+    Empty if the index has not been built or the group is unknown.
+    """
+    sector_index = load_sector_index(path)
+    if sector_index is None or (group_type, group) not in sector_index.index:
+        return pd.DataFrame(columns=["cap_weighted", "equal_weighted", "constituents"])
+    return sector_index.loc[(group_type, group)].set_index("date")[["cap_weighted", "equal_weighted", "constituents"]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or extend the daily industry and exchange indexes.")
+    parser.add_argument("--full", action="store_true", help="Rebuild from the first bar instead of extending")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    added = build_sector_index(load_ticker_generic_info(), full_rebuild=args.full)
+    print(f"Added {added} dates in {time.perf_counter() - start:.2f}s")
+
+    sector_index = load_sector_index()
+    if sector_index is not None:
+        latest = sector_index[sector_index["date"] == sector_index["date"].max()]
+        print(latest[["cap_weighted", "equal_weighted", "constituents"]].round(2).to_string())
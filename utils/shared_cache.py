@@ -0,0 +1,264 @@
+import argparse
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+
+from utils.metrics import record_cache_lookup
+
+# Off by default; "sqlite" shares loaded frames, indicators and forecasts between the server processes of a host
+SHARED_CACHE_BACKEND = os.environ.get("SHARED_CACHE_BACKEND", "")
+SHARED_CACHE_PATH = os.environ.get("SHARED_CACHE_PATH", "data/derived/shared-cache.sqlite")
+SHARED_CACHE_BYTES = int(os.environ.get("SHARED_CACHE_MB", "1024")) * 1024 * 1024
+
+# Backend of the current process, created on first use
+_backend = {}
+
+def encode_value(value):
+    """
+    Serializes a value for the cache: frames as an Arrow IPC stream, which is read back without parsing,
+    anything else with pickle.
+    """
+    if isinstance(value, pd.DataFrame):
+        table = pa.Table.from_pandas(value, preserve_index=True)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return b"A" + sink.getvalue().to_pybytes()
+    return b"P" + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+def decode_value(payload):
+    if payload[:1] == b"A":
+        return pa.ipc.open_stream(pa.py_buffer(payload[1:])).read_all().to_pandas()
+    return pickle.loads(payload[1:])
+
+class SQLiteCache:
+    """
+    Cache shared by the processes of a host through one SQLite file in WAL mode, so readers never block
+    each other. Each missing key is computed by a single process: callers first take an exclusive `flock`
+    on the key's own lock file, check the cache again, and only compute if it is still missing, so concurrent
+    sessions asking for the same key wait for the first one instead of computing it again.
+    Computing a key may look up other keys (a shared graph node reading datasets); as every key has its own
+    lock and keys only depend on other keys, no process ever waits for a lock held by itself or by a process
+    waiting for it. Lock files only exist while their key is being computed or waited for.
+    The oldest entries are evicted beyond `max_bytes`, tracked as a running total of the stored sizes.
+    """
+
+    def __init__(self, path=SHARED_CACHE_PATH, max_bytes=SHARED_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock_dir = path + ".locks"
+        self._local = threading.local()  # SQLite connections cannot be shared between threads
+        os.makedirs(self.lock_dir, exist_ok=True)
+        with self._connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (namespace TEXT, key TEXT, value BLOB, bytes INTEGER, "
+                "created REAL, PRIMARY KEY (namespace, key))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries (created)")
+            connection.execute("CREATE TABLE IF NOT EXISTS totals (bytes INTEGER)")
+            if connection.execute("SELECT count(*) FROM totals").fetchone()[0] == 0:
+                connection.execute("INSERT INTO totals SELECT total(bytes) FROM entries")
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _lock(self, namespace, key):
+        import fcntl  # POSIX only, like the multi-process deployments this backend is for
+
+        # flock is not reentrant: a key already locked further up this thread's stack is not locked again
+        name = hashlib.sha1(f"{namespace}|{key}".encode()).hexdigest()
+        held = self._local.__dict__.setdefault("held", set())
+        if name in held:
+            yield
+            return
+
+        directory = os.path.join(self.lock_dir, name[:2])  # Spread the lock files over 256 directories
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}.lock")
+        while True:
+            lock_file = open(path, "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # The holder removes the file before releasing it; a waiter woken on a removed file locks the new one
+            try:
+                if os.stat(path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+
+        held.add(name)
+        try:
+            yield
+        finally:
+            held.discard(name)
+            os.remove(path)
+            lock_file.close()
+
+    def get(self, namespace, key):
+        """
+        Returns the payload stored under the key, or None.
+        """
+        row = self._connection().execute(
+            "SELECT value FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, namespace, key, payload):
+        with self._connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")  # The size of a replaced entry must not change before it is counted
+            replaced = connection.execute(
+                "SELECT bytes FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, payload, len(payload), time.time()),
+            )
+            total = connection.execute("SELECT bytes FROM totals").fetchone()[0] + len(payload) - (replaced[0] if replaced else 0)
+            while total > self.max_bytes:
+                oldest = connection.execute("SELECT namespace, key, bytes FROM entries ORDER BY created LIMIT 1").fetchone()
+                connection.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", oldest[:2])
+                total -= oldest[2]
+            connection.execute("UPDATE totals SET bytes = ?", (total,))
+
+    def get_or_compute(self, namespace, key, compute):
+        """
+        Returns the cached value of the key, computing and storing it if no process has yet.
+        Errors of `compute` are raised to the caller and nothing is stored.
+        """
+        payload = self.get(namespace, key)
+        if payload is None:
+            with self._lock(namespace, key):
+                payload = self.get(namespace, key)  # Computed by another process while this one waited
+                if payload is None:
+                    record_cache_lookup("shared", False)
+                    value = compute()
+                    self.put(namespace, key, encode_value(value))
+                    return value
+        record_cache_lookup("shared", True)
+        return decode_value(payload)
+
+    def stats(self):
+        return self._connection().execute(
+            "SELECT namespace, count(*) AS entries, total(bytes) AS bytes FROM entries GROUP BY namespace"
+        ).fetchall()
+
+    def clear(self):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM entries")
+            connection.execute("UPDATE totals SET bytes = 0")
+        self._remove_stale_locks()
+
+    def _remove_stale_locks(self):
+        import fcntl
+
+        # Lock files left by processes that died while computing; files in use are skipped
+        for directory, _, names in os.walk(self.lock_dir):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    with open(path, "a") as lock_file:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        if os.stat(path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+                            os.remove(path)
+                except OSError:
+                    continue
+
+CACHE_BACKENDS = {"sqlite": SQLiteCache}
+
+def shared_cache():
+    """
+    Returns the shared cache backend selected by SHARED_CACHE_BACKEND, or None when it is not set.
+    """
+    if not SHARED_CACHE_BACKEND:
+        return None
+    if "backend" not in _backend:
+        if SHARED_CACHE_BACKEND not in CACHE_BACKENDS:
+            raise ValueError(f"Unknown shared cache backend: {SHARED_CACHE_BACKEND}")
+        _backend["backend"] = CACHE_BACKENDS[SHARED_CACHE_BACKEND]()
+    return _backend["backend"]
+
+def cached(namespace, key, compute):
+    """
+    Returns `compute()` through the shared cache when one is configured, or simply calls it otherwise.
+    The key must identify the value across processes, e.g. include the checksum of the files it is built from.
+    """
+    backend = shared_cache()
+    if backend is None:
+        return compute()
+    return backend.get_or_compute(namespace, key, compute)
+
+def _benchmark_worker(arguments):
+    # One "session" of the single-flight check: every process asks for the same missing key
+    path, key, compute_seconds = arguments
+    backend = SQLiteCache(path)
+
+    def compute():
+        with open(path + ".computed", "a") as file:
+            file.write(f"{os.getpid()}\n")
+        time.sleep(compute_seconds)
+        return {"key": key, "pid": os.getpid()}
+
+    return backend.get_or_compute("benchmark", key, compute)["pid"]
+
+
+if __name__ == "__main__":
+    from multiprocessing import Pool
+
+    from utils.data_related import load_ticker_generic_info, read_compact_csv, resolve_dataset
+
+    parser = argparse.ArgumentParser(description="Inspect the shared cache or check its single-flight locking.")
+    parser.add_argument("--stats", action="store_true", help="Show the entries per namespace")
+    parser.add_argument("--clear", action="store_true", help="Remove every entry")
+    parser.add_argument("--sessions", type=int, default=50, help="Processes asking for the same key in the benchmark")
+    args = parser.parse_args()
+
+    if args.stats or args.clear:
+        backend = SQLiteCache()
+        if args.clear:
+            backend.clear()
+        for namespace, entries, size in backend.stats():
+            print(f"{namespace}: {entries} entries, {size / 1024 / 1024:.1f} MiB")
+    else:
+        path = os.path.join(os.path.dirname(SHARED_CACHE_PATH), "shared-cache-benchmark.sqlite")
+        for suffix in ("", "-wal", "-shm", ".computed"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+        start = time.perf_counter()
+        with Pool(min(args.sessions, 16)) as pool:
+            pids = pool.map(_benchmark_worker, [(path, "same-key", 1.0)] * args.sessions)
+        with open(path + ".computed") as file:
+            computations = len(file.readlines())
+        print(f"{args.sessions} sessions asked for one missing key: computed {computations} time(s), "
+              f"{len(set(pids))} distinct result(s), {time.perf_counter() - start:.2f}s for a 1s computation")
+
+        # A frame read from its CSV against the same frame read from the shared cache
+        backend = SQLiteCache(path)
+        ticker_info = load_ticker_generic_info()
+        entry = resolve_dataset("stock-historical-data", "VNM", "HOSE")
+        timings = {}
+        for name, load in [("csv", lambda: read_compact_csv(entry["path"], "stock-historical-data")),
+                           ("shared", lambda: backend.get_or_compute("dataset", entry["path"], lambda: read_compact_csv(entry["path"], "stock-historical-data")))]:
+            load()
+            start = time.perf_counter()
+            for _ in range(50):
+                frame = load()
+            timings[name] = (time.perf_counter() - start) / 50
+        same = frame.equals(read_compact_csv(entry["path"], "stock-historical-data"))
+        print(f"VNM history ({len(frame)} rows): CSV {timings['csv'] * 1000:.2f} ms, "
+              f"shared cache {timings['shared'] * 1000:.2f} ms, identical frame: {same}")
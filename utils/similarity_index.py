@@ -0,0 +1,170 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.data_related import load_ticker_generic_info, read_history_data, read_financial_data, resolve_dataset
+from utils.market_panel import list_tickers
+
+INDEX_PATH = "data/derived/similarity-index.npz"
+RETURN_WINDOW = 120
+RATIO_FEATURES = ["priceToEarning", "priceToBook", "roe", "roa", "debtOnEquity", "postTaxMargin", "epsChange"]
+RATIO_WEIGHT = 0.5  # Share of the similarity that comes from the financial ratios
+
+# Index loaded by the current process, reloaded when the file on disk changes
+_loaded_index = {}
+
+def _source_signature(ticker, exchange):
+    # Checksums of the files a ticker's vector is built from, as recorded in the dataset manifest
+    signature = []
+    for dataset in ["stock-historical-data", "financial-ratio"]:
+        entry = resolve_dataset(dataset, ticker, exchange)
+        signature.append("missing" if entry is None else entry["checksum"])
+    return "|".join(signature)
+
+def return_window_vector(history_data, window=RETURN_WINDOW):
+    """
+    Returns the z-normalized last `window` daily log returns of a ticker.
+    Tickers with a shorter or constant history give a zero vector.
+    """
+    close = history_data["Close"].to_numpy(dtype=np.float64)
+    close = close[close > 0]
+    returns = np.diff(np.log(close))[-window:]
+    if len(returns) < window or returns.std() == 0:
+        return np.zeros(window, dtype=np.float32)
+    return ((returns - returns.mean()) / returns.std()).astype(np.float32)
+
+def ratio_vector(financial_data):
+    """
+    Returns the raw values of RATIO_FEATURES for the most recent quarter, NaN when unavailable.
+    """
+    if financial_data.empty or "year" not in financial_data:
+        return np.full(len(RATIO_FEATURES), np.nan, dtype=np.float32)
+    latest = financial_data.sort_values(["year", "quarter"]).iloc[-1]
+    return latest.reindex(RATIO_FEATURES).to_numpy(dtype=np.float32)
+
+def build_similarity_index(ticker_info_df, path=INDEX_PATH, full_rebuild=False):
+    """
+    Builds or incrementally updates the similarity index stored at `path`.
+    Only tickers whose source files changed since the last build are read again.
+    Returns the number of tickers whose vectors were recomputed.
+    """
+    previous = {}
+    if os.path.exists(path) and not full_rebuild:
+        with np.load(path) as stored:
+            for position, ticker in enumerate(stored["tickers"]):
+                previous[str(ticker)] = (str(stored["signatures"][position]),
+                                         stored["return_vectors"][position],
+                                         stored["ratio_values"][position])
+
+    tickers, signatures, return_vectors, ratio_values = [], [], [], []
+    updated = 0
+    for ticker, exchange in list_tickers(ticker_info_df):
+        signature = _source_signature(ticker, exchange)
+        if signature.startswith("missing"):
+            continue
+
+        if ticker in previous and previous[ticker][0] == signature:
+            _, returns, ratios = previous[ticker]
+        else:
+            returns = return_window_vector(read_history_data(ticker, exchange))
+            try:
+                ratios = ratio_vector(read_financial_data(ticker, exchange))
+            except FileNotFoundError:
+                ratios = np.full(len(RATIO_FEATURES), np.nan, dtype=np.float32)
+            updated += 1
+
+        tickers.append(ticker)
+        signatures.append(signature)
+        return_vectors.append(returns)
+        ratio_values.append(ratios)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file first so readers never see a half-written index
+    temporary_path = path + ".tmp.npz"
+    np.savez(
+        temporary_path,
+        tickers=np.array(tickers),
+        signatures=np.array(signatures),
+        return_vectors=np.array(return_vectors, dtype=np.float32),
+        ratio_values=np.array(ratio_values, dtype=np.float32),
+    )
+    os.replace(temporary_path, path)
+    return updated
+
+def combine_features(return_vectors, ratio_values):
+    """
+    Combines the return windows and the cross-sectionally standardized ratios into unit-length rows,
+    so that cosine similarity is a single matrix-vector product.
+    """
+    price_block = return_vectors / np.sqrt(return_vectors.shape[1])
+
+    # Standardize each ratio across the market, clipping outliers and treating missing values as average
+    mean = np.nanmean(ratio_values, axis=0)
+    std = np.nanstd(ratio_values, axis=0)
+    std[~(std > 0)] = 1.0
+    ratio_block = np.nan_to_num(np.clip((ratio_values - mean) / std, -3, 3))
+    ratio_block /= np.sqrt(ratio_values.shape[1])
+
+    features = np.hstack([price_block * np.sqrt(1 - RATIO_WEIGHT), ratio_block * np.sqrt(RATIO_WEIGHT)])
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (features / norms).astype(np.float32)
+
+def load_similarity_index(path=INDEX_PATH):
+    """
+    Loads the similarity index once per process and reloads it when the file is rebuilt.
+    Returns None if the index has not been built yet.
+    """
+    if not os.path.exists(path):
+        return None
+
+    modified = os.stat(path).st_mtime_ns
+    if _loaded_index.get("modified") != modified:
+        with np.load(path) as stored:
+            tickers = stored["tickers"].astype(str)
+            features = combine_features(stored["return_vectors"], stored["ratio_values"])
+        _loaded_index.update({
+            "modified": modified,
+            "tickers": tickers,
+            "positions": {ticker: position for position, ticker in enumerate(tickers)},
+            "features": features,
+        })
+    return _loaded_index
+
+def query_similar(ticker, k=10, path=INDEX_PATH):
+    """
+    Returns the k tickers most similar to `ticker` with their cosine similarity, most similar first.
+    """
+    index = load_similarity_index(path)
+    if index is None or ticker not in index["positions"]:
+        return pd.DataFrame(columns=["ticker", "similarity"])
+
+    position = index["positions"][ticker]
+    similarity = index["features"] @ index["features"][position]
+    similarity[position] = -np.inf  # Exclude the ticker itself
+
+    k = min(k, len(similarity) - 1)
+    top = np.argpartition(-similarity, k)[:k]
+    top = top[np.argsort(-similarity[top])]
+    return pd.DataFrame({"ticker": index["tickers"][top], "similarity": similarity[top].astype(np.float64)})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the similar stocks index.")
+    parser.add_argument("--full", action="store_true", help="Rebuild every ticker instead of only the changed ones")
+    parser.add_argument("--query", help="Print the most similar tickers to this ticker after building")
+    parser.add_argument("-k", type=int, default=10, help="Number of similar tickers to print")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    updated = build_similarity_index(load_ticker_generic_info(), full_rebuild=args.full)
+    print(f"Updated {updated} tickers in {time.perf_counter() - start:.2f}s")
+
+    if args.query:
+        start = time.perf_counter()
+        result = query_similar(args.query, args.k)
+        print(result.to_string(index=False))
+        print(f"Query took {(time.perf_counter() - start) * 1000:.2f} ms")
@@ -0,0 +1,169 @@
+import argparse
+import os
+import re
+import time
+import unicodedata
+
+import numpy as np
+
+from utils.data_related import load_ticker_generic_info
+
+TICKER_OVERVIEW_PATH = "data/ticker-overview.csv"
+SEARCH_LIMIT = 50
+MIN_SIMILARITY = 0.6  # Trigram (Dice) similarity from which two words of 3+ letters count as a fuzzy match
+# Score of a query word matching each field exactly, by prefix, or fuzzily (times the trigram similarity)
+FIELD_SCORES = {
+    "ticker": {"exact": 12.0, "prefix": 8.0, "fuzzy": 3.0},
+    "name": {"exact": 6.0, "prefix": 4.0, "fuzzy": 3.0},
+    "industry": {"exact": 2.0, "prefix": 1.5, "fuzzy": 1.0},
+}
+
+# Index built by the current process, rebuilt when the ticker overview changes
+_search_index = {}
+
+def fold_text(text):
+    """
+    Lowercases text and removes Vietnamese diacritics ("Đầu tư Phát triển" -> "dau tu phat trien"),
+    keeping only letters and digits separated by single spaces.
+    """
+    text = unicodedata.normalize("NFD", str(text)).replace("đ", "d").replace("Đ", "D")
+    text = "".join(character for character in text if unicodedata.category(character) != "Mn")
+    return " ".join(re.findall(r"[0-9a-z]+", text.lower()))
+
+def _trigrams(word):
+    # Words are padded at the start so the first letters weigh like a prefix
+    padded = f"  {word}"
+    return {padded[position:position + 3] for position in range(len(padded) - 2)}
+
+class TickerSearchIndex:
+    """
+    Typeahead index over ticker, shortName, industry and industryEn.
+    Every folded word of a company is stored once per field in a sorted array, so prefix matches are a
+    binary search, and in trigram inverted lists pointing at the words, for misspelled or partial words.
+    """
+
+    def __init__(self, ticker_info_df):
+        listed = ticker_info_df.dropna(subset=["ticker"]).reset_index(drop=True)
+        self.tickers = listed["ticker"].astype(str).to_numpy()
+        fields = {
+            "ticker": listed["ticker"].astype(str),
+            "name": listed["shortName"].astype(object).fillna(""),
+            "industry": listed["industry"].astype(object).fillna("") + " " + listed["industryEn"].astype(object).fillna(""),
+        }
+
+        words, documents, field_codes = [], [], []
+        for field_code, values in enumerate(fields.values()):
+            for document, value in enumerate(values):
+                for word in dict.fromkeys(fold_text(value).split()):
+                    words.append(word)
+                    documents.append(document)
+                    field_codes.append(field_code)
+
+        order = np.argsort(np.array(words), kind="stable")
+        self.words = np.array(words)[order]
+        self.documents = np.array(documents, dtype=np.int32)[order]
+        self.fields = np.array(field_codes, dtype=np.int8)[order]
+
+        # Scores indexed by field code, so a match's score is a single lookup
+        self.exact_scores = np.array([scores["exact"] for scores in FIELD_SCORES.values()])
+        self.prefix_scores = np.array([scores["prefix"] for scores in FIELD_SCORES.values()])
+        self.fuzzy_scores = np.array([scores["fuzzy"] for scores in FIELD_SCORES.values()])
+
+        # Trigram -> distinct words containing it, and the distinct word of every entry of self.words
+        distinct, self.distinct_of = np.unique(self.words, return_inverse=True)
+        self.distinct_trigrams = np.array([len(_trigrams(word)) if len(word) >= 3 else 0 for word in distinct])
+        postings = {}
+        for position, word in enumerate(distinct):
+            if len(word) >= 3:
+                for trigram in _trigrams(word):
+                    postings.setdefault(trigram, []).append(position)
+        self.postings = {trigram: np.array(positions, dtype=np.int32) for trigram, positions in postings.items()}
+
+    def _word_scores(self, word):
+        # Best score of each company for one query word
+        scores = np.zeros(len(self.tickers))
+
+        # Prefix matches: the words in [word, word + "\uffff") of the sorted word array
+        start, end = np.searchsorted(self.words, [word, word + "\uffff"])
+        if end > start:
+            matched = slice(start, end)
+            exact = self.words[matched] == word
+            match_scores = np.where(exact, self.exact_scores[self.fields[matched]], self.prefix_scores[self.fields[matched]])
+            np.maximum.at(scores, self.documents[matched], match_scores)
+
+        # Fuzzy matches: words sharing most of the query word's trigrams
+        if len(word) >= 3:
+            trigrams = _trigrams(word)
+            lists = [self.postings[trigram] for trigram in trigrams if trigram in self.postings]
+            if lists:
+                hits = np.bincount(np.concatenate(lists), minlength=len(self.distinct_trigrams))
+                # Dice similarity, so long words do not match every short query
+                similarity = (2 * hits / (len(trigrams) + self.distinct_trigrams))[self.distinct_of]
+                matched = np.flatnonzero(similarity >= MIN_SIMILARITY)
+                np.maximum.at(scores, self.documents[matched], self.fuzzy_scores[self.fields[matched]] * similarity[matched])
+        return scores
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """
+        Returns the tickers matching every word of the query, best first. Ties keep the overview order.
+        """
+        words = fold_text(query).split()
+        if not words:
+            return []
+        total = np.zeros(len(self.tickers))
+        matched_all = np.ones(len(self.tickers), dtype=bool)
+        for word in words:
+            scores = self._word_scores(word)
+            total += scores
+            matched_all &= scores > 0
+
+        candidates = np.flatnonzero(matched_all)
+        ranked = candidates[np.argsort(-total[candidates], kind="stable")]
+        return self.tickers[ranked[:limit]].tolist()
+
+def load_search_index(ticker_info_df=None, path=TICKER_OVERVIEW_PATH):
+    """
+    Builds the search index once per process and again only when the ticker overview changes.
+    """
+    modified = os.stat(path).st_mtime_ns
+    if _search_index.get("modified") != modified:
+        if ticker_info_df is None:
+            ticker_info_df = load_ticker_generic_info()
+        _search_index["index"] = TickerSearchIndex(ticker_info_df)
+        _search_index["modified"] = modified
+    return _search_index["index"]
+
+def ranked_options(query, options, ticker_info_df=None, keep=(), limit=SEARCH_LIMIT):
+    """
+    Narrows a selector's options to the companies matching `query`, best first. Each option must start
+    with its ticker ("ACB - ..." or "ACB "). Options in `keep` (the current selection) are always kept,
+    so a search never clears a widget. All options are returned for an empty query.
+    """
+    if not fold_text(query):
+        return list(options)
+    by_ticker = {str(option).split(" - ")[0].strip(): option for option in options}
+    matches = [by_ticker[ticker] for ticker in load_search_index(ticker_info_df).search(query, limit) if ticker in by_ticker]
+    return [option for option in keep if option not in matches] + matches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search companies by ticker, name or industry.")
+    parser.add_argument("queries", nargs="*", default=["acb", "ngan hang", "thep hoa phat", "Vinamilk", "bat dong san",
+                                                      "dau tu phat trien", "chứng khoán", "banks", "hpg", "fpt",
+                                                      "vinamlik", "ngan hnag", "chung khaon"])
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    ticker_info = load_ticker_generic_info()
+    start = time.perf_counter()
+    index = load_search_index(ticker_info)
+    print(f"Built the index of {len(index.tickers)} companies ({len(index.words)} words, "
+          f"{len(index.postings)} trigrams) in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    names = ticker_info.dropna(subset=["ticker"]).set_index("ticker")["shortName"]
+    for query in args.queries:
+        start = time.perf_counter()
+        for _ in range(100):
+            results = index.search(query, args.limit)
+        elapsed = (time.perf_counter() - start) / 100
+        print(f"{query!r} ({elapsed * 1000:.3f} ms): " + ", ".join(f"{ticker} {names[ticker]}" for ticker in results))